@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -50,11 +51,21 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'base.api.authentication.TokenUserAuthentication',
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
+    # Per client IP: the username/email checks the signup form makes on
+    # every keystroke, and signups (each one hashes a password)
+    "DEFAULT_THROTTLE_RATES": {
+        "availability": "60/min",
+        "register": "20/hour",
+    },
+    # Reverse proxies in front of the app. With 0 the client IP is
+    # REMOTE_ADDR and X-Forwarded-For, which clients can forge, is ignored;
+    # behind e.g. one load balancer set NUM_PROXIES=1
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
 }
 
 SIMPLE_JWT = {
@@ -131,13 +142,72 @@ WSGI_APPLICATION = "backend.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Profiles: "default" is stock SQLite with a connection per request.
+# "production" (DB_PROFILE=production) keeps connections open and tunes
+# SQLite for concurrent workers; its pragmas are applied to every new
+# connection by base.sqlite. Compare them with python -m benchmarks.sqlite_profiles
+
+DB_PROFILE = os.environ.get("DB_PROFILE", "default")
+
+DB_PROFILES = {
+    "default": {
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {},
+        "PRAGMAS": {},
+    },
+    "production": {
+        "CONN_MAX_AGE": 600,
+        # Take the write lock at BEGIN, so a transaction that reads then
+        # writes waits on busy_timeout instead of failing mid-way
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        "PRAGMAS": {
+            "journal_mode": "WAL",
+            # Durable at each checkpoint rather than each commit, safe in WAL
+            "synchronous": "NORMAL",
+            "busy_timeout": 20000,  # ms
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # KiB when negative, per connection
+        },
+    },
+}
+
+_db_profile = DB_PROFILES[DB_PROFILE]
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": _db_profile["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": _db_profile["CONN_MAX_AGE"] > 0,
+        "OPTIONS": dict(_db_profile["OPTIONS"]),
+        # File-backed test database so the concurrency tests can open
+        # several connections (in-memory SQLite locks whole tables)
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+SQLITE_PRAGMAS = _db_profile["PRAGMAS"]
+
+
+# Cache
+# File-based so every gunicorn worker on the host sees the same entries
+# and invalidations
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+        # Room for the per-user list responses before culling kicks in
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# The test suite clears the cache freely, so it gets its own
+if sys.argv[1:2] == ["test"]:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -180,3 +250,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# New accounts
+# What every user starts with, created with the account
+
+DEFAULT_USER_CATEGORIES = ["אוכל", "בית", "כללי"]
+DEFAULT_USER_BUDGETS = [
+    {"name": "אוכל", "amount": 2000},
+    {"name": "בית", "amount": 1500},
+    {"name": "כללי", "amount": 1000},
+]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, UserCategory, Income, Expense, RecurringExpense, RecurringIncome, Budget
+from .models import UserProfile, UserCategory, Income, Expense, RecurringExpense, RecurringIncome, Budget, CategoryRule
 
 # Register your models here.
 admin.site.register(UserProfile)
@@ -9,3 +9,4 @@ admin.site.register(Expense)
 admin.site.register(RecurringExpense)
 admin.site.register(RecurringIncome)
 admin.site.register(Budget)
+admin.site.register(CategoryRule)
@@ -0,0 +1,66 @@
+"""
+JWT authentication without the per-request User query.
+
+simplejwt's JWTAuthentication loads the User row on every request, while
+nearly every view only needs request.user.id and is_active. Here
+request.user is a ClaimsUser with the token's id and the CACHED_FIELDS
+(is_active, is_staff, ...) from the cache, refreshed from the row at most
+once per USER_CACHE_SECONDS per user, and usable in queries and foreign
+keys like a loaded User. The password hash and the remaining fields are
+never cached and are read from the row when used.
+
+Saving or deleting a user drops its cached fields (base/signals.py), so
+deactivated or deleted users are refused on their next request, like
+with JWTAuthentication.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from ..models import ClaimsUser
+
+USER_CACHE_SECONDS = 60
+CACHED_FIELDS = ('username', 'email', 'first_name', 'last_name',
+                 'is_active', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def cached_user_fields(user_id):
+    """
+    The user's CACHED_FIELDS as a dict, cached for USER_CACHE_SECONDS.
+    Raises User.DoesNotExist if there is no such user.
+    """
+    key = _user_key(user_id)
+    fields = cache.get(key)
+    if fields is None:
+        fields = User.objects.filter(pk=user_id).values(*CACHED_FIELDS).get()
+        cache.set(key, fields, USER_CACHE_SECONDS)
+    return fields
+
+
+def forget_cached_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        try:
+            fields = cached_user_fields(user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not fields['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        user = ClaimsUser.from_db(None, ['id'], [user_id])
+        user.__dict__.update(fields)
+        return user
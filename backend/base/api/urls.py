@@ -1,9 +1,8 @@
 from django.urls import path
-from .views import getRoutes, MyTokenObtainPairView
-from rest_framework_simplejwt.views import TokenRefreshView
+from .views import getRoutes, MyTokenObtainPairView, MyTokenRefreshView
 
 urlpatterns = [
     path("", getRoutes),
     path("token/", MyTokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/refresh/", MyTokenRefreshView.as_view(), name="token_refresh"),
 ]
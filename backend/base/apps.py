@@ -12,9 +12,19 @@ class BaseConfig(AppConfig):
         """
         import base.signals  # Import signals to register them
 
+        from django.db.backends.signals import connection_created
+        from base.sqlite import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid='base.sqlite.apply_pragmas')
+
         # Only start scheduler in production or when running the server
         # Avoid starting it during migrations, tests, etc.
+        # Every worker starts one; a DB lease picks the one that runs jobs.
         import sys
         if 'runserver' in sys.argv or 'gunicorn' in sys.argv[0]:
             from base.scheduler import start_scheduler
             start_scheduler()
+
+            # Fill the availability filters off the startup path
+            import threading
+            from base.availability import warm
+            threading.Thread(target=warm, name='availability-warm', daemon=True).start()
@@ -0,0 +1,209 @@
+"""
+In-process membership filters for the username/email availability checks
+(POST /check_username/ and /check_email/), which the signup form calls on
+every keystroke.
+
+Each worker keeps a Bloom filter of the lowercased usernames and of the
+profile emails. A name the filter has never seen is certainly available
+and is answered without touching the database; anything else (taken, or
+a false positive) is confirmed with the indexed LOWER() lookup.
+
+Every write of a name bumps its NameVersion row in the same transaction,
+so each write gets its own version. A filter built at version v holds
+every name written up to v. A worker reads the current version at most
+every VERSION_CHECK_SECONDS. Whenever that version is ahead of its
+filter, it asks the database and rebuilds the filter on a background
+thread, at most once per REBUILD_SECONDS. A write made in this worker
+is added in place on commit when it is the very next version. Deletes
+need nothing: a stale entry only costs a database lookup.
+
+A name written by another worker can therefore read as available for up
+to VERSION_CHECK_SECONDS. The answer is only advice to the signup form:
+registration checks the database itself.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import NameVersion, UserProfile
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHECK_SECONDS = 1
+REBUILD_SECONDS = 60
+ERROR_RATE = 0.01
+MIN_CAPACITY = 1024
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings: no false negatives, about
+    ERROR_RATE false positives while it holds at most capacity items
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+class NameFilter:
+    """
+    The Bloom filter of one kind of name, loaded from the database by load()
+    """
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.version = None
+        self.built_at = None
+        self.rebuilding = False
+        # Latest version this worker knows of, and when it last looked
+        self.current = None
+        self.checked_at = None
+
+    def _read_version(self):
+        version = (NameVersion.objects.filter(name=self.name)
+                   .values_list('version', flat=True).first())
+        return version or 0
+
+    def _bump_version(self):
+        """
+        This write's version. The UPDATE holds the row (SQLite: the write
+        lock) until the transaction ends, so no two writes share a version.
+        """
+        with transaction.atomic():
+            versions = NameVersion.objects.filter(name=self.name)
+            if not versions.update(version=F('version') + 1):
+                NameVersion.objects.get_or_create(name=self.name)
+                versions.update(version=F('version') + 1)
+            return versions.values_list('version', flat=True).get()
+
+    def rebuild(self):
+        # Version first: names written meanwhile only make the filter a superset
+        version = self._read_version()
+        names = [name.lower() for name in self.load() if name]
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(names)))
+        for name in names:
+            bloom.add(name)
+        with self.lock:
+            self.bloom, self.version, self.built_at = bloom, version, time.monotonic()
+            self._saw(version)
+
+    def _saw(self, version):
+        if self.current is None or version > self.current:
+            self.current = version
+        self.checked_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        except Exception as e:
+            logger.error(f"Could not rebuild the {self.name} availability filter: {e}")
+        finally:
+            with self.lock:
+                self.rebuilding = False
+            close_old_connections()
+
+    def _start_rebuild(self):
+        """
+        Start one background rebuild unless one is running or the filter
+        is younger than REBUILD_SECONDS. Call with the lock held.
+        """
+        if self.rebuilding or (self.built_at is not None
+                               and time.monotonic() - self.built_at < REBUILD_SECONDS):
+            return
+        self.rebuilding = True
+        threading.Thread(target=self._rebuild_in_background,
+                         name=f'availability-{self.name}', daemon=True).start()
+
+    def might_contain(self, name):
+        """
+        False only when name is not in the database (as of at most
+        VERSION_CHECK_SECONDS ago, for names written by other workers)
+        """
+        with self.lock:
+            stale = self.checked_at is None \
+                or time.monotonic() - self.checked_at > VERSION_CHECK_SECONDS
+        if stale:
+            version = self._read_version()
+            with self.lock:
+                self._saw(version)
+        with self.lock:
+            if self.bloom is None or self.version != self.current:
+                self._start_rebuild()
+                return True
+            return name.lower() in self.bloom
+
+    def added(self, name):
+        """
+        Record a new or changed name, from within the transaction writing it
+        """
+        version = self._bump_version()
+        transaction.on_commit(lambda: self._apply(name, version))
+
+    def _apply(self, name, version):
+        with self.lock:
+            # In place only if no other write came in between
+            if self.bloom is not None and version == self.version + 1:
+                self.bloom.add(name.lower())
+                self.version = version
+            self._saw(version)
+
+
+usernames = NameFilter(
+    'usernames', lambda: User.objects.values_list('username', flat=True).iterator())
+emails = NameFilter(
+    'emails', lambda: UserProfile.objects.exclude(email=None)
+    .values_list('email', flat=True).iterator())
+
+
+def warm():
+    usernames.rebuild()
+    emails.rebuild()
+
+
+def lower_equals(field, value):
+    """
+    Filter for field equal to value ignoring case, as LOWER(field) =
+    LOWER(value), which the Lower() indexes serve (__iexact compiles to
+    LIKE/UPPER() and can't use them)
+    """
+    return Exact(Lower(field), Lower(Value(value)))
+
+
+class AvailabilityThrottle(SimpleRateThrottle):
+    """
+    Rate limit per client IP, signed in or not (rate: the 'availability'
+    entry of DEFAULT_THROTTLE_RATES). Behind a proxy, NUM_PROXIES must
+    match the deployment or every client shares the proxy's IP.
+    """
+    scope = 'availability'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
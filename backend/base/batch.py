@@ -0,0 +1,167 @@
+"""
+Applies a batch of expense creates, updates and deletes (POST /expenses/batch/)
+in one transaction.
+
+Rows are written with bulk_create, bulk_update and delete_rows, which skip
+the Expense signals (see base.bulk). The batch's net budget and rollup
+changes are applied here instead: one UPDATE per budget and one delta per
+rollup key, and its change log entries are written in one INSERT each.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .bulk import bulk_written, delete_rows
+from .models import Budget, Expense, UserCategory
+from .rollups import apply_rollup_deltas
+from .serializer import ExpenseBatchSerializer
+from .sync import DELETE, log_changes
+
+MAX_BATCH_ITEMS = 1000
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def _rollup_key(expense):
+    return (expense.user_id, expense.pay_date, expense.category_id, expense.budget_id)
+
+
+def _validate(item, partial, categories, budgets):
+    """
+    Validate one create/update item. Returns (values, errors): values are
+    model field values ready to set, errors is None when the item is valid.
+    """
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ['Expected an object']}
+    data = dict(item)
+    # Handle "no category"/"no budget" like the single expense views
+    for field in ('category', 'budget'):
+        if field in data and data[field] in ('', 0, '0'):
+            data[field] = None
+
+    serializer = ExpenseBatchSerializer(data=data, partial=partial)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    values = dict(serializer.validated_data)
+    errors = {}
+    for field, owned in (('category', categories), ('budget', budgets)):
+        if field not in values:
+            continue
+        pk = values.pop(field)
+        if pk is not None and pk <= 0:
+            pk = None
+        if pk is not None and pk not in owned:
+            errors[field] = [f'Invalid pk "{pk}" - object does not exist.']
+        values[f'{field}_id'] = pk
+    return (None, errors) if errors else (values, None)
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _ids(items, key=None):
+    ids = [item.get(key) if key and isinstance(item, dict) else item for item in items]
+    return [pk for pk in ids if _is_id(pk)]
+
+
+def apply_expense_batch(user, creates=(), updates=(), deletes=()):
+    """
+    Apply every valid item of the batch for user. Invalid items are skipped
+    and reported as {'op', 'index', 'errors'} entries.
+    Returns (created expenses, updated expenses, deleted ids, errors).
+    """
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        raise InvalidBatch("'create', 'update' and 'delete' must be lists")
+    if len(creates) + len(updates) + len(deletes) > MAX_BATCH_ITEMS:
+        raise InvalidBatch(f'A batch is limited to {MAX_BATCH_ITEMS} items')
+
+    categories = set(UserCategory.objects.filter(user=user).values_list('id', flat=True))
+    budgets = set(Budget.objects.filter(user=user).values_list('id', flat=True))
+
+    errors = []
+    budget_deltas = defaultdict(Decimal)
+    rollup_deltas = defaultdict(lambda: [Decimal('0'), 0])
+
+    def add(expense):
+        budget_deltas[expense.budget_id] -= expense.amount
+        rollup = rollup_deltas[_rollup_key(expense)]
+        rollup[0] += expense.amount
+        rollup[1] += 1
+
+    def remove(key, amount):
+        budget_deltas[key[3]] += amount
+        rollup = rollup_deltas[key]
+        rollup[0] -= amount
+        rollup[1] -= 1
+
+    created = []
+    for index, item in enumerate(creates):
+        values, item_errors = _validate(item, False, categories, budgets)
+        if item_errors:
+            errors.append({'op': 'create', 'index': index, 'errors': item_errors})
+            continue
+        expense = Expense(user=user, **values)
+        add(expense)
+        created.append(expense)
+
+    with transaction.atomic():
+        existing = (Expense.objects.select_for_update()
+                    .filter(user=user).in_bulk(_ids(updates, 'id') + _ids(deletes)))
+
+        delete_ids = set()
+        for index, pk in enumerate(deletes):
+            if not _is_id(pk) or pk not in existing or pk in delete_ids:
+                errors.append({'op': 'delete', 'index': index, 'errors': {'id': ['Not found.']}})
+                continue
+            remove(_rollup_key(existing[pk]), existing[pk].amount)
+            delete_ids.add(pk)
+
+        updated = []
+        updated_ids = set()
+        updated_fields = set()
+        for index, item in enumerate(updates):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if not _is_id(pk) or pk not in existing or pk in delete_ids or pk in updated_ids:
+                errors.append({'op': 'update', 'index': index, 'errors': {'id': ['Not found.']}})
+                continue
+            values, item_errors = _validate(
+                {k: v for k, v in item.items() if k != 'id'}, True, categories, budgets)
+            if item_errors:
+                errors.append({'op': 'update', 'index': index, 'errors': item_errors})
+                continue
+            expense = existing[pk]
+            remove(_rollup_key(expense), expense.amount)
+            for field, value in values.items():
+                setattr(expense, field, value)
+            add(expense)
+            updated_fields.update(values)
+            updated.append(expense)
+            updated_ids.add(pk)
+
+        Expense.objects.bulk_create(created, batch_size=500)
+        if updated and updated_fields:
+            Expense.objects.bulk_update(updated, sorted(updated_fields), batch_size=500)
+        if delete_ids:
+            delete_rows(Expense.objects.filter(pk__in=delete_ids))
+
+        for budget_id, delta in budget_deltas.items():
+            if budget_id and delta:
+                Budget.objects.filter(pk=budget_id).update(
+                    remaining_amount=F('remaining_amount') + delta)
+        apply_rollup_deltas(rollup_deltas)
+
+        log_changes([(user.id, 'expenses', expense.pk) for expense in created + updated]
+                    + [(user.id, 'budgets', pk) for pk, delta in budget_deltas.items()
+                       if pk and delta])
+        log_changes([(user.id, 'expenses', pk) for pk in sorted(delete_ids)], DELETE)
+
+    if created or updated or delete_ids:
+        bulk_written(user.id)
+    errors.sort(key=lambda error: (error['op'], error['index']))
+    return created, updated, sorted(delete_ids), errors
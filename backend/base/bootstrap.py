@@ -0,0 +1,55 @@
+"""
+Everything the Home page loads, in one response (GET /bootstrap/).
+
+Each section is one .values() query shaped like its list endpoint, so a
+page view costs one request and one query per section instead of a
+request (authentication, user lookup, middleware) per section. The
+response also carries the user's latest change log seq, read first, so
+the client can keep its copy current with /sync/?since=<seq>.
+"""
+from .fastjson import serialized_rows
+from .models import ChangeLog, UserProfile
+from .pagination import InvalidQueryParam
+from .serializer import UsersProfilesSerializer
+from .sync import SYNC_MODELS
+
+DEFAULT_SECTIONS = ('profile', 'expenses', 'incomes', 'recurring_expenses',
+                    'recurring_incomes', 'budgets', 'categories', 'tasks')
+SECTIONS = ('profile',) + tuple(SYNC_MODELS)
+
+# Same order as the list endpoints (id: ties, and the lists with no order)
+ORDERING = {
+    'expenses': ('pay_date', 'id'),
+    'incomes': ('-date', 'id'),
+    'recurring_expenses': ('-start_date', 'id'),
+    'recurring_incomes': ('-start_date', 'id'),
+}
+
+
+def parse_sections(value):
+    """
+    '?sections=profile,budgets' -> ('profile', 'budgets'); empty means the defaults
+    """
+    if not value:
+        return DEFAULT_SECTIONS
+    sections = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        raise InvalidQueryParam(
+            f"Unknown section(s) {', '.join(unknown)}; choose from {', '.join(SECTIONS)}")
+    return sections or DEFAULT_SECTIONS
+
+
+def build_bootstrap(user, sections=DEFAULT_SECTIONS):
+    data = {'seq': ChangeLog.objects.filter(user=user).order_by('-id')
+            .values_list('id', flat=True).first() or 0}
+    for name in sections:
+        if name == 'profile':
+            data[name] = serialized_rows(
+                UserProfile.objects.filter(user=user), UsersProfilesSerializer).first()
+            continue
+        model, serializer_class = SYNC_MODELS[name]
+        data[name] = list(serialized_rows(
+            model.objects.filter(user=user).order_by(*ORDERING.get(name, ('id',))),
+            serializer_class))
+    return data
@@ -0,0 +1,37 @@
+"""
+Writes that skip the per-row model signals.
+
+For every row saved or deleted, the signals in base/signals.py keep its
+budget's remaining_amount and the daily rollups (expenses), the delta
+sync change log, and its user's cached forecasts and list responses in
+step. bulk_create, bulk_update, QuerySet.update() and delete_rows() send
+no signals, so code that writes rows in bulk replays what its rows need
+itself, in the same transaction:
+- budget and rollup deltas (deduct_budgets, apply_rollup_deltas)
+- change log entries (log_changes, log_matching)
+- and, once it is done, bulk_written() for the caches
+"""
+from .forecast import invalidate_forecast
+from .response_cache import RESOURCES, invalidate_responses
+
+# The lists a forecast is built from
+FORECAST_RESOURCES = frozenset(RESOURCES) - {'tasks', 'category_rules'}
+
+
+def delete_rows(queryset):
+    """
+    Delete the rows with one DELETE, without loading them, sending signals
+    or cascading; only for models no foreign key points at. Returns the
+    number of rows deleted.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def bulk_written(user_id=None, resources=RESOURCES):
+    """
+    Drop the cached list responses of these resources, and the forecasts
+    built from them, for one user or for everyone when user_id is None
+    """
+    if FORECAST_RESOURCES.intersection(resources):
+        invalidate_forecast(user_id)
+    invalidate_responses(user_id, resources)
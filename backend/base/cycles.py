@@ -0,0 +1,80 @@
+"""
+Pay cycle helpers shared by the summary endpoint and the scheduled jobs.
+A cycle starts on the user's pay_day and ends the day before the next one.
+"""
+import calendar
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+ISRAEL_TZ = ZoneInfo('Asia/Jerusalem')
+
+
+def local_today():
+    """
+    Today's date in Israel local time (DST aware)
+    """
+    return timezone.localdate(timezone=ISRAEL_TZ)
+
+
+def parse_pay_day(value, default=1):
+    """
+    UserProfile.pay_day is a free CharField - fall back to the 1st
+    for anything that is not a day of the month
+    """
+    try:
+        day = int(value)
+    except (TypeError, ValueError):
+        return default
+    return day if 1 <= day <= 31 else default
+
+
+def pay_day_in_month(year, month, pay_day):
+    """
+    The date pay_day falls on in the given month. A pay_day past the end
+    of a short month (e.g. 31 in April) falls on its last day instead.
+    """
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, min(pay_day, last_day))
+
+
+def pay_days_due(today):
+    """
+    The pay_day values whose cycle starts today. On the last day of a
+    short month this includes the days the month doesn't have (29-31).
+    """
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    if today.day < last_day:
+        return [today.day]
+    return list(range(today.day, 32))
+
+
+def pay_day_values(days):
+    """
+    pay_day is stored both padded ('05') and unpadded ('5'), match either
+    """
+    return sorted({form for day in days for form in (str(day), str(day).zfill(2))})
+
+
+def _shift_month(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def pay_cycle(pay_day, today=None, offset=0):
+    """
+    Return (start, end) of the pay cycle containing today, both inclusive.
+    offset=1 returns the previous cycle, offset=2 the one before it, etc.
+    A negative offset returns upcoming cycles (-1 is the next one).
+    """
+    today = today or local_today()
+    year, month = today.year, today.month
+    if today < pay_day_in_month(year, month, pay_day):
+        year, month = _shift_month(year, month, -1)
+    year, month = _shift_month(year, month, -offset)
+
+    start = pay_day_in_month(year, month, pay_day)
+    next_year, next_month = _shift_month(year, month, 1)
+    end = pay_day_in_month(next_year, next_month, pay_day) - timedelta(days=1)
+    return start, end
@@ -0,0 +1,102 @@
+"""
+Streaming export of a user's whole ledger (GET /export/).
+
+Each section is read with .values_list().iterator(), so rows come from the
+database cursor in chunks and are written out as they arrive. Memory use
+stays the same however much history the user has.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+from .models import Budget, Expense, Income, RecurringExpense, RecurringIncome, UserCategory
+
+# name -> (model, exported fields); foreign keys export their id, like the API
+SECTIONS = {
+    'categories': (UserCategory, ('id', 'category_name')),
+    'budgets': (Budget, ('id', 'name', 'amount', 'remaining_amount')),
+    'recurring_expenses': (RecurringExpense, (
+        'id', 'start_date', 'end_date', 'frequency', 'description', 'amount',
+        'category', 'budget', 'is_active')),
+    'recurring_incomes': (RecurringIncome, (
+        'id', 'start_date', 'end_date', 'frequency', 'description', 'amount',
+        'category', 'is_active')),
+    'expenses': (Expense, (
+        'id', 'pay_date', 'description', 'amount', 'category', 'budget',
+        'recurring_expense')),
+    'incomes': (Income, (
+        'id', 'date', 'description', 'amount', 'category', 'recurring_income')),
+}
+CHUNK_SIZE = 2000
+
+
+class CSVRenderer(JSONRenderer):
+    """
+    Lets DRF accept ?format=csv. The export streams its own body, so this
+    only renders error responses, which stay JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(JSONRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the line, for csv.writer
+    """
+
+    def write(self, value):
+        return value
+
+
+def _rows(user, name):
+    model, fields = SECTIONS[name]
+    return (model.objects.filter(user=user).order_by('id')
+            .values_list(*fields).iterator(chunk_size=CHUNK_SIZE))
+
+
+def _chunked(lines):
+    """
+    Join lines into blocks of CHUNK_SIZE, one write per block instead of per row
+    """
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= CHUNK_SIZE:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def stream_csv(user, names):
+    """
+    One section is a plain CSV file. Several sections each start with
+    their own header row and every row is prefixed with its section name.
+    """
+    writer = csv.writer(_Echo())
+    prefix = len(names) > 1
+    for name in names:
+        fields = SECTIONS[name][1]
+        yield writer.writerow(('type',) + fields if prefix else fields)
+        if prefix:
+            yield from _chunked(writer.writerow((name,) + row) for row in _rows(user, name))
+        else:
+            yield from _chunked(writer.writerow(row) for row in _rows(user, name))
+
+
+def stream_ndjson(user, names):
+    """
+    One JSON object per line, tagged with its section as "type"
+    """
+    encoder = DjangoJSONEncoder()
+    for name in names:
+        fields = SECTIONS[name][1]
+        yield from _chunked(
+            encoder.encode({'type': name, **dict(zip(fields, row))}) + '\n'
+            for row in _rows(user, name))
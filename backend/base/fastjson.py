@@ -0,0 +1,41 @@
+"""
+Read-only fast path for the list endpoints.
+
+Rows come straight from .values() with the serializer's own field names and
+are encoded by orjson, which gives the same JSON the ModelSerializer would
+(FKs as ids, dates as ISO strings, Decimals as fixed-point strings) without
+building field objects or model instances per row. Writes still go through
+the serializers.
+"""
+from decimal import Decimal
+from functools import lru_cache
+
+import orjson
+from django.http import HttpResponse
+
+
+def _default(value):
+    # What DRF's DecimalField outputs (COERCE_DECIMAL_TO_STRING)
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    raise TypeError
+
+
+@lru_cache(maxsize=None)
+def serializer_fields(serializer_class):
+    """
+    The field names a ModelSerializer outputs, in its order
+    """
+    return tuple(serializer_class().fields)
+
+
+def serialized_rows(queryset, serializer_class):
+    """
+    queryset as dicts shaped like serializer_class(queryset, many=True).data
+    """
+    return queryset.values(*serializer_fields(serializer_class))
+
+
+def json_response(data, status=200):
+    return HttpResponse(orjson.dumps(data, default=_default),
+                        content_type='application/json', status=status)
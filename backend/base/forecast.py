@@ -0,0 +1,174 @@
+"""
+Cash-flow forecast for the coming pay cycles.
+
+Each cycle's projection combines:
+- income: the user's recurring incomes falling in the cycle, or
+  UserProfile.expected_income when they have none
+- recurring spend: the user's recurring expenses falling in the cycle
+- variable spend: the average per cycle of the user's other expenses over
+  the last HISTORY_CYCLES cycles, per category
+For the current cycle, what was already spent replaces the elapsed part.
+
+Results are memoized in the cache per user and day, under versions (see
+base.versions). The model signals bump the user's version, and bulk jobs
+that bypass the signals bump a global one.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .cycles import parse_pay_day, pay_cycle
+from .models import Budget, DailyRollup, Expense, RecurringExpense, RecurringIncome, UserProfile
+from .recurring import active_rules, occurrences_for
+from .versions import bump_versions, current_versions
+
+HISTORY_CYCLES = 3
+MAX_FORECAST_MONTHS = 24
+CACHE_TIMEOUT = 60 * 60 * 24
+
+GLOBAL_VERSION_KEY = 'forecast:version'
+CENT = Decimal('0.01')
+
+
+def _user_version_key(user_id):
+    return f'forecast:version:{user_id}'
+
+
+def invalidate_forecast(user_id=None):
+    """
+    Drop the cached forecasts of one user, or of everyone when user_id is None
+    """
+    bump_versions([GLOBAL_VERSION_KEY if user_id is None else _user_version_key(user_id)])
+
+
+def get_forecast(user, months, today):
+    versions = current_versions([GLOBAL_VERSION_KEY, _user_version_key(user.id)])
+    key = 'forecast:{}:{}:{}:{}:{}'.format(
+        user.id, versions[GLOBAL_VERSION_KEY], versions[_user_version_key(user.id)],
+        today.isoformat(), months)
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = build_forecast(user, months, today)
+        cache.set(key, forecast, CACHE_TIMEOUT)
+    return forecast
+
+
+def _bucket_by_cycle(occurrences, cycles, key=None):
+    """
+    Sum occurrence amounts per cycle (and optionally per key(occurrence))
+    """
+    totals = defaultdict(Decimal)
+    for occurrence in occurrences:
+        for index, (start, end) in enumerate(cycles):
+            if start <= occurrence['date'] <= end:
+                bucket = index if key is None else (index, key(occurrence))
+                totals[bucket] += occurrence['amount']
+                break
+    return totals
+
+
+def build_forecast(user, months, today):
+    profile = UserProfile.objects.filter(user=user).values(
+        'pay_day', 'saving_target', 'expected_income', 'join_date').first() or {}
+    pay_day = parse_pay_day(profile.get('pay_day'))
+    saving_target = Decimal(profile.get('saving_target') or 0)
+    expected_income = Decimal(profile.get('expected_income') or 0)
+
+    cycles = [pay_cycle(pay_day, today, -offset) for offset in range(months)]
+    current_start, current_end = cycles[0]
+
+    # Average variable (non-recurring) spend per cycle over the last cycles,
+    # only counting the cycles the user has been around for
+    history = [pay_cycle(pay_day, today, offset) for offset in range(1, HISTORY_CYCLES + 1)]
+    join_date = profile.get('join_date')
+    covered = sum(1 for _, end in history if not join_date or end >= join_date) or 1
+    history_rows = (Expense.objects
+                    .filter(user=user, recurring_expense__isnull=True,
+                            pay_date__range=(history[-1][0], history[0][1]))
+                    .values('category', 'category__category_name', 'budget')
+                    .annotate(total=Sum('amount'))
+                    .order_by())
+    by_category = defaultdict(lambda: {'total': Decimal('0')})
+    budget_average = defaultdict(Decimal)
+    for row in history_rows:
+        category = by_category[row['category']]
+        category['category'] = row['category']
+        category['category_name'] = row['category__category_name']
+        category['total'] += row['total'] / covered
+        if row['budget']:
+            budget_average[row['budget']] += row['total'] / covered
+    average_spend = sum((row['total'] for row in by_category.values()), Decimal('0'))
+
+    # What the current cycle has actually cost so far
+    spent_so_far = DailyRollup.objects.filter(
+        user=user, day__range=(current_start, today)).aggregate(total=Sum('total'))['total'] or 0
+
+    # Recurring expenses still to come (today's are already posted) and incomes
+    window_end = cycles[-1][1]
+    upcoming = today + timedelta(days=1)
+    recurring_expenses, _ = occurrences_for(
+        active_rules(RecurringExpense, user, upcoming, window_end), upcoming, window_end)
+    rule_budgets = dict(RecurringExpense.objects.filter(
+        user=user, budget__isnull=False).values_list('id', 'budget_id'))
+    recurring_incomes, _ = occurrences_for(
+        active_rules(RecurringIncome, user, current_start, window_end), current_start, window_end)
+    has_recurring_income = RecurringIncome.objects.filter(user=user, is_active=True).exists()
+
+    expense_totals = _bucket_by_cycle(recurring_expenses, cycles)
+    budget_recurring = _bucket_by_cycle(
+        recurring_expenses, cycles[:1], key=lambda occurrence: rule_budgets.get(occurrence['rule']))
+    income_totals = _bucket_by_cycle(recurring_incomes, cycles)
+
+    cycle_days = (current_end - current_start).days + 1
+    remaining_share = Decimal((current_end - today).days) / cycle_days
+
+    projections = []
+    cumulative = Decimal('0')
+    for index, (start, end) in enumerate(cycles):
+        income = income_totals[index] if has_recurring_income else expected_income
+        if index == 0:
+            variable = spent_so_far + average_spend * remaining_share
+        else:
+            variable = average_spend
+        recurring = expense_totals[index]
+        savings = income - recurring - variable
+        cumulative += savings
+        projections.append({
+            'start': start,
+            'end': end,
+            'expected_income': income.quantize(CENT),
+            'recurring_expenses': recurring.quantize(CENT),
+            'variable_expenses': variable.quantize(CENT),
+            'projected_savings': savings.quantize(CENT),
+            'saving_target': saving_target,
+            'meets_saving_target': savings >= saving_target,
+            'cumulative_savings': cumulative.quantize(CENT),
+        })
+
+    budgets = []
+    for budget in Budget.objects.filter(user=user).values('id', 'name', 'remaining_amount'):
+        still_to_spend = (budget_average[budget['id']] * remaining_share
+                          + budget_recurring[(0, budget['id'])])
+        budgets.append({
+            'budget': budget['id'],
+            'name': budget['name'],
+            'remaining_amount': budget['remaining_amount'],
+            'projected_spend': still_to_spend.quantize(CENT),
+            'projected_remaining': (budget['remaining_amount'] - still_to_spend).quantize(CENT),
+        })
+
+    return {
+        'generated_for': today,
+        'months': months,
+        'average_variable_spend': average_spend.quantize(CENT),
+        'by_category': [
+            {'category': row['category'], 'category_name': row['category_name'],
+             'average': row['total'].quantize(CENT)}
+            for row in by_category.values()
+        ],
+        'cycles': projections,
+        'budgets': budgets,
+    }
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from base.sync import TOMBSTONE_DAYS, compact_changelog
+
+
+class Command(BaseCommand):
+    help = 'Drop superseded change log entries and tombstones older than --days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=TOMBSTONE_DAYS,
+            help='Keep delete entries for this many days (clients offline longer must resync)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Number of users compacted per transaction')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.monotonic()
+        result = compact_changelog(
+            tombstone_days=options['days'], chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {result['superseded']} superseded entries and "
+                f"{result['expired']} expired tombstones in {elapsed:.2f}s"
+            )
+        )
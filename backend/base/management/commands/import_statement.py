@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from base.statements import CHUNK_SIZE, StatementError, import_statement
+
+
+class Command(BaseCommand):
+    help = 'Import a bank statement CSV file as expenses and incomes for a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import')
+        parser.add_argument('--user', required=True, help='User id or username')
+        for field in ('date', 'description', 'amount', 'debit', 'credit'):
+            parser.add_argument(
+                f'--{field}-column', dest=f'{field}_column',
+                help=f'Header of the {field} column (default: {field})')
+        parser.add_argument(
+            '--date-format', help='strptime format of the dates (default: common formats)')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument(
+            '--positive-expenses', action='store_true',
+            help='Positive amounts are expenses (e.g. credit card statements)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Number of lines written per transaction')
+
+    def handle(self, *args, **options):
+        lookup = {'id': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        user = User.objects.filter(**lookup).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} does not exist")
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be positive')
+
+        columns = {field: options[f'{field}_column']
+                   for field in ('date', 'description', 'amount', 'debit', 'credit')
+                   if options[f'{field}_column']}
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as lines:
+                result = import_statement(
+                    user, lines, columns=columns, date_format=options['date_format'],
+                    positive_expenses=options['positive_expenses'],
+                    chunk_size=options['chunk_size'])
+        except (OSError, LookupError, StatementError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        for error in result['errors']:
+            self.stdout.write(f"Line {error['line']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result['expenses']} expenses and {result['incomes']} incomes, "
+                f"skipped {result['duplicates']} duplicates and {result['error_count']} "
+                f"invalid lines in {elapsed:.2f}s"
+            )
+        )
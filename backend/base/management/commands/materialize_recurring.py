@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from base.cycles import local_today
+from base.bulk import bulk_written
+from base.materialize import materialize_recurring
+
+
+class Command(BaseCommand):
+    help = 'Post due recurring expenses and incomes into the ledger and deactivate ended rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', help='Post occurrences up to this date (YYYY-MM-DD, default: today in Israel time)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of rules posted per transaction')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+        else:
+            today = local_today()
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.monotonic()
+        result = materialize_recurring(today, options['chunk_size'])
+        bulk_written()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Posted {result['expenses']} expenses and {result['incomes']} incomes, "
+                f"deactivated {result['deactivated']} ended rules (through {today}) in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from base.tokens import BATCH_SIZE, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding refresh tokens and their blacklist entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of tokens deleted per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.monotonic()
+        result = prune_expired_tokens(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Removed {result['pruned_outstanding']} expired tokens and "
+                f"{result['pruned_blacklisted']} blacklist entries in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from base.forecast import invalidate_forecast
+from base.rollups import compare_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRollup table from the expenses and verify it against the raw data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the rollups with the expenses, do not rebuild')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Limit to this user id (can be repeated)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+
+        if not options['check']:
+            created = rebuild_rollups(user_ids)
+            invalidate_forecast()
+            self.stdout.write(f'Rebuilt {created} rollup rows')
+
+        mismatches = compare_rollups(user_ids)
+        for key, expected, actual in mismatches[:20]:
+            self.stdout.write(
+                f'Mismatch {key}: expected {expected}, found {actual}')
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} rollup keys do not match the expenses')
+
+        self.stdout.write(self.style.SUCCESS('Rollups match the expenses'))
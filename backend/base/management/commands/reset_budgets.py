@@ -1,33 +1,63 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_date
+from base.cycles import local_today, pay_day_values, pay_days_due
+from base.bulk import bulk_written
 from base.models import Budget, UserProfile
-from datetime import datetime, timedelta
+from base.sync import log_matching
 
 
 class Command(BaseCommand):
     help = 'Reset budget remaining_amount for users whose pay_date is today'
 
-    def handle(self, *args, **kwargs):
-        # Get today's date in UTC+2 (Israel Time)
-        utc_now = timezone.now()
-        israel_time = utc_now + timedelta(hours=2)
-        today = israel_time.date()
-        today_day = today.day
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date', help='Run as if today were this date (YYYY-MM-DD, Israel time)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Number of users whose budgets are reset per transaction')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+        else:
+            # Today's date in Israel local time
+            today = local_today()
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError('--chunk-size must be positive')
 
-        # Get all user profiles where pay_day matches today's day
-        profiles = UserProfile.objects.filter(pay_day=str(today_day).zfill(2))
+        started = time.monotonic()
+        days = pay_days_due(today)
+        profiles = UserProfile.objects.filter(pay_day__in=pay_day_values(days))
 
+        # Walk the matching users in user_id order, one bulk UPDATE per chunk
+        user_count = 0
         reset_count = 0
-        for profile in profiles:
-            # Reset all budgets for this user
-            budgets = Budget.objects.filter(user=profile.user)
-            for budget in budgets:
-                budget.remaining_amount = budget.amount
-                budget.save()
-                reset_count += 1
+        last_user_id = 0
+        while True:
+            user_ids = list(profiles.filter(user_id__gt=last_user_id)
+                            .order_by('user_id')
+                            .values_list('user_id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            with transaction.atomic():
+                budgets = Budget.objects.filter(user_id__in=user_ids)
+                reset_count += budgets.update(remaining_amount=F('amount'))
+                log_matching(budgets, 'budgets')
+            user_count += len(user_ids)
+            last_user_id = user_ids[-1]
 
+        bulk_written()
+        elapsed = time.monotonic() - started
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully reset {reset_count} budgets for {len(profiles)} users'
+                f'Successfully reset {reset_count} budgets for {user_count} users '
+                f'(pay days {", ".join(map(str, days))} on {today}) in {elapsed:.2f}s'
             )
         )
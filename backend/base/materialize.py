@@ -0,0 +1,142 @@
+"""
+Posts due recurring expense/income occurrences into the ledger as real
+Expense/Income rows. Run once a day by the scheduler (materialize_recurring).
+
+Each rule remembers the last date it was posted through, and the posted
+rows carry a unique (rule, date) constraint, so a rerun never double-posts.
+Rows are inserted with bulk_create, which skips the model signals (see
+base.bulk); budget, rollup and change log updates are applied here once
+per chunk instead.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+
+from .models import Budget, Expense, Income, RecurringExpense, RecurringIncome
+from .recurring import expand_occurrences
+from .rollups import apply_rollup_deltas
+from .sync import MODEL_RESOURCES, log_changes, log_matching
+
+RULE_FIELDS = ('id', 'user_id', 'start_date', 'end_date', 'frequency',
+               'amount', 'description', 'category_id', 'posted_through')
+
+
+def _due_rules(model, today):
+    """
+    Active rules with occurrences between their posted_through and today
+    """
+    return (model.objects
+            .filter(is_active=True, start_date__lte=today)
+            .filter(Q(posted_through__isnull=True) | Q(posted_through__lt=today))
+            .filter(Q(end_date__isnull=True) | Q(posted_through__isnull=True)
+                    | Q(end_date__gt=F('posted_through'))))
+
+
+def _expand_due(rules, today):
+    """
+    Expand each rule from the day after its posted_through (or its start)
+    through today. Returns (rule_index, dates) like expand_occurrences.
+    """
+    first_due = [
+        max(rule['start_date'], rule['posted_through'] + timedelta(days=1))
+        if rule['posted_through'] else rule['start_date']
+        for rule in rules
+    ]
+    rule_index, dates = expand_occurrences(
+        [rule['start_date'] for rule in rules], [rule['end_date'] for rule in rules],
+        [rule['frequency'] for rule in rules], min(first_due), today)
+    keep = dates >= np.array(first_due, dtype='datetime64[D]')[rule_index]
+    return rule_index[keep], dates[keep]
+
+
+def deduct_budgets(totals):
+    """
+    Subtract each budget's total in a single UPDATE ... CASE statement
+    """
+    if not totals:
+        return
+    Budget.objects.filter(pk__in=totals).update(remaining_amount=F('remaining_amount') - Case(
+        *[When(pk=pk, then=Value(total)) for pk, total in totals.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2)))
+
+
+def _post_expenses(rules, today):
+    rule_index, dates = _expand_due(rules, today)
+    expenses = []
+    budget_totals = defaultdict(Decimal)
+    budget_users = {}
+    rollups = defaultdict(lambda: [Decimal('0'), 0])
+    for i, day in zip(rule_index.tolist(), dates.tolist()):
+        rule = rules[i]
+        expenses.append(Expense(
+            user_id=rule['user_id'], pay_date=day, description=rule['description'],
+            amount=rule['amount'], category_id=rule['category_id'],
+            budget_id=rule['budget_id'], recurring_expense_id=rule['id']))
+        if rule['budget_id']:
+            budget_totals[rule['budget_id']] += rule['amount']
+            budget_users[rule['budget_id']] = rule['user_id']
+        rollup = rollups[(rule['user_id'], day, rule['category_id'], rule['budget_id'])]
+        rollup[0] += rule['amount']
+        rollup[1] += 1
+
+    Expense.objects.bulk_create(expenses, batch_size=500)
+    deduct_budgets(budget_totals)
+    apply_rollup_deltas(rollups)
+    log_changes([(expense.user_id, 'expenses', expense.pk) for expense in expenses]
+                + [(user_id, 'budgets', pk) for pk, user_id in budget_users.items()])
+    return len(expenses)
+
+
+def _post_incomes(rules, today):
+    rule_index, dates = _expand_due(rules, today)
+    incomes = [
+        Income(user_id=rules[i]['user_id'], date=day, description=rules[i]['description'],
+               amount=rules[i]['amount'], category_id=rules[i]['category_id'],
+               recurring_income_id=rules[i]['id'])
+        for i, day in zip(rule_index.tolist(), dates.tolist())
+    ]
+    Income.objects.bulk_create(incomes, batch_size=500)
+    log_changes([(income.user_id, 'incomes', income.pk) for income in incomes])
+    return len(incomes)
+
+
+def _materialize(model, fields, post, today, chunk_size):
+    posted = 0
+    last_id = 0
+    due = _due_rules(model, today)
+    while True:
+        rules = list(due.filter(id__gt=last_id).order_by('id').values(*fields)[:chunk_size])
+        if not rules:
+            return posted
+        with transaction.atomic():
+            posted += post(rules, today)
+            model.objects.filter(pk__in=[rule['id'] for rule in rules]).update(
+                posted_through=today)
+            log_changes([(rule['user_id'], MODEL_RESOURCES[model], rule['id']) for rule in rules])
+        last_id = rules[-1]['id']
+
+
+def materialize_recurring(today, chunk_size=500):
+    """
+    Post every due occurrence up to and including today, then deactivate
+    the rules that ended before today. Returns counts of what was done.
+    """
+    expenses = _materialize(RecurringExpense, RULE_FIELDS + ('budget_id',),
+                            _post_expenses, today, chunk_size)
+    incomes = _materialize(RecurringIncome, RULE_FIELDS,
+                           _post_incomes, today, chunk_size)
+
+    deactivated = 0
+    for model in (RecurringExpense, RecurringIncome):
+        ended = model.objects.filter(is_active=True, end_date__lt=today)
+        with transaction.atomic():
+            # Log first, the UPDATE takes them out of the filter
+            log_matching(ended, MODEL_RESOURCES[model])
+            deactivated += ended.update(is_active=False)
+
+    return {'expenses': expenses, 'incomes': incomes, 'deactivated': deactivated}
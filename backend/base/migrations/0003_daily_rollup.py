@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    Expense = apps.get_model('base', 'Expense')
+    DailyRollup = apps.get_model('base', 'DailyRollup')
+    rows = (Expense.objects
+            .values('user_id', 'pay_date', 'category_id', 'budget_id')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+    DailyRollup.objects.bulk_create(
+        (DailyRollup(user_id=row['user_id'], day=row['pay_date'],
+                     category_id=row['category_id'], budget_id=row['budget_id'],
+                     total=row['total'], count=row['count'])
+         for row in rows.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0002_ledger_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to='base.budget')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to='base.usercategory')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='dailyrollup_user_day_idx')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
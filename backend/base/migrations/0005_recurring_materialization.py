@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_existing_rules_posted(apps, schema_editor):
+    # Rules that existed before materialization only post from today on,
+    # their past occurrences were already tracked by hand
+    yesterday = timezone.localdate(timezone=ZoneInfo('Asia/Jerusalem')) - timedelta(days=1)
+    for name in ('RecurringExpense', 'RecurringIncome'):
+        apps.get_model('base', name).objects.update(posted_through=yesterday)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0004_scheduler_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='recurring_expense',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posted_expenses', to='base.recurringexpense'),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='recurring_income',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posted_incomes', to='base.recurringincome'),
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='budget',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_expenses', to='base.budget'),
+        ),
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='posted_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringincome',
+            name='posted_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(fields=('recurring_expense', 'pay_date'), name='expense_recurring_occurrence_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='income',
+            constraint=models.UniqueConstraint(fields=('recurring_income', 'date'), name='income_recurring_occurrence_unique'),
+        ),
+        migrations.RunPython(mark_existing_rules_posted, migrations.RunPython.noop),
+    ]
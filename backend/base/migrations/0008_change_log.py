@@ -0,0 +1,65 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# resource -> model, as in base.sync.SYNC_MODELS
+SYNCED_MODELS = {
+    'categories': 'UserCategory',
+    'budgets': 'Budget',
+    'recurring_expenses': 'RecurringExpense',
+    'recurring_incomes': 'RecurringIncome',
+    'expenses': 'Expense',
+    'incomes': 'Income',
+    'tasks': 'Task',
+    'category_rules': 'CategoryRule',
+}
+
+
+def log_existing_rows(apps, schema_editor):
+    """
+    Start the log with an upsert of every existing row, so syncing from 0
+    rebuilds a user's whole replica
+    """
+    ChangeLog = apps.get_model('base', 'ChangeLog')
+    for resource, model_name in SYNCED_MODELS.items():
+        rows = apps.get_model('base', model_name).objects.order_by('id').values_list('user_id', 'id')
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(user_id=user_id, resource=resource, object_id=pk, action='upsert')
+             for user_id, pk in rows.iterator()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_statement_import'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogHorizon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='changelog_horizon', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=10)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='changelog_user_seq_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
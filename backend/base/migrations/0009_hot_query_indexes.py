@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:17
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# auth.User is not ours to add Meta indexes to, so its index is created here
+USERNAME_LOWER_INDEX = models.Index(Lower('username'), name='auth_user_username_lower_idx')
+
+
+def add_username_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), USERNAME_LOWER_INDEX)
+
+
+def remove_username_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), USERNAME_LOWER_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_change_log'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(fields=['user', 'start_date'], name='recexpense_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringincome',
+            index=models.Index(fields=['user', 'start_date'], name='recincome_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['pay_day'], name='userprofile_pay_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='userprofile_email_lower_idx'),
+        ),
+        migrations.RunPython(add_username_index, remove_username_index),
+    ]
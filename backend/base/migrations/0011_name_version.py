@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    NameVersion = apps.get_model('base', 'NameVersion')
+    NameVersion.objects.bulk_create(
+        [NameVersion(name=name) for name in ('usernames', 'emails')], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_claims_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameVersion',
+            fields=[
+                ('name', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
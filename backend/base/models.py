@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
 
 
 # Create your models here.
@@ -36,6 +38,38 @@ class UserProfile(models.Model):
     def __str__(self):
         return User.objects.get(id=self.user_id).username
 
+    class Meta:
+        indexes = [
+            # Backs reset_budgets' scan for the users whose pay day is today
+            models.Index(fields=['pay_day'], name='userprofile_pay_day_idx'),
+            # Backs the case-insensitive email availability check
+            models.Index(Lower('email'), name='userprofile_email_lower_idx'),
+        ]
+
+
+class ClaimsUser(User):
+    """
+    The user of a request authenticated by TokenUserAuthentication: built
+    from the access token's user_id and the short-lived user cache without
+    a query. Its other fields are deferred. Reading one of the cached
+    fields (is_staff, email, ...) fills them all from the cache; any other
+    field (password, ...) is read from the row.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        from .api.authentication import CACHED_FIELDS, cached_user_fields
+        if fields is None or from_queryset is not None or not set(fields) <= set(CACHED_FIELDS):
+            return super().refresh_from_db(using, fields, from_queryset)
+        try:
+            cached = cached_user_fields(self.pk)
+        except User.DoesNotExist:
+            # Deleted while its token is still valid
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        for name, value in cached.items():
+            self.__dict__.setdefault(name, value)
+
 
 class UserCategory(models.Model):
     user = models.ForeignKey(
@@ -57,10 +91,30 @@ class Income(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(
         UserCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='incomes_categories')
+    # Set when the income was posted by the recurring materialization job
+    recurring_income = models.ForeignKey(
+        'RecurringIncome', on_delete=models.SET_NULL, null=True, blank=True, related_name='posted_incomes')
+    # Set on rows loaded from a bank statement, used to skip re-imported lines
+    import_hash = models.CharField(max_length=64, null=True, blank=True)
 
     def __str__(self):
         return f"{self.user} - {self.date} - {self.description} - {self.amount}"
 
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated /incomes/ listing
+            models.Index(fields=['user', 'date', 'id'],
+                         name='income_user_date_id_idx'),
+        ]
+        constraints = [
+            # A recurring occurrence is never posted twice
+            models.UniqueConstraint(fields=['recurring_income', 'date'],
+                                    name='income_recurring_occurrence_unique'),
+            # A statement line is never imported twice
+            models.UniqueConstraint(fields=['user', 'import_hash'],
+                                    name='income_user_import_hash_unique'),
+        ]
+
 
 class RecurringIncome(models.Model):
     class PaymentFrequency(models.TextChoices):
@@ -83,10 +137,19 @@ class RecurringIncome(models.Model):
     category = models.ForeignKey(
         UserCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_incomes_categories')
     is_active = models.BooleanField(default=True)
+    # Last date whose occurrences were posted as Income rows
+    posted_through = models.DateField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.amount} every {self.frequency}"
 
+    class Meta:
+        indexes = [
+            # Backs the per-user rule lists and the forecast's active rules
+            models.Index(fields=['user', 'start_date'],
+                         name='recincome_user_start_idx'),
+        ]
+
 
 class Expense(models.Model):
     user = models.ForeignKey(
@@ -98,10 +161,62 @@ class Expense(models.Model):
         UserCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='expenses_categories')
     budget = models.ForeignKey(
         'Budget', on_delete=models.SET_NULL, null=True, blank=True, related_name='expenses')
+    # Set when the expense was posted by the recurring materialization job
+    recurring_expense = models.ForeignKey(
+        'RecurringExpense', on_delete=models.SET_NULL, null=True, blank=True, related_name='posted_expenses')
+    # Set on rows loaded from a bank statement, used to skip re-imported lines
+    import_hash = models.CharField(max_length=64, null=True, blank=True)
+
+    # Values the budget/rollup signals diff against on update
+    SNAPSHOT_FIELDS = ('user_id', 'pay_date', 'category_id', 'budget_id', 'amount')
+
+    def _snapshot(self):
+        if any(field not in self.__dict__ for field in self.SNAPSHOT_FIELDS):
+            return None  # deferred fields, let the signal read the row
+        return {field: self.__dict__[field] for field in self.SNAPSHOT_FIELDS}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_values = self._snapshot()
+
+    def save(self, *args, **kwargs):
+        # Run the budget/rollup signal handlers in the same transaction as the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self._loaded_values = self._snapshot()
+        elif getattr(self, '_loaded_values', None) is not None:
+            # Only these were written, the row keeps the loaded values of the rest
+            for field in update_fields:
+                name = self._meta.get_field(field).attname
+                if name in self._loaded_values:
+                    self._loaded_values[name] = self.__dict__[name]
 
     def __str__(self):
         return f"{self.user} - {self.pay_date} - {self.description} - {self.amount}"
 
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated /expenses/ listing
+            models.Index(fields=['user', 'pay_date', 'id'],
+                         name='expense_user_paydate_id_idx'),
+        ]
+        constraints = [
+            # A recurring occurrence is never posted twice
+            models.UniqueConstraint(fields=['recurring_expense', 'pay_date'],
+                                    name='expense_recurring_occurrence_unique'),
+            # A statement line is never imported twice
+            models.UniqueConstraint(fields=['user', 'import_hash'],
+                                    name='expense_user_import_hash_unique'),
+        ]
+
 
 class Budget(models.Model):
     user = models.ForeignKey(
@@ -137,11 +252,22 @@ class RecurringExpense(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(
         UserCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_expenses_categories')
+    budget = models.ForeignKey(
+        Budget, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_expenses')
     is_active = models.BooleanField(default=True)
+    # Last date whose occurrences were posted as Expense rows
+    posted_through = models.DateField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.amount} every {self.frequency}"
 
+    class Meta:
+        indexes = [
+            # Backs the per-user rule lists and the forecast's active rules
+            models.Index(fields=['user', 'start_date'],
+                         name='recexpense_user_start_idx'),
+        ]
+
 
 class Task(models.Model):
     user = models.ForeignKey(
@@ -151,3 +277,143 @@ class Task(models.Model):
 
     class Meta:
         verbose_name_plural = 'Tasks'
+        indexes = [
+            # Backs the per-user task list and the bulk done/not-done operations
+            models.Index(fields=['user', 'is_done'],
+                         name='task_user_is_done_idx'),
+        ]
+
+
+class CategoryRule(models.Model):
+    """
+    Assigns a category (and optionally a budget) to imported statement
+    lines whose description contains pattern, case-insensitively.
+    Rules are tried in creation order and the first match wins.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='category_rules')
+    pattern = models.CharField(max_length=100)
+    category = models.ForeignKey(
+        UserCategory, on_delete=models.CASCADE, related_name='rules')
+    budget = models.ForeignKey(
+        Budget, on_delete=models.SET_NULL, null=True, blank=True, related_name='category_rules')
+
+    def __str__(self):
+        return f"{self.user} - '{self.pattern}' -> {self.category.category_name}"
+
+
+class DailyRollup(models.Model):
+    """
+    Pre-aggregated expense totals per user, day, category and budget.
+    Maintained incrementally by the Expense signals; rows are additive, so
+    readers always Sum() them and a duplicate key row is harmless.
+    Rebuild with `manage.py rebuild_rollups`.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField(null=True, blank=True)
+    category = models.ForeignKey(
+        UserCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_rollups')
+    budget = models.ForeignKey(
+        Budget, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_rollups')
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.day} - {self.total} ({self.count})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'day'],
+                         name='dailyrollup_user_day_idx'),
+        ]
+
+
+class ChangeLog(models.Model):
+    """
+    One row per change to a user's synced data, for the delta sync
+    (GET /sync/?since=<seq>). The id is the sequence number: it only grows,
+    so "everything after seq" is exactly what a client has not seen.
+    Written by the model signals and by the bulk jobs that bypass them;
+    `manage.py compact_changelog` keeps only the latest row per object.
+    """
+    class Action(models.TextChoices):
+        UPSERT = 'upsert', _('Upsert')
+        DELETE = 'delete', _('Delete')
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='changes')
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=Action.choices)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.user} - {self.action} {self.resource} {self.object_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='changelog_user_seq_idx'),
+        ]
+
+
+class ChangeLogHorizon(models.Model):
+    """
+    The highest sequence number whose tombstone compaction has dropped for
+    a user. A client that last synced before it may have missed deletes
+    and has to sync again from scratch.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='changelog_horizon')
+    seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} compacted through #{self.seq}"
+
+
+class SchedulerLease(models.Model):
+    """
+    A named lease held by one process until expires_at.
+    The scheduler uses it to elect a single leader among the workers.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner} until {self.expires_at}"
+
+
+class ScheduledJob(models.Model):
+    """
+    Last run of each scheduled job, used to catch up runs missed while
+    no worker was up
+    """
+    class Status(models.TextChoices):
+        SUCCESS = 'success', _('Success')
+        FAILED = 'failed', _('Failed')
+
+    job_id = models.CharField(max_length=100, unique=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_duration = models.FloatField(null=True, blank=True)
+    last_status = models.CharField(
+        max_length=10, choices=Status.choices, blank=True)
+    last_error = models.TextField(blank=True)
+    last_run_by = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.job_id} - {self.last_status} at {self.last_run_at}"
+
+
+class NameVersion(models.Model):
+    """
+    Write counter of one availability filter's names (usernames, emails),
+    bumped in the transaction that writes a name
+    """
+    name = models.CharField(max_length=30, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} at {self.version}"
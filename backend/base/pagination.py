@@ -0,0 +1,142 @@
+"""
+Keyset (cursor) pagination for the date-ordered ledger endpoints.
+A page is fetched with "WHERE (date, id) > cursor ORDER BY date, id LIMIT n",
+so it costs the same on page 1 and on page 1000.
+"""
+import base64
+import binascii
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_date
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidQueryParam(ValueError):
+    """Raised when a list query parameter can not be parsed"""
+
+
+def is_paginated(request):
+    """
+    Pagination is opt-in so existing clients keep getting a plain list
+    """
+    return 'cursor' in request.query_params or 'limit' in request.query_params
+
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidQueryParam(f"'{name}' must be a date in YYYY-MM-DD format")
+    return parsed
+
+
+def parse_id_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidQueryParam(f"'{name}' must be an integer")
+
+
+def filter_ledger(queryset, request, date_field, id_filters=()):
+    """
+    Apply the ?from=&to= date range and the given foreign key filters
+    (e.g. ?category=3&budget=7) to a ledger queryset
+    """
+    date_from = parse_date_param(request, 'from')
+    date_to = parse_date_param(request, 'to')
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{date_field}__lte': date_to})
+
+    for name in id_filters:
+        value = parse_id_param(request, name)
+        if value is not None:
+            queryset = queryset.filter(**{f'{name}_id': value})
+    return queryset
+
+
+def encode_cursor(date_value, pk):
+    raw = f"{date_value.isoformat() if date_value else ''}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw_date, raw_pk = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        date_value = parse_date(raw_date) if raw_date else None
+        if raw_date and date_value is None:
+            raise ValueError
+        return date_value, int(raw_pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidQueryParam("Invalid cursor")
+
+
+def get_page_size(request):
+    value = parse_id_param(request, 'limit')
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    if value <= 0:
+        raise InvalidQueryParam("'limit' must be a positive integer")
+    return min(value, MAX_PAGE_SIZE)
+
+
+def keyset_paginate(queryset, request, date_field, descending=False):
+    """
+    Return (rows, next_cursor) for one page ordered by (date_field, id).
+    Rows are model instances, or dicts for a .values() queryset.
+    Rows without a date sort before dated rows when ascending and after
+    them when descending, on every database backend.
+    """
+    page_size = get_page_size(request)
+    cursor = request.query_params.get('cursor')
+
+    if descending:
+        ordering = (F(date_field).desc(nulls_last=True), F('id').desc())
+    else:
+        ordering = (F(date_field).asc(nulls_first=True), F('id').asc())
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            _after_cursor(date_field, last_date, last_id, descending))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last[date_field], last['id'])
+        else:
+            next_cursor = encode_cursor(getattr(last, date_field), last.id)
+    return rows, next_cursor
+
+
+def _after_cursor(date_field, last_date, last_id, descending):
+    is_null = Q(**{f'{date_field}__isnull': True})
+    id_lookup = 'id__lt' if descending else 'id__gt'
+
+    if last_date is None:
+        same_key = is_null & Q(**{id_lookup: last_id})
+        # Ascending: every dated row still follows the undated block
+        return same_key if descending else same_key | ~is_null
+
+    date_lookup = f'{date_field}__lt' if descending else f'{date_field}__gt'
+    later = Q(**{date_lookup: last_date}) | Q(
+        **{date_field: last_date, id_lookup: last_id})
+    # Descending: the undated block still follows every dated row
+    return later | is_null if descending else later
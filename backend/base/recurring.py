@@ -0,0 +1,161 @@
+"""
+Recurring transaction occurrence engine.
+Expands RecurringExpense/RecurringIncome rules into the dates they fall on
+inside a window. All rules of one frequency are expanded together with
+NumPy date arithmetic - there is no per-rule or per-day Python loop.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from django.db.models import Q
+
+from .models import RecurringExpense, RecurringIncome
+
+# Fixed-length frequencies, in days
+FREQUENCY_DAYS = {
+    RecurringExpense.PaymentFrequency.WEEKLY: 7,
+    RecurringExpense.PaymentFrequency.BIWEEKLY: 14,
+}
+# Calendar frequencies, in months. The day of month follows start_date and
+# is clamped to the end of shorter months (Jan 31 -> Feb 28 -> Mar 31).
+FREQUENCY_MONTHS = {
+    RecurringExpense.PaymentFrequency.MONTHLY: 1,
+    RecurringExpense.PaymentFrequency.BIMONTHLY: 2,
+}
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def _repeat_ranges(first_k, last_k):
+    """
+    For rules i with index ranges [first_k[i], last_k[i]] return
+    (rule position, occurrence index k) for every occurrence, flattened
+    """
+    counts = np.maximum(last_k - first_k + 1, 0)
+    positions = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.cumsum(counts) - counts
+    k = first_k[positions] + np.arange(counts.sum()) - offsets[positions]
+    return positions, k
+
+
+def _expand_days(starts, ends, window_start, step):
+    first_k = np.maximum(_ceil_div((window_start - starts).astype(np.int64), step), 0)
+    last_k = (ends - starts).astype(np.int64) // step
+    positions, k = _repeat_ranges(first_k, last_k)
+    return positions, starts[positions] + (k * step).astype('timedelta64[D]')
+
+
+def _month_dates(start_months, start_days, k, step):
+    months = (start_months + k * step).astype('datetime64[M]')
+    first_days = months.astype('datetime64[D]')
+    month_lengths = ((months + 1).astype('datetime64[D]') - first_days).astype(np.int64)
+    return first_days + (np.minimum(start_days, month_lengths) - 1).astype('timedelta64[D]')
+
+
+def _expand_months(starts, ends, window_start, step):
+    start_months = starts.astype('datetime64[M]').astype(np.int64)
+    start_days = (starts - starts.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+    window_month = window_start.astype('datetime64[M]').astype(np.int64)
+    end_months = ends.astype('datetime64[M]').astype(np.int64)
+
+    first_k = np.maximum(_ceil_div(window_month - start_months, step), 0)
+    # The occurrence in the window's first month may fall before window_start
+    first_k += _month_dates(start_months, start_days, first_k, step) < window_start
+    last_k = (end_months - start_months) // step
+    last_k -= _month_dates(start_months, start_days, last_k, step) > ends
+
+    positions, k = _repeat_ranges(first_k, last_k)
+    return positions, _month_dates(start_months[positions], start_days[positions], k, step)
+
+
+def expand_occurrences(start_dates, end_dates, frequencies, window_start, window_end):
+    """
+    Expand rules into occurrences between window_start and window_end (inclusive).
+    end_dates entries may be None for open-ended rules.
+    Returns (rule_index, dates): parallel arrays sorted by date, where
+    rule_index points back into the input sequences.
+    """
+    window_start = np.datetime64(window_start, 'D')
+    window_end = np.datetime64(window_end, 'D')
+    if not len(start_dates):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[D]')
+
+    starts = np.array(start_dates, dtype='datetime64[D]')
+    ends = np.array(end_dates, dtype='datetime64[D]')  # None -> NaT
+    ends = np.where(np.isnat(ends) | (ends > window_end), window_end, ends)
+    frequencies = np.array(frequencies)
+
+    rule_parts, date_parts = [], []
+    for expand, steps in ((_expand_days, FREQUENCY_DAYS), (_expand_months, FREQUENCY_MONTHS)):
+        for code, step in steps.items():
+            selected = np.flatnonzero(frequencies == code)
+            if not len(selected):
+                continue
+            positions, dates = expand(starts[selected], ends[selected], window_start, step)
+            rule_parts.append(selected[positions])
+            date_parts.append(dates)
+
+    if not rule_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[D]')
+    rule_index = np.concatenate(rule_parts)
+    dates = np.concatenate(date_parts)
+    order = np.lexsort((rule_index, dates))
+    return rule_index[order], dates[order]
+
+
+def active_rules(model, user, window_start, window_end):
+    """
+    The user's active rules of the given model that can fall inside the window
+    """
+    return (model.objects
+            .filter(user=user, is_active=True, start_date__lte=window_end)
+            .filter(Q(end_date__isnull=True) | Q(end_date__gte=window_start))
+            .order_by('id'))
+
+
+def occurrences_for(rules, window_start, window_end):
+    """
+    Expand a queryset of RecurringExpense/RecurringIncome rules into
+    occurrence dicts sorted by date, plus the window total
+    """
+    rows = list(rules.values_list(
+        'id', 'start_date', 'end_date', 'frequency', 'amount', 'description', 'category_id'))
+    if not rows:
+        return [], Decimal('0')
+
+    ids, starts, ends, frequencies, amounts, descriptions, categories = zip(*rows)
+    rule_index, dates = expand_occurrences(starts, ends, frequencies, window_start, window_end)
+
+    cents = np.array([int(amount * 100) for amount in amounts], dtype=np.int64)
+    total = Decimal(int(cents[rule_index].sum())) / 100
+
+    occurrences = [
+        {
+            'rule': ids[i],
+            'date': day,
+            'amount': amounts[i],
+            'description': descriptions[i],
+            'category': categories[i],
+        }
+        for i, day in zip(rule_index.tolist(), dates.tolist())
+    ]
+    return occurrences, total
+
+
+def recurring_occurrences(user, window_start, window_end):
+    """
+    All of a user's recurring expense and income occurrences in the window
+    """
+    expenses, expenses_total = occurrences_for(
+        active_rules(RecurringExpense, user, window_start, window_end), window_start, window_end)
+    incomes, incomes_total = occurrences_for(
+        active_rules(RecurringIncome, user, window_start, window_end), window_start, window_end)
+    return {
+        'expenses': expenses,
+        'incomes': incomes,
+        'expenses_total': expenses_total,
+        'incomes_total': incomes_total,
+    }
@@ -0,0 +1,55 @@
+"""
+Account creation (POST /register/).
+
+The password is hashed before anything is written, so the slow PBKDF2
+run never holds the database's write lock. The account itself (user,
+profile, default categories and budgets) is then written in one short
+transaction, so a failure never leaves a half-built account. Signups are
+throttled per client IP, which also bounds the hashing a client can
+trigger.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import Budget, UserCategory, UserProfile
+from .response_cache import invalidate_responses
+from .sync import log_changes
+
+
+class RegisterThrottle(SimpleRateThrottle):
+    """
+    Rate limit per client IP (rate: the 'register' entry of
+    DEFAULT_THROTTLE_RATES)
+    """
+    scope = 'register'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+def create_account(username, raw_password):
+    """
+    Create the user with their profile and the configured default
+    categories and budgets. Raises IntegrityError if the username was
+    taken in the meantime.
+    """
+    password_hash = make_password(raw_password)
+    with transaction.atomic():
+        user = User.objects.create(username=username, password=password_hash)
+        UserProfile.objects.create(
+            user=user, first_name='', last_name='', email='', pay_day=1, salary_day=1)
+        categories = UserCategory.objects.bulk_create(
+            [UserCategory(user=user, category_name=name)
+             for name in settings.DEFAULT_USER_CATEGORIES])
+        budgets = Budget.objects.bulk_create(
+            [Budget(user=user, name=budget['name'], amount=budget['amount'],
+                    remaining_amount=budget['amount'])
+             for budget in settings.DEFAULT_USER_BUDGETS])
+        # bulk_create skips the signals (see base.bulk)
+        log_changes([(user.id, 'categories', category.pk) for category in categories]
+                    + [(user.id, 'budgets', budget.pk) for budget in budgets])
+    invalidate_responses(user.id)
+    return user
@@ -0,0 +1,134 @@
+"""
+Per-user cache and conditional GETs for the list responses.
+
+Every list is a resource ('expenses', 'budgets', ...) with a version per
+user, bumped by the model signals whenever its data may have changed (bulk
+jobs that bypass the signals bump a global version instead). Responses are
+cached under, and carry a strong ETag made of, the current versions:
+- If-None-Match with the current ETag is answered 304 after one version
+  lookup, without running the view
+- otherwise a body cached under the current versions is served as is
+A write is therefore visible on the next read and old entries just expire.
+
+Hits, misses and 304s are counted in memory, per worker process: a hit or
+a 304 only reads the cache, never writes it.
+"""
+import hashlib
+import threading
+from collections import Counter
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from .versions import bump_versions, current_versions
+
+GLOBAL_VERSION_KEY = 'responses:version'
+CACHE_TIMEOUT = 60 * 60
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+RESOURCES = ('expenses', 'incomes', 'budgets', 'categories', 'recurring_expenses',
+             'recurring_incomes', 'tasks', 'category_rules')
+
+
+def _version_key(user_id, resource):
+    return f'responses:version:{user_id}:{resource}'
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def invalidate_responses(user_id=None, resources=RESOURCES):
+    """
+    Drop the cached responses of these resources for one user, or of
+    everything for everyone when user_id is None
+    """
+    if user_id is None:
+        keys = [GLOBAL_VERSION_KEY]
+    else:
+        keys = [_version_key(user_id, resource) for resource in resources]
+    bump_versions(keys)
+
+
+def _versions(user_id, resource):
+    keys = [GLOBAL_VERSION_KEY, _version_key(user_id, resource)]
+    versions = current_versions(keys)
+    return versions[keys[0]], versions[keys[1]]
+
+
+def cache_list_response(resource):
+    """
+    Serve the view's successful GETs from the cache and answer matching
+    If-None-Match with 304. Goes under @api_view/@permission_classes so the
+    user is already authenticated.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            global_version, version = _versions(request.user.id, resource)
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            etag = f'"{resource}-{request.user.id}-{global_version}-{version}-{path[:16]}"'
+
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                _count('not_modified')
+                return _tag(HttpResponseNotModified(), etag)
+
+            key = f'responses:{request.user.id}:{resource}:{global_version}:{version}:{path}'
+            cached = cache.get(key)
+            if cached is not None:
+                _count('hits')
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Cache'] = 'HIT'
+                return _tag(response, etag)
+
+            _count('misses')
+            response = view(request, *args, **kwargs)
+            # Only plain rendered bodies; DRF Responses are errors here
+            if response.status_code != 200 or isinstance(response, Response) \
+                    or not isinstance(response, HttpResponse):
+                return response
+            cache.set(key, (response.content, response['Content-Type']), CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+            return _tag(response, etag)
+
+        return wrapper
+    return decorator
+
+
+def _tag(response, etag):
+    response['ETag'] = etag
+    # Let browsers keep the body but always revalidate it
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def cache_stats():
+    """
+    This worker's counts since it started or they were reset
+    """
+    with _stats_lock:
+        hits, misses, not_modified = _stats['hits'], _stats['misses'], _stats['not_modified']
+    served = hits + misses + not_modified
+    return {
+        'hits': hits,
+        'misses': misses,
+        'not_modified': not_modified,
+        'hit_rate': round((hits + not_modified) / served, 4) if served else None,
+    }
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
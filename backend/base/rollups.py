@@ -0,0 +1,149 @@
+"""
+Incremental maintenance of the DailyRollup table.
+The Expense signals push +/- deltas here, and the rebuild_rollups
+management command recomputes everything from the raw expenses.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Subquery, Sum
+
+from .models import DailyRollup, Expense
+
+ROLLUP_KEY = ('user_id', 'day', 'category_id', 'budget_id')
+
+
+def apply_rollup_delta(user_id, day, category_id, budget_id, amount, count):
+    """
+    Add amount/count to the rollup row for this key, creating it when an
+    expense is added to a new key. Rows that drop to zero expenses are removed.
+    """
+    if not amount and not count:
+        return
+    rows = DailyRollup.objects.filter(
+        user_id=user_id, day=day, category_id=category_id, budget_id=budget_id)
+    # Touch a single row so a duplicate key row is never counted twice
+    updated = DailyRollup.objects.filter(pk=Subquery(rows.values('pk')[:1])).update(
+        total=F('total') + amount, count=F('count') + count)
+    if not updated:
+        # Nothing to subtract from (e.g. the user is being deleted and the
+        # rollups went first) - only additions create a row
+        if count > 0:
+            DailyRollup.objects.create(
+                user_id=user_id, day=day, category_id=category_id,
+                budget_id=budget_id, total=amount, count=count)
+    elif count < 0:
+        rows.filter(count__lte=0, total=0).delete()
+
+
+def apply_rollup_deltas(deltas, batch_size=500):
+    """
+    Apply many {key: (amount, count)} deltas at once, like apply_rollup_delta
+    for each: per batch of keys one SELECT, one batched UPDATE, one INSERT
+    and one DELETE instead of a couple of queries per key.
+    """
+    items = [(key, delta) for key, delta in deltas.items() if delta[0] or delta[1]]
+    for start in range(0, len(items), batch_size):
+        batch = dict(items[start:start + batch_size])
+        days = {key[1] for key in batch}
+        day_filter = Q(day__in=days - {None})
+        if None in days:
+            day_filter |= Q(day__isnull=True)
+        rows = DailyRollup.objects.filter(
+            day_filter, user_id__in={key[0] for key in batch})
+
+        # The first row of each key, so a duplicate key row is never counted twice
+        existing = {}
+        for pk, *key in rows.order_by('pk').values_list('pk', *ROLLUP_KEY):
+            existing.setdefault(tuple(key), pk)
+        updates = [(amount, count, existing[key])
+                   for key, (amount, count) in batch.items() if key in existing]
+
+        if updates:
+            # executemany of a relative UPDATE: an ORM Case/When over hundreds
+            # of rows costs more to build than to run
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    'UPDATE {table} SET {total} = {total} + %s, {count} = {count} + %s '
+                    'WHERE {pk} = %s'.format(
+                        table=quote(DailyRollup._meta.db_table), total=quote('total'),
+                        count=quote('count'), pk=quote('id')),
+                    updates)
+            DailyRollup.objects.filter(
+                pk__in=[pk for _, _, pk in updates], count__lte=0, total=0).delete()
+        DailyRollup.objects.bulk_create([
+            DailyRollup(user_id=key[0], day=key[1], category_id=key[2], budget_id=key[3],
+                        total=amount, count=count)
+            for key, (amount, count) in batch.items()
+            if key not in existing and count > 0
+        ])
+
+
+def _expense_aggregates(user_ids=None):
+    expenses = Expense.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+    return (expenses
+            .values('user_id', 'pay_date', 'category_id', 'budget_id')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+
+
+def rebuild_rollups(user_ids=None, batch_size=1000):
+    """
+    Replace the rollups (for the given users, or everyone) with totals
+    recomputed from the expenses table. Returns the number of rows written.
+    """
+    with transaction.atomic():
+        rollups = DailyRollup.objects.all()
+        if user_ids is not None:
+            rollups = rollups.filter(user_id__in=user_ids)
+        rollups.delete()
+
+        created = 0
+        batch = []
+        for row in _expense_aggregates(user_ids).iterator(chunk_size=batch_size):
+            batch.append(DailyRollup(
+                user_id=row['user_id'], day=row['pay_date'],
+                category_id=row['category_id'], budget_id=row['budget_id'],
+                total=row['total'], count=row['count']))
+            if len(batch) >= batch_size:
+                DailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            DailyRollup.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
+
+def compare_rollups(user_ids=None):
+    """
+    Compare the rollups against the raw expenses.
+    Returns a list of (key, expected (total, count), actual (total, count))
+    for every key that disagrees.
+    """
+    expected = {
+        (row['user_id'], row['pay_date'], row['category_id'], row['budget_id']):
+            (row['total'], row['count'])
+        for row in _expense_aggregates(user_ids)
+    }
+
+    rollups = DailyRollup.objects.all()
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+    actual = {
+        tuple(row[field] for field in ROLLUP_KEY): (row['sum_total'], row['sum_count'])
+        for row in rollups.values(*ROLLUP_KEY)
+        .annotate(sum_total=Sum('total'), sum_count=Sum('count')).order_by()
+    }
+
+    empty = (Decimal('0'), 0)
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        want = expected.get(key, empty)
+        got = actual.get(key, empty)
+        if want[0] != got[0] or want[1] != got[1]:
+            mismatches.append((key, want, got))
+    return mismatches
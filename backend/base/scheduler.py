@@ -1,27 +1,248 @@
 """
 Budget Reset Scheduler - Cross-platform solution using APScheduler
 Works on Windows, Linux, and macOS
+
+Every worker process starts a scheduler, but only the one holding the
+'scheduler-leader' lease runs jobs. Each worker renews or tries to take the
+lease on a heartbeat, so if the leader dies another worker takes over and
+catches up on any run that was missed in between.
 """
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
 from django.core.management import call_command
-from django.conf import settings
-import logging
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
 import pytz
 
+from base.models import ScheduledJob, SchedulerLease
+
 logger = logging.getLogger(__name__)
 
+israel_tz = pytz.timezone('Asia/Jerusalem')
+
+LEADER_LEASE = 'scheduler-leader'
+LEASE_SECONDS = 90
+HEARTBEAT_SECONDS = 30
+# A run is left to its own trigger this long before catch-up takes it on
+CATCH_UP_AFTER_SECONDS = 5 * 60
+# A failed run is retried this long after the attempt
+RETRY_SECONDS = 15 * 60
+
+# Identifies this process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_is_leader = False
+# Held while a job runs in this process, so the trigger and catch-up never
+# run the same job at once
+_job_locks = {}
 
-def reset_budgets_job():
+
+def _date_args(day):
+    return ['--date', day.isoformat()] if day else []
+
+
+def reset_budgets_job(day=None):
     """
     Job function that runs the reset_budgets management command
     This will be executed daily at midnight
     """
+    call_command('reset_budgets', *_date_args(day))
+
+
+def materialize_recurring_job(day=None):
+    """
+    Posts the day's recurring expenses/incomes, right after the budget reset
+    so the new cycle's budgets are charged
+    """
+    call_command('materialize_recurring', *_date_args(day))
+
+
+def compact_changelog_job(day=None):
+    """
+    Keeps the delta sync change log down to one entry per object,
+    at a quiet hour after the daily jobs have logged their changes
+    """
+    call_command('compact_changelog')
+
+
+def prune_tokens_job(day=None):
+    """
+    Deletes expired refresh tokens from the blacklist tables, which every
+    token refresh grows
+    """
+    call_command('prune_tokens')
+
+
+# job id -> (function, trigger). The function takes the (Israel) date of
+# the run it is doing, or None for today.
+JOBS = {
+    'reset_budgets_daily': (
+        reset_budgets_job, CronTrigger(hour=0, minute=0, timezone=israel_tz)),
+    'materialize_recurring_daily': (
+        materialize_recurring_job, CronTrigger(hour=0, minute=5, timezone=israel_tz)),
+    'compact_changelog_daily': (
+        compact_changelog_job, CronTrigger(hour=3, minute=0, timezone=israel_tz)),
+    'prune_tokens_daily': (
+        prune_tokens_job, CronTrigger(hour=3, minute=30, timezone=israel_tz)),
+}
+
+
+def acquire_lease(name, owner, seconds, now=None):
+    """
+    Take or renew the named lease for owner. Returns True if owner holds it.
+    The conditional UPDATE is atomic, so two workers can't both win.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=seconds)
+    taken = (SchedulerLease.objects.filter(name=name)
+             .filter(Q(owner=owner) | Q(expires_at__lt=now))
+             .update(owner=owner, expires_at=expires_at))
+    if taken:
+        return True
     try:
-        logger.info("Running scheduled budget reset...")
-        call_command('reset_budgets')
-        logger.info("Budget reset completed successfully")
+        with transaction.atomic():
+            SchedulerLease.objects.create(
+                name=name, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(name, owner):
+    SchedulerLease.objects.filter(name=name, owner=owner).delete()
+
+
+def run_job(job_id, day=None, due_at=None):
+    """
+    Run a registered job for day (None: today) and record when it ran, how
+    long it took and whether it succeeded. due_at is the trigger time the
+    run stands for, recorded as last_success_at so catch-up resumes after
+    it (default: now). Returns False if it failed or was already running.
+    """
+    func, _ = JOBS[job_id]
+    lock = _job_locks.setdefault(job_id, threading.Lock())
+    if not lock.acquire(blocking=False):
+        logger.info(f"Skipping {job_id}, it is already running")
+        return False
+    try:
+        started_at = timezone.now()
+        started = time.monotonic()
+        status, error = ScheduledJob.Status.SUCCESS, ''
+        try:
+            logger.info(f"Running scheduled job {job_id}{f' for {day}' if day else ''}...")
+            func(day)
+            logger.info(f"Scheduled job {job_id} completed successfully")
+        except Exception as e:
+            status, error = ScheduledJob.Status.FAILED, str(e)
+            logger.error(f"Error running scheduled job {job_id}: {e}")
+
+        defaults = {
+            'last_run_at': started_at,
+            'last_duration': time.monotonic() - started,
+            'last_status': status,
+            'last_error': error,
+            'last_run_by': WORKER_ID,
+        }
+        # Only a success moves catch-up past the run
+        if status == ScheduledJob.Status.SUCCESS:
+            defaults['last_success_at'] = due_at or started_at
+        ScheduledJob.objects.update_or_create(job_id=job_id, defaults=defaults)
+        return status == ScheduledJob.Status.SUCCESS
+    finally:
+        lock.release()
+
+
+def run_scheduled_job(job_id):
+    """
+    Trigger entry point: only the lease holder runs the job
+    """
+    try:
+        if not acquire_lease(LEADER_LEASE, WORKER_ID, LEASE_SECONDS):
+            logger.debug(f"Skipping {job_id}, another worker is the scheduler leader")
+            return
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def missed_runs(trigger, last_success_at, until):
+    """
+    The trigger's fire times after last_success_at, up to until
+    """
+    runs = []
+    due_at = trigger.get_next_fire_time(None, last_success_at + timedelta(seconds=1))
+    while due_at and due_at <= until:
+        runs.append(due_at)
+        due_at = trigger.get_next_fire_time(due_at, due_at + timedelta(seconds=1))
+    return runs
+
+
+def catch_up_missed_jobs(now=None):
+    """
+    Run, oldest first and each for its own date, every trigger time since
+    a job's last success that its trigger didn't cover. A job stops at its
+    first failure, which is retried RETRY_SECONDS later.
+    Jobs that never succeeded have nothing to catch up on.
+    """
+    now = now or timezone.now()
+    until = now - timedelta(seconds=CATCH_UP_AFTER_SECONDS)
+    states = {state.job_id: state for state in ScheduledJob.objects.filter(job_id__in=JOBS)}
+    runs = []
+    for job_id, (_, trigger) in JOBS.items():
+        state = states.get(job_id)
+        if not state or not state.last_success_at:
+            continue
+        if state.last_status == ScheduledJob.Status.FAILED and \
+                state.last_run_at and now - state.last_run_at < timedelta(seconds=RETRY_SECONDS):
+            continue
+        runs += [(due_at, job_id) for due_at in missed_runs(trigger, state.last_success_at, until)]
+
+    failed = set()
+    # In time order, so e.g. a day's budget reset comes before its postings
+    for due_at, job_id in sorted(runs):
+        if job_id in failed:
+            continue
+        logger.info(f"Catching up on {job_id}, missed run at {due_at}")
+        if not run_job(job_id, due_at.astimezone(israel_tz).date(), due_at):
+            failed.add(job_id)
+
+
+def heartbeat():
+    """
+    Renew (or try to take) the leader lease. The leader catches up on runs
+    missed while there was none, and retries failed ones.
+    """
+    global _is_leader
+    try:
+        was_leader = _is_leader
+        _is_leader = acquire_lease(LEADER_LEASE, WORKER_ID, LEASE_SECONDS)
+        if _is_leader and not was_leader:
+            logger.info(f"Worker {WORKER_ID} is now the scheduler leader")
+        if _is_leader:
+            catch_up_missed_jobs()
     except Exception as e:
-        logger.error(f"Error running budget reset: {e}")
+        logger.error(f"Scheduler heartbeat failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def _shutdown(scheduler):
+    scheduler.shutdown(wait=False)
+    if _is_leader:
+        try:
+            release_lease(LEADER_LEASE, WORKER_ID)
+        except Exception as e:
+            logger.error(f"Could not release scheduler lease: {e}")
 
 
 def start_scheduler():
@@ -29,20 +250,28 @@ def start_scheduler():
     Initialize and start the APScheduler
     Runs daily at midnight (00:00) Israel Time
     """
-    israel_tz = pytz.timezone('Asia/Jerusalem')
     scheduler = BackgroundScheduler(timezone=israel_tz)
 
-    # Schedule the job to run every day at midnight Israel Time
     scheduler.add_job(
-        reset_budgets_job,
-        'cron',
-        hour=0,
-        minute=0,
-        timezone=israel_tz,
-        id='reset_budgets_daily',
+        heartbeat,
+        'interval',
+        seconds=HEARTBEAT_SECONDS,
+        next_run_time=timezone.now(),
+        id='scheduler_heartbeat',
         replace_existing=True
     )
+    for job_id, (_, trigger) in JOBS.items():
+        scheduler.add_job(
+            run_scheduled_job,
+            trigger,
+            args=[job_id],
+            id=job_id,
+            coalesce=True,
+            misfire_grace_time=3600,
+            replace_existing=True
+        )
 
     scheduler.start()
+    atexit.register(_shutdown, scheduler)
     logger.info(
-        "Budget reset scheduler started - will run daily at midnight Israel Time (Asia/Jerusalem)")
+        f"Scheduler started on worker {WORKER_ID} - jobs run on the lease holder only")
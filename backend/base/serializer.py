@@ -1,5 +1,5 @@
 from rest_framework import serializers  # type: ignore
-from .models import UserProfile, UserCategory, Income, Expense, RecurringExpense, RecurringIncome, Task, Budget
+from .models import UserProfile, UserCategory, Income, Expense, RecurringExpense, RecurringIncome, Task, Budget, CategoryRule
 from django.contrib.auth.models import User
 
 
@@ -21,28 +21,57 @@ class UserCategoriesSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class CategoryRulesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CategoryRule
+        fields = '__all__'
+
+    def validate(self, attrs):
+        user = attrs.get('user') or self.instance.user
+        for field in ('category', 'budget'):
+            value = attrs.get(field)
+            if value is not None and value.user_id != user.id:
+                raise serializers.ValidationError({field: 'Not one of your own.'})
+        return attrs
+
+
 class IncomesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Income
         fields = '__all__'
+        read_only_fields = ['recurring_income', 'import_hash']
 
 
 class ExpensesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = '__all__'
+        read_only_fields = ['recurring_expense', 'import_hash']
+
+
+class ExpenseBatchSerializer(serializers.ModelSerializer):
+    # Plain ids, checked against the user's categories/budgets by the batch
+    # in one query each instead of one lookup per item
+    category = serializers.IntegerField(allow_null=True, required=False)
+    budget = serializers.IntegerField(allow_null=True, required=False)
+
+    class Meta:
+        model = Expense
+        fields = ['pay_date', 'description', 'amount', 'category', 'budget']
 
 
 class RecurringExpensesSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecurringExpense
         fields = '__all__'
+        read_only_fields = ['posted_through']
 
 
 class RecurringIncomesSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecurringIncome
         fields = '__all__'
+        read_only_fields = ['posted_through']
 
 
 class TasksSerializer(serializers.ModelSerializer):
@@ -51,6 +80,13 @@ class TasksSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class TaskBulkSerializer(serializers.ModelSerializer):
+    # The owner is set by the view, so validating a batch never looks users up
+    class Meta:
+        model = Task
+        fields = ['description', 'is_done']
+
+
 class BudgetsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Budget
@@ -1,26 +1,61 @@
+from django.contrib.auth.models import User
+from django.db.models import F, QuerySet
 from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
-from django.utils import timezone
-from .models import Expense, Budget
+from .models import (Expense, Income, Budget, UserCategory, UserProfile, RecurringExpense,
+                     RecurringIncome, Task, CategoryRule)
+from .rollups import apply_rollup_delta
+from .forecast import invalidate_forecast
+from .response_cache import invalidate_responses
+from .sync import DELETE, MODEL_RESOURCES, log_changes
+from . import availability
+from .api.authentication import forget_cached_user
 
 
 @receiver(pre_save, sender=Expense)
-def store_old_expense_data(sender, instance, **kwargs):
-    """
-    Before updating an expense, store the old budget and amount
-    so we can properly adjust budgets
-    """
-    if instance.pk:  # Only for updates, not new instances
-        try:
-            old_expense = Expense.objects.get(pk=instance.pk)
-            instance._old_budget = old_expense.budget
-            instance._old_amount = old_expense.amount
-        except Expense.DoesNotExist:
-            instance._old_budget = None
-            instance._old_amount = None
+def store_old_expense_data(sender, instance, update_fields=None, **kwargs):
+    """
+    Before updating an expense, take the old budget, amount and rollup key
+    from the values the instance was loaded with (no extra SELECT), and the
+    values the save writes
+    """
+    loaded = getattr(instance, '_loaded_values', None)
+    if instance.pk and loaded is None:
+        # Instance was built by hand rather than loaded - read the stored row
+        loaded = Expense.objects.filter(pk=instance.pk).values(
+            *Expense.SNAPSHOT_FIELDS).first()
+    if instance.pk and loaded:
+        instance._old_budget_id = loaded['budget_id']
+        instance._old_amount = loaded['amount']
+        instance._old_rollup_key = (loaded['user_id'], loaded['pay_date'],
+                                    loaded['category_id'], loaded['budget_id'])
     else:
-        instance._old_budget = None
+        instance._old_budget_id = None
         instance._old_amount = None
+        instance._old_rollup_key = None
+    instance._written = _written_values(instance, loaded, update_fields)
+
+
+def _written_values(instance, loaded, update_fields):
+    """
+    The SNAPSHOT_FIELDS as saved: save(update_fields=...) leaves the rest
+    of the row at its loaded values, whatever the instance holds
+    """
+    if update_fields is None or not loaded:
+        return {field: getattr(instance, field) for field in Expense.SNAPSHOT_FIELDS}
+    written = {Expense._meta.get_field(name).attname for name in update_fields}
+    return {field: getattr(instance, field) if field in written else loaded[field]
+            for field in Expense.SNAPSHOT_FIELDS}
+
+
+def _adjust_budget(budget_id, delta):
+    """
+    Add delta to a budget's remaining_amount in a single UPDATE, so
+    concurrent writers never overwrite each other's adjustments
+    """
+    if budget_id and delta:
+        Budget.objects.filter(pk=budget_id).update(
+            remaining_amount=F('remaining_amount') + delta)
 
 
 @receiver(post_save, sender=Expense)
@@ -28,35 +63,25 @@ def update_budget_on_expense(sender, instance, created, **kwargs):
     """
     When an expense is created or updated, adjust the associated budget's remaining_amount
     """
+    written = instance._written
     if created:
         # New expense - deduct from budget
-        if instance.budget:
-            budget = instance.budget
-            budget.remaining_amount -= instance.amount
-            budget.save()
-    else:
-        # Updated expense - handle budget changes
-        old_budget = getattr(instance, '_old_budget', None)
-        old_amount = getattr(instance, '_old_amount', None)
-
-        # Case 1: Budget changed (moved from one budget to another or added/removed budget)
-        if old_budget != instance.budget:
-            # Add old amount back to old budget
-            if old_budget:
-                old_budget.remaining_amount += old_amount
-                old_budget.save()
-
-            # Deduct new amount from new budget
-            if instance.budget:
-                instance.budget.remaining_amount -= instance.amount
-                instance.budget.save()
-
-        # Case 2: Same budget, but amount changed
-        elif instance.budget and old_amount != instance.amount:
-            # Calculate the difference and adjust once
-            difference = instance.amount - old_amount
-            instance.budget.remaining_amount -= difference
-            instance.budget.save()
+        _adjust_budget(written['budget_id'], -written['amount'])
+        return
+
+    old_budget_id = getattr(instance, '_old_budget_id', None)
+    old_amount = getattr(instance, '_old_amount', None)
+
+    # Budget changed (moved from one budget to another or added/removed budget)
+    if old_budget_id != written['budget_id']:
+        # Add old amount back to old budget
+        _adjust_budget(old_budget_id, old_amount)
+        # Deduct new amount from new budget
+        _adjust_budget(written['budget_id'], -written['amount'])
+
+    # Same budget, but amount changed - adjust by the difference once
+    elif old_amount != written['amount']:
+        _adjust_budget(written['budget_id'], old_amount - written['amount'])
 
 
 @receiver(post_delete, sender=Expense)
@@ -64,7 +89,175 @@ def update_budget_on_expense_delete(sender, instance, **kwargs):
     """
     When an expense is deleted, add the amount back to the budget
     """
-    if instance.budget:
-        budget = instance.budget
-        budget.remaining_amount += instance.amount
-        budget.save()
+    _adjust_budget(instance.budget_id, instance.amount)
+
+
+def _rollup_key(expense):
+    return (expense.user_id, expense.pay_date, expense.category_id, expense.budget_id)
+
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_expense(sender, instance, created, **kwargs):
+    """
+    Move the expense's amount out of its old DailyRollup row (on update)
+    and into the row for its current day/category/budget
+    """
+    written = instance._written
+    old_key = None if created else getattr(instance, '_old_rollup_key', None)
+    new_key = (written['user_id'], written['pay_date'], written['category_id'],
+               written['budget_id'])
+    old_amount = getattr(instance, '_old_amount', None)
+
+    if old_key == new_key:
+        apply_rollup_delta(*new_key, written['amount'] - old_amount, 0)
+        return
+    if old_key:
+        apply_rollup_delta(*old_key, -old_amount, -1)
+    apply_rollup_delta(*new_key, written['amount'], 1)
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_expense_delete(sender, instance, **kwargs):
+    """
+    When an expense is deleted, remove it from its DailyRollup row
+    """
+    apply_rollup_delta(*_rollup_key(instance), -instance.amount, -1)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=RecurringExpense)
+@receiver(post_delete, sender=RecurringExpense)
+@receiver(post_save, sender=RecurringIncome)
+@receiver(post_delete, sender=RecurringIncome)
+@receiver(post_save, sender=UserCategory)
+@receiver(post_delete, sender=UserCategory)
+def invalidate_forecast_on_change(sender, instance, **kwargs):
+    """
+    Any change to the data a forecast is built from drops that user's cached forecasts
+    """
+    invalidate_forecast(instance.user_id)
+
+
+# The lists a model's changes can show up in (deleting a category or a
+# budget also clears it on the rows that used it)
+RESPONSE_RESOURCES = {
+    Expense: ('expenses', 'budgets'),
+    Income: ('incomes',),
+    Budget: ('budgets', 'expenses', 'recurring_expenses', 'category_rules'),
+    UserCategory: ('categories', 'expenses', 'incomes', 'recurring_expenses',
+                   'recurring_incomes', 'category_rules'),
+    RecurringExpense: ('recurring_expenses', 'expenses'),
+    RecurringIncome: ('recurring_incomes', 'incomes'),
+    Task: ('tasks',),
+    CategoryRule: ('category_rules',),
+}
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=UserCategory)
+@receiver(post_delete, sender=UserCategory)
+@receiver(post_save, sender=RecurringExpense)
+@receiver(post_delete, sender=RecurringExpense)
+@receiver(post_save, sender=RecurringIncome)
+@receiver(post_delete, sender=RecurringIncome)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+def invalidate_responses_on_change(sender, instance, **kwargs):
+    """
+    Bump the versions of the user's lists the change can show up in
+    """
+    invalidate_responses(instance.user_id, RESPONSE_RESOURCES[sender])
+
+
+def _expense_budgets(instance):
+    """
+    The budgets whose remaining_amount an expense change just adjusted
+    """
+    budget_ids = {instance.budget_id, getattr(instance, '_old_budget_id', None)}
+    return [(instance.user_id, 'budgets', pk) for pk in budget_ids if pk]
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=UserCategory)
+@receiver(post_save, sender=RecurringExpense)
+@receiver(post_save, sender=RecurringIncome)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=CategoryRule)
+def log_change_on_save(sender, instance, **kwargs):
+    """
+    Record the upsert for the delta sync
+    """
+    entries = [(instance.user_id, MODEL_RESOURCES[sender], instance.pk)]
+    if sender is Expense:
+        entries += _expense_budgets(instance)
+    log_changes(entries)
+
+
+def _deleting_user(origin):
+    if isinstance(origin, QuerySet):
+        return origin.model is User
+    return isinstance(origin, User)
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=UserCategory)
+@receiver(post_delete, sender=RecurringExpense)
+@receiver(post_delete, sender=RecurringIncome)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=CategoryRule)
+def log_change_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Record the tombstone for the delta sync. Deleting a user removes their
+    log with them, so nothing is recorded for the rows that cascade.
+    """
+    if _deleting_user(origin):
+        return
+    log_changes([(instance.user_id, MODEL_RESOURCES[sender], instance.pk)], DELETE)
+    if sender is Expense:
+        log_changes(_expense_budgets(instance))
+
+
+def _saved_field(field, update_fields):
+    return update_fields is None or field in update_fields
+
+
+@receiver(post_save, sender=User)
+def track_username(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the availability filters current (not on e.g. last_login updates)
+    """
+    if _saved_field('username', update_fields):
+        availability.usernames.added(instance.username)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """
+    Token-authenticated requests read is_active and the other cached User
+    fields from the cache
+    """
+    forget_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def track_email(sender, instance, update_fields=None, **kwargs):
+    if instance.email and _saved_field('email', update_fields):
+        availability.emails.added(instance.email)
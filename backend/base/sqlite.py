@@ -0,0 +1,23 @@
+"""
+Applies the SQLITE_PRAGMAS of the selected database profile (DB_PROFILE
+in settings) to every new SQLite connection, from the connection_created
+signal.
+
+The production profile switches to WAL, so readers no longer block the
+writer and the writer no longer blocks readers, and waits busy_timeout
+for the write lock instead of failing with "database is locked".
+"""
+from django.conf import settings
+
+
+def configure(dbapi_connection, pragmas):
+    """
+    Run PRAGMA name = value on a DB-API sqlite3 connection, in order
+    """
+    for name, value in pragmas.items():
+        dbapi_connection.execute(f'PRAGMA {name} = {value}')
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        configure(connection.connection, getattr(settings, 'SQLITE_PRAGMAS', {}))
@@ -0,0 +1,278 @@
+"""
+Streaming import of bank statement CSV files into Expense/Income rows
+(POST /import/ and the import_statement management command).
+
+The file is parsed line by line and written in chunks, so memory stays flat
+however long the statement is, bar one small integer per distinct line.
+Each imported row stores a hash of its type, date, amount, description and
+how many identical lines came before it in the file. Lines whose hash the user already has are skipped, so importing
+overlapping statements never duplicates a row.
+
+Rows are inserted with bulk_create, which skips the model signals (see
+base.bulk); each chunk applies its budget, rollup and change log changes once.
+"""
+import csv
+import hashlib
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from django.db import transaction
+
+from .bulk import bulk_written
+from .materialize import deduct_budgets
+from .models import CategoryRule, Expense, Income
+from .rollups import apply_rollup_deltas
+from .sync import log_changes
+
+# field -> header name looked up in the file (case-insensitive)
+DEFAULT_COLUMNS = {
+    'date': 'date',
+    'description': 'description',
+    'amount': 'amount',
+    'debit': 'debit',
+    'credit': 'credit',
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y', '%d/%m/%y')
+CHUNK_SIZE = 500
+MAX_ERRORS = 100
+
+CENT = Decimal('0.01')
+_amount_field = Expense._meta.get_field('amount')
+# Largest amount the Expense/Income columns hold (max_digits=10 -> 99999999.99)
+MAX_AMOUNT = Decimal(10) ** (_amount_field.max_digits - _amount_field.decimal_places) - CENT
+
+_NOT_AMOUNT = re.compile(r'[^\d.\-]')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def parse_amount(value):
+    """
+    '1,234.50', '₪ -12', '(12.00)' -> Decimal. Empty cells are None.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    negative = value.startswith('(') and value.endswith(')')
+    try:
+        amount = Decimal(_NOT_AMOUNT.sub('', value))
+    except InvalidOperation:
+        raise StatementError(f"Invalid amount '{value}'")
+    return -amount if negative else amount
+
+
+def parse_statement_date(value, formats=DATE_FORMATS):
+    """
+    Parse value with the first matching format. A list of formats is
+    reordered so the one that matched is tried first on the next call.
+    """
+    value = (value or '').strip()
+    for index, fmt in enumerate(formats):
+        try:
+            day = datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+        if index and isinstance(formats, list):
+            formats.insert(0, formats.pop(index))
+        return day
+    raise StatementError(f"Invalid date '{value}'")
+
+
+def _resolve_columns(header, columns):
+    """
+    Map each field to its index in the header row
+    """
+    positions = {name.strip().lstrip('\ufeff').lower(): i for i, name in enumerate(header)}
+    mapping = {**DEFAULT_COLUMNS, **(columns or {})}
+    indexes = {field: positions.get(name.strip().lower())
+               for field, name in mapping.items() if name}
+    missing = [field for field in ('date', 'description') if indexes.get(field) is None]
+    if indexes.get('amount') is None and indexes.get('debit') is None and indexes.get('credit') is None:
+        missing.append('amount')
+    if missing:
+        raise StatementError(
+            f"Missing column(s) for {', '.join(missing)} in header {header}")
+    return indexes
+
+
+def read_statement(lines, columns=None, date_format=None, positive_expenses=False):
+    """
+    Parse statement lines lazily. Yields one dict per line: either
+    {'line', 'kind', 'date', 'description', 'amount'} with kind 'expense' or
+    'income' and a positive amount, or {'line', 'error'}.
+
+    With an amount column, negative amounts are expenses unless
+    positive_expenses (e.g. credit card exports). Debit/credit columns are
+    expenses/incomes respectively.
+    """
+    reader = csv.reader(lines)
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise StatementError('The file is empty')
+    indexes = _resolve_columns(header, columns)
+
+    def cell(row, field):
+        index = indexes.get(field)
+        return row[index] if index is not None and index < len(row) else ''
+
+    formats = [date_format] if date_format else list(DATE_FORMATS)
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            day = parse_statement_date(cell(row, 'date'), formats)
+            debit, credit = parse_amount(cell(row, 'debit')), parse_amount(cell(row, 'credit'))
+            if debit:
+                kind, amount = 'expense', abs(debit)
+            elif credit:
+                kind, amount = 'income', abs(credit)
+            else:
+                amount = parse_amount(cell(row, 'amount'))
+                if not amount:
+                    raise StatementError('No amount')
+                is_expense = amount > 0 if positive_expenses else amount < 0
+                kind, amount = ('expense' if is_expense else 'income'), abs(amount)
+        except StatementError as e:
+            yield {'line': reader.line_num, 'error': str(e)}
+            continue
+        if amount > MAX_AMOUNT:
+            yield {'line': reader.line_num, 'error': f'Amount {amount} is out of range'}
+            continue
+        yield {
+            'line': reader.line_num,
+            'kind': kind,
+            'date': day,
+            'description': cell(row, 'description').strip()[:100],
+            'amount': amount.quantize(CENT),
+        }
+
+
+class CategoryMatcher:
+    """
+    First CategoryRule whose pattern the description contains, memoized per
+    description since statements repeat the same merchants
+    """
+
+    def __init__(self, user):
+        self.rules = [(pattern.lower(), category_id, budget_id) for pattern, category_id, budget_id in
+                      CategoryRule.objects.filter(user=user).order_by('id')
+                      .values_list('pattern', 'category_id', 'budget_id')]
+        self.cache = {}
+
+    def match(self, description):
+        if description not in self.cache:
+            text = description.lower()
+            self.cache[description] = next(
+                ((category_id, budget_id) for pattern, category_id, budget_id in self.rules
+                 if pattern in text), (None, None))
+        return self.cache[description]
+
+
+def _line_key(row):
+    """
+    Compact key of a line's content, for counting identical lines
+    """
+    key = f"{row['kind']}|{row['date']}|{row['amount']}|{row['description'].lower()}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+def _line_hash(row, occurrence):
+    key = f"{row['kind']}|{row['date']}|{row['amount']}|{row['description'].lower()}|{occurrence}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _write_chunk(user, rows, matcher):
+    """
+    Insert the chunk's new rows and apply their budget/rollup changes.
+    Returns (expenses, incomes, duplicates).
+    """
+    hashes = [row['hash'] for row in rows]
+    existing = set(chain(
+        Expense.objects.filter(user=user, import_hash__in=hashes).values_list('import_hash', flat=True),
+        Income.objects.filter(user=user, import_hash__in=hashes).values_list('import_hash', flat=True)))
+
+    expenses, incomes = [], []
+    budget_totals = defaultdict(Decimal)
+    rollups = defaultdict(lambda: [Decimal('0'), 0])
+    for row in rows:
+        if row['hash'] in existing:
+            continue
+        category_id, budget_id = matcher.match(row['description'])
+        if row['kind'] == 'income':
+            incomes.append(Income(
+                user=user, date=row['date'], description=row['description'],
+                amount=row['amount'], category_id=category_id, import_hash=row['hash']))
+            continue
+        expenses.append(Expense(
+            user=user, pay_date=row['date'], description=row['description'],
+            amount=row['amount'], category_id=category_id, budget_id=budget_id,
+            import_hash=row['hash']))
+        if budget_id:
+            budget_totals[budget_id] += row['amount']
+        rollup = rollups[(user.id, row['date'], category_id, budget_id)]
+        rollup[0] += row['amount']
+        rollup[1] += 1
+
+    with transaction.atomic():
+        Expense.objects.bulk_create(expenses)
+        Income.objects.bulk_create(incomes)
+        deduct_budgets(budget_totals)
+        apply_rollup_deltas(rollups)
+        log_changes([(user.id, 'expenses', expense.pk) for expense in expenses]
+                    + [(user.id, 'incomes', income.pk) for income in incomes]
+                    + [(user.id, 'budgets', pk) for pk in budget_totals])
+    return len(expenses), len(incomes), len(rows) - len(expenses) - len(incomes)
+
+
+def import_statement(user, lines, columns=None, date_format=None,
+                     positive_expenses=False, chunk_size=CHUNK_SIZE):
+    """
+    Import a statement's lines (any iterable of CSV text lines) for user.
+    Returns {'expenses', 'incomes', 'duplicates', 'errors'}, where errors
+    lists the first MAX_ERRORS lines that could not be parsed.
+    """
+    matcher = CategoryMatcher(user)
+    result = {'expenses': 0, 'incomes': 0, 'duplicates': 0, 'errors': []}
+    error_count = 0
+    occurrences = defaultdict(int)
+    chunk = []
+
+    def flush():
+        expenses, incomes, duplicates = _write_chunk(user, chunk, matcher)
+        result['expenses'] += expenses
+        result['incomes'] += incomes
+        result['duplicates'] += duplicates
+        chunk.clear()
+
+    try:
+        for row in read_statement(lines, columns, date_format, positive_expenses):
+            if 'error' in row:
+                error_count += 1
+                if len(result['errors']) < MAX_ERRORS:
+                    result['errors'].append(row)
+                continue
+            # Identical lines in one statement are distinct rows
+            key = _line_key(row)
+            row['hash'] = _line_hash(row, occurrences[key])
+            occurrences[key] += 1
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+    except UnicodeDecodeError:
+        raise StatementError('Could not decode the file, check its encoding')
+    except csv.Error as e:
+        raise StatementError(f'Malformed CSV: {e}')
+    finally:
+        if result['expenses'] or result['incomes']:
+            bulk_written(user.id)
+
+    result['error_count'] = error_count
+    return result
@@ -0,0 +1,151 @@
+"""
+Delta sync for clients that keep a local replica (GET /sync/?since=<seq>).
+
+Every change to a synced row appends a ChangeLog entry (upsert or delete)
+whose id is its sequence number. A client asks for the entries after the
+last seq it saw and gets, per resource, the current rows of what was
+upserted and the ids of what was deleted, plus the seq to ask from next.
+Syncing from 0 returns every live row, so it doubles as the initial load.
+
+As on the server, a deleted category, budget or recurring rule becomes
+null on the rows that referenced it; that side effect is not logged.
+
+Compaction keeps only the latest entry per object and drops tombstones
+older than TOMBSTONE_DAYS. A client that last synced before a dropped
+tombstone is told to start again from 0.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.models import Max, Subquery
+from django.utils import timezone
+
+from .fastjson import serialized_rows
+from .models import (Budget, ChangeLog, ChangeLogHorizon, CategoryRule, Expense, Income,
+                     RecurringExpense, RecurringIncome, Task, UserCategory)
+from .serializer import (BudgetsSerializer, CategoryRulesSerializer, ExpensesSerializer,
+                         IncomesSerializer, RecurringExpensesSerializer,
+                         RecurringIncomesSerializer, TasksSerializer, UserCategoriesSerializer)
+
+# resource -> (model, serializer the list endpoint returns it with)
+SYNC_MODELS = {
+    'categories': (UserCategory, UserCategoriesSerializer),
+    'budgets': (Budget, BudgetsSerializer),
+    'recurring_expenses': (RecurringExpense, RecurringExpensesSerializer),
+    'recurring_incomes': (RecurringIncome, RecurringIncomesSerializer),
+    'expenses': (Expense, ExpensesSerializer),
+    'incomes': (Income, IncomesSerializer),
+    'tasks': (Task, TasksSerializer),
+    'category_rules': (CategoryRule, CategoryRulesSerializer),
+}
+MODEL_RESOURCES = {model: resource for resource, (model, _) in SYNC_MODELS.items()}
+
+PAGE_SIZE = 500
+TOMBSTONE_DAYS = 90
+
+UPSERT = ChangeLog.Action.UPSERT
+DELETE = ChangeLog.Action.DELETE
+
+
+class SyncReset(Exception):
+    """Raised when since is older than the user's compacted tombstones"""
+
+
+def log_changes(entries, action=UPSERT):
+    """
+    Append one entry per (user_id, resource, object_id) in a single INSERT
+    """
+    ChangeLog.objects.bulk_create(
+        [ChangeLog(user_id=user_id, resource=resource, object_id=pk, action=action)
+         for user_id, resource, pk in entries],
+        batch_size=500)
+
+
+def log_matching(queryset, resource, action=UPSERT):
+    """
+    Append an entry for every row of queryset with one INSERT ... SELECT,
+    for bulk UPDATEs/DELETEs (log before deleting) that never load the rows
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().values('user_id', 'id').query.sql_with_params()
+    changed_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {connection.ops.quote_name(ChangeLog._meta.db_table)} '
+            '(user_id, object_id, resource, action, changed_at) '
+            f'SELECT changed.user_id, changed.id, %s, %s, %s FROM ({sql}) changed',
+            (resource, action, changed_at, *params))
+
+
+def changes_since(user, since, limit=PAGE_SIZE):
+    """
+    The user's changes after seq since, at most limit log entries at a time.
+    Returns {'since', 'next', 'more', 'changes'} where changes maps each
+    resource that changed to {'upserts': [rows], 'deletes': [ids]}.
+    Raises SyncReset when since predates the compacted tombstones.
+    """
+    if since:
+        horizon = (ChangeLogHorizon.objects.filter(user=user)
+                   .values_list('seq', flat=True).first())
+        if horizon and since < horizon:
+            raise SyncReset
+
+    entries = list(ChangeLog.objects.filter(user=user, id__gt=since).order_by('id')
+                   .values_list('id', 'resource', 'object_id', 'action')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Only an object's last entry in the page matters
+    latest = defaultdict(dict)
+    for _, resource, pk, action in entries:
+        latest[resource][pk] = action
+
+    changes = {}
+    for resource, actions in latest.items():
+        model, serializer_class = SYNC_MODELS[resource]
+        upsert_ids = [pk for pk, action in actions.items() if action == UPSERT]
+        rows = list(serialized_rows(
+            model.objects.filter(user=user, pk__in=upsert_ids).order_by('id'), serializer_class))
+        # A row gone by now was deleted after this page; its tombstone follows
+        found = {row['id'] for row in rows}
+        deletes = sorted(pk for pk, action in actions.items() if pk not in found)
+        changes[resource] = {'upserts': rows, 'deletes': deletes}
+
+    return {
+        'since': since,
+        'next': entries[-1][0] if entries else since,
+        'more': more,
+        'changes': changes,
+    }
+
+
+def compact_changelog(now=None, tombstone_days=TOMBSTONE_DAYS, chunk_size=1000):
+    """
+    Keep only the latest entry per object and drop tombstones older than
+    tombstone_days, a chunk of users per transaction. Returns counts of
+    the superseded and expired entries removed.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=tombstone_days)
+    superseded = expired = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(User.objects.filter(id__gt=last_user_id).order_by('id')
+                        .values_list('id', flat=True)[:chunk_size])
+        if not user_ids:
+            return {'superseded': superseded, 'expired': expired}
+        logs = ChangeLog.objects.filter(user_id__in=user_ids)
+        latest = (logs.values('user_id', 'resource', 'object_id')
+                  .annotate(seq=Max('id')).values('seq'))
+        with transaction.atomic():
+            superseded += logs.exclude(id__in=Subquery(latest)).delete()[0]
+
+            tombstones = logs.filter(action=DELETE, changed_at__lt=cutoff)
+            horizons = list(tombstones.values('user_id').annotate(seq=Max('id')).order_by())
+            if horizons:
+                ChangeLogHorizon.objects.bulk_create(
+                    [ChangeLogHorizon(user_id=row['user_id'], seq=row['seq']) for row in horizons],
+                    update_conflicts=True, unique_fields=['user'], update_fields=['seq'])
+                expired += tombstones.delete()[0]
+        last_user_id = user_ids[-1]
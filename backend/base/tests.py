@@ -1,3 +1,1580 @@
-from django.test import TestCase
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F, Value
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cycles import pay_cycle
+from .serializer import (BudgetsSerializer, ExpensesSerializer, IncomesSerializer,
+                         RecurringExpensesSerializer, RecurringIncomesSerializer,
+                         UserCategoriesSerializer)
+from .api import authentication
+from .api.serializers import MyTokenObtainPairSerializer
+from .models import (Expense, Income, UserCategory, Budget, UserProfile, DailyRollup,
+                     ScheduledJob, Task, RecurringExpense, RecurringIncome, CategoryRule,
+                     ChangeLog, ClaimsUser, NameVersion)
+from .recurring import active_rules, expand_occurrences
+from . import availability, scheduler, tokens
+from .registration import RegisterThrottle
+from .response_cache import reset_cache_stats
+from .rollups import compare_rollups
+from .statements import StatementError, parse_amount
+from .sync import compact_changelog
+from .sqlite import configure
+
+
+class ExpenseListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='paged')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = UserCategory.objects.create(
+            user=self.user, category_name='food')
+        self.budget = Budget.objects.create(
+            user=self.user, name='food', amount=1000, remaining_amount=1000)
+        for day in range(1, 11):
+            Expense.objects.create(user=self.user, pay_date=date(2025, 1, day),
+                                   amount=Decimal('10'), category=self.category)
+        # Same date as an existing row to exercise the id tie-breaker
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 5),
+                               amount=Decimal('10'), budget=self.budget)
+        Expense.objects.create(user=self.user, pay_date=None,
+                               amount=Decimal('10'))
+
+    def _walk(self, url):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.json()['results']]
+            cursor = response.json()['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_cursor_walk_matches_full_listing(self):
+        expected = list(Expense.objects.filter(user=self.user).order_by(
+            'pay_date', 'id').values_list('id', flat=True))
+        self.assertEqual(self._walk('/expenses/'), expected)
+
+    def test_legacy_listing_stays_a_plain_list(self):
+        response = self.client.get('/expenses/')
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 12)
+
+    def test_filters(self):
+        response = self.client.get(
+            '/expenses/', {'from': '2025-01-03', 'to': '2025-01-05'})
+        self.assertEqual(len(response.json()), 4)
+        response = self.client.get(
+            '/expenses/', {'category': self.category.id, 'limit': 100})
+        self.assertEqual(len(response.json()['results']), 10)
+        response = self.client.get('/expenses/', {'budget': self.budget.id})
+        self.assertEqual(len(response.json()), 1)
+
+    def test_invalid_params_are_rejected(self):
+        self.assertEqual(self.client.get(
+            '/expenses/', {'from': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(
+            '/expenses/', {'cursor': 'garbage!'}).status_code, 400)
+
+    def test_incomes_walk_newest_first(self):
+        for day in (3, 1, 2, 2):
+            Income.objects.create(user=self.user, date=date(2025, 2, day),
+                                  amount=Decimal('100'))
+        Income.objects.create(user=self.user, date=None, amount=Decimal('1'))
+        ids = self._walk('/incomes/')
+        rows = Income.objects.in_bulk(ids)
+        dates = [rows[i].date for i in ids]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(dates[:4], sorted(dates[:4], reverse=True))
+        self.assertIsNone(dates[-1])
+
+
+class PayCycleTests(TestCase):
+    def test_cycle_after_pay_day(self):
+        self.assertEqual(pay_cycle(10, date(2025, 3, 15)),
+                         (date(2025, 3, 10), date(2025, 4, 9)))
+
+    def test_cycle_before_pay_day_wraps_year(self):
+        self.assertEqual(pay_cycle(10, date(2025, 1, 5)),
+                         (date(2024, 12, 10), date(2025, 1, 9)))
+
+    def test_pay_day_clamped_in_short_months(self):
+        self.assertEqual(pay_cycle(31, date(2025, 2, 28)),
+                         (date(2025, 2, 28), date(2025, 3, 30)))
+        self.assertEqual(pay_cycle(31, date(2025, 3, 15), offset=1),
+                         (date(2025, 1, 31), date(2025, 2, 27)))
+
+
+class PayCycleSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='summary')
+        UserProfile.objects.create(user=self.user, pay_day='10',
+                                   expected_income=6000, saving_target=1000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        food = UserCategory.objects.create(user=self.user, category_name='food')
+        budget = Budget.objects.create(
+            user=self.user, name='food', amount=1000, remaining_amount=1000)
+        Expense.objects.create(user=self.user, pay_date=date(2025, 3, 12),
+                               amount=Decimal('100'), category=food, budget=budget)
+        Expense.objects.create(user=self.user, pay_date=date(2025, 3, 20),
+                               amount=Decimal('50'), category=food)
+        Expense.objects.create(user=self.user, pay_date=date(2025, 3, 20),
+                               amount=Decimal('25'))
+        # Outside the current cycle
+        Expense.objects.create(user=self.user, pay_date=date(2025, 3, 9),
+                               amount=Decimal('999'))
+
+    @mock.patch('base.views.local_today', return_value=date(2025, 3, 20))
+    def test_summary_totals(self, _today):
+        with self.assertNumQueries(2):
+            data = self.client.get('/summary/').data
+        self.assertEqual(data['cycle_start'], date(2025, 3, 10))
+        self.assertEqual(data['cycle_end'], date(2025, 4, 9))
+        self.assertEqual(data['days_passed'], 11)
+        self.assertEqual(data['total_spent'], Decimal('175'))
+        self.assertEqual(data['spent_today'], Decimal('75'))
+        self.assertEqual(
+            {row['category_name']: row['total'] for row in data['by_category']},
+            {'food': Decimal('150'), None: Decimal('25')})
+        self.assertEqual(
+            {row['name']: row['total'] for row in data['by_budget']},
+            {'food': Decimal('100'), None: Decimal('75')})
+        self.assertEqual(data['expected_savings'], Decimal('5825'))
+        self.assertTrue(data['saving_target_met'])
+
+    @mock.patch('base.views.local_today', return_value=date(2025, 3, 20))
+    def test_previous_cycle(self, _today):
+        data = self.client.get('/summary/', {'offset': 1}).data
+        self.assertEqual(data['cycle_start'], date(2025, 2, 10))
+        self.assertEqual(data['total_spent'], Decimal('999'))
+        self.assertEqual(data['spent_today'], Decimal('0'))
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='rollup')
+        self.food = UserCategory.objects.create(user=self.user, category_name='food')
+        self.home = UserCategory.objects.create(user=self.user, category_name='home')
+
+    def _totals(self):
+        return {(row.day, row.category_id): (row.total, row.count)
+                for row in DailyRollup.objects.filter(user=self.user)}
+
+    def test_signals_keep_rollups_in_sync(self):
+        first = Expense.objects.create(user=self.user, pay_date=date(2025, 1, 1),
+                                       amount=Decimal('10'), category=self.food)
+        second = Expense.objects.create(user=self.user, pay_date=date(2025, 1, 1),
+                                        amount=Decimal('5'), category=self.food)
+        self.assertEqual(self._totals(), {
+            (date(2025, 1, 1), self.food.id): (Decimal('15'), 2)})
+
+        second.amount = Decimal('7')
+        second.save()
+        first.category = self.home
+        first.pay_date = date(2025, 1, 2)
+        first.save()
+        self.assertEqual(self._totals(), {
+            (date(2025, 1, 1), self.food.id): (Decimal('7'), 1),
+            (date(2025, 1, 2), self.home.id): (Decimal('10'), 1)})
+
+        second.delete()
+        self.assertEqual(self._totals(), {
+            (date(2025, 1, 2), self.home.id): (Decimal('10'), 1)})
+        self.assertEqual(compare_rollups(), [])
+
+    def test_rebuild_command_repairs_drift(self):
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 1),
+                               amount=Decimal('10'), category=self.food)
+        # Queryset updates bypass the signals
+        Expense.objects.filter(user=self.user).update(amount=Decimal('99'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO())
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self._totals(), {
+            (date(2025, 1, 1), self.food.id): (Decimal('99'), 1)})
+
+    def test_deleting_user_cleans_up(self):
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 1),
+                               amount=Decimal('10'), category=self.food)
+        self.user.delete()
+        self.assertFalse(DailyRollup.objects.exists())
+
+
+class BudgetSignalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='budget')
+        self.food = Budget.objects.create(
+            user=self.user, name='food', amount=1000, remaining_amount=1000)
+        self.home = Budget.objects.create(
+            user=self.user, name='home', amount=500, remaining_amount=500)
+
+    def _remaining(self, budget):
+        budget.refresh_from_db()
+        return budget.remaining_amount
+
+    def test_create_update_move_delete(self):
+        expense = Expense.objects.create(
+            user=self.user, amount=Decimal('100'), budget=self.food)
+        self.assertEqual(self._remaining(self.food), Decimal('900'))
+
+        expense = Expense.objects.get(pk=expense.pk)
+        expense.amount = Decimal('150')
+        with CaptureQueriesContext(connection) as queries:
+            expense.save()
+        # Old values come from the loaded instance, not a re-read
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(self._remaining(self.food), Decimal('850'))
+
+        expense.budget = self.home
+        expense.save()
+        self.assertEqual(self._remaining(self.food), Decimal('1000'))
+        self.assertEqual(self._remaining(self.home), Decimal('350'))
+
+        expense.delete()
+        self.assertEqual(self._remaining(self.home), Decimal('500'))
+
+    def test_stale_budget_instances_do_not_lose_updates(self):
+        # Both writers hold a budget object read before either one saved
+        first = Expense(user=self.user, amount=Decimal('10'),
+                        budget=Budget.objects.get(pk=self.food.pk))
+        second = Expense(user=self.user, amount=Decimal('20'),
+                         budget=Budget.objects.get(pk=self.food.pk))
+        first.save()
+        second.save()
+        self.assertEqual(self._remaining(self.food), Decimal('970'))
+
+    def test_unloaded_instance_falls_back_to_stored_row(self):
+        expense = Expense.objects.create(
+            user=self.user, amount=Decimal('100'), budget=self.food)
+        Expense(pk=expense.pk, user=self.user, amount=Decimal('40'),
+                budget=self.food).save()
+        self.assertEqual(self._remaining(self.food), Decimal('960'))
+
+    def test_update_fields_only_applies_the_written_fields(self):
+        expense = Expense.objects.create(
+            user=self.user, amount=Decimal('100'), budget=self.food)
+        expense.amount = Decimal('300')
+        expense.budget = self.home
+        expense.description = 'renamed'
+        expense.save(update_fields=['description'])
+        self.assertEqual(self._remaining(self.food), Decimal('900'))
+        self.assertEqual(self._remaining(self.home), Decimal('500'))
+        self.assertEqual(compare_rollups(), [])
+
+        # The unwritten amount is still diffed against the stored 100
+        expense.save(update_fields=['amount'])
+        self.assertEqual(self._remaining(self.food), Decimal('700'))
+        self.assertEqual(compare_rollups(), [])
+        expense.save()
+        self.assertEqual(self._remaining(self.food), Decimal('1000'))
+        self.assertEqual(self._remaining(self.home), Decimal('200'))
+        self.assertEqual(compare_rollups(), [])
+
+
+class BudgetConcurrencyTests(TransactionTestCase):
+    WRITERS = 8
+    EXPENSES_PER_WRITER = 25
+
+    def test_parallel_writers_do_not_drift(self):
+        user = User.objects.create(username='parallel')
+        budget = Budget.objects.create(
+            user=user, name='food', amount=10000, remaining_amount=10000)
+        budget_id = budget.pk
+
+        def writer(_):
+            # Each writer works from its own copy, like a separate worker process
+            budget = Budget.objects.get(pk=budget_id)
+            try:
+                for _ in range(self.EXPENSES_PER_WRITER):
+                    expense = Expense.objects.create(
+                        user=user, amount=Decimal('3'), budget=budget)
+                    expense.amount = Decimal('2')
+                    expense.save()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.WRITERS) as pool:
+            list(pool.map(writer, range(self.WRITERS)))
+
+        budget.refresh_from_db()
+        spent = 2 * self.WRITERS * self.EXPENSES_PER_WRITER
+        self.assertEqual(budget.remaining_amount, Decimal(10000 - spent))
+        self.assertEqual(compare_rollups(), [])
+
+
+class ResetBudgetsCommandTests(TestCase):
+    def _user(self, name, pay_day):
+        user = User.objects.create(username=name)
+        UserProfile.objects.create(user=user, email=f'{name}@example.com',
+                                   pay_day=pay_day)
+        return Budget.objects.create(
+            user=user, name='food', amount=1000, remaining_amount=10)
+
+    def _reset(self, day):
+        out = StringIO()
+        call_command('reset_budgets', '--date', day, '--chunk-size', '2', stdout=out)
+        return out.getvalue()
+
+    def _remaining(self, budget):
+        budget.refresh_from_db()
+        return budget.remaining_amount
+
+    def test_resets_matching_pay_day_in_either_format(self):
+        padded = self._user('padded', '05')
+        plain = self._user('plain', '5')
+        other = self._user('other', '06')
+        output = self._reset('2025-03-05')
+        self.assertIn('reset 2 budgets for 2 users', output)
+        self.assertEqual(self._remaining(padded), Decimal('1000'))
+        self.assertEqual(self._remaining(plain), Decimal('1000'))
+        self.assertEqual(self._remaining(other), Decimal('10'))
+
+    def test_short_month_catches_up_missing_days(self):
+        budgets = {day: self._user(f'day{day}', str(day)) for day in (28, 29, 30, 31)}
+        self._reset('2025-02-28')
+        self.assertTrue(all(self._remaining(b) == Decimal('1000')
+                            for b in budgets.values()))
+
+        for budget in budgets.values():
+            Budget.objects.filter(pk=budget.pk).update(remaining_amount=10)
+        self._reset('2025-04-30')
+        self.assertEqual(self._remaining(budgets[28]), Decimal('10'))
+        self.assertEqual(self._remaining(budgets[30]), Decimal('1000'))
+        self.assertEqual(self._remaining(budgets[31]), Decimal('1000'))
+
+
+class SchedulerLeaseTests(TestCase):
+    def test_only_one_owner_holds_the_lease(self):
+        now = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.assertTrue(scheduler.acquire_lease('leader', 'a', 60, now))
+        self.assertFalse(scheduler.acquire_lease('leader', 'b', 60, now))
+        # Renewal by the holder
+        self.assertTrue(scheduler.acquire_lease(
+            'leader', 'a', 60, now + timedelta(seconds=30)))
+        # Taken over once the holder stops renewing
+        later = now + timedelta(seconds=120)
+        self.assertTrue(scheduler.acquire_lease('leader', 'b', 60, later))
+        self.assertFalse(scheduler.acquire_lease('leader', 'a', 60, later))
+
+    def test_run_job_records_outcome(self):
+        def broken(day):
+            raise RuntimeError('boom')
+
+        with mock.patch.dict(scheduler.JOBS, {'broken': (broken, None)}), \
+                self.assertLogs('base.scheduler', 'ERROR'):
+            scheduler.run_job('broken')
+        state = ScheduledJob.objects.get(job_id='broken')
+        self.assertEqual(state.last_status, ScheduledJob.Status.FAILED)
+        self.assertEqual(state.last_error, 'boom')
+        self.assertIsNone(state.last_success_at)
+
+    def test_missed_run_is_caught_up(self):
+        calls = []
+        job_id = 'reset_budgets_daily'
+        trigger = scheduler.JOBS[job_id][1]
+        ScheduledJob.objects.create(
+            job_id=job_id, last_run_at=datetime(2025, 1, 1, 22, 0, tzinfo=dt_timezone.utc),
+            last_success_at=datetime(2025, 1, 1, 22, 0, tzinfo=dt_timezone.utc))
+
+        with mock.patch.dict(scheduler.JOBS, {job_id: (calls.append, trigger)}):
+            # Next midnight in Israel is 22:00 UTC on Jan 2
+            scheduler.catch_up_missed_jobs(datetime(2025, 1, 2, 21, 0, tzinfo=dt_timezone.utc))
+            self.assertEqual(calls, [])
+            scheduler.catch_up_missed_jobs(datetime(2025, 1, 3, 8, 0, tzinfo=dt_timezone.utc))
+            self.assertEqual(calls, [date(2025, 1, 3)])
+        state = ScheduledJob.objects.get(job_id=job_id)
+        self.assertEqual(state.last_status, ScheduledJob.Status.SUCCESS)
+        self.assertEqual(state.last_success_at, datetime(2025, 1, 2, 22, 0, tzinfo=dt_timezone.utc))
+
+    def test_each_missed_day_is_run_with_its_date(self):
+        for job_id in ('reset_budgets_daily', 'materialize_recurring_daily'):
+            ScheduledJob.objects.create(
+                job_id=job_id, last_success_at=datetime(2025, 1, 1, 22, 10, tzinfo=dt_timezone.utc))
+        with mock.patch('base.scheduler.call_command') as command:
+            scheduler.catch_up_missed_jobs(datetime(2025, 1, 4, 8, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(command.call_args_list, [
+            mock.call('reset_budgets', '--date', '2025-01-03'),
+            mock.call('materialize_recurring', '--date', '2025-01-03'),
+            mock.call('reset_budgets', '--date', '2025-01-04'),
+            mock.call('materialize_recurring', '--date', '2025-01-04'),
+        ])
+
+    def test_failed_run_is_retried(self):
+        job_id = 'reset_budgets_daily'
+        trigger = scheduler.JOBS[job_id][1]
+        ScheduledJob.objects.create(
+            job_id=job_id, last_success_at=datetime(2025, 1, 1, 22, 0, tzinfo=dt_timezone.utc))
+        calls = []
+
+        def flaky(day):
+            calls.append(day)
+            if len(calls) == 2:
+                raise RuntimeError('locked')
+
+        now = datetime(2025, 1, 4, 8, 0, tzinfo=dt_timezone.utc)
+        with mock.patch.dict(scheduler.JOBS, {job_id: (flaky, trigger)}), \
+                mock.patch('base.scheduler.timezone.now', return_value=now), \
+                self.assertLogs('base.scheduler', 'ERROR'):
+            scheduler.catch_up_missed_jobs(now)
+            self.assertEqual(calls, [date(2025, 1, 3), date(2025, 1, 4)])
+            # Not before RETRY_SECONDS
+            scheduler.catch_up_missed_jobs(now + timedelta(minutes=5))
+            self.assertEqual(len(calls), 2)
+            scheduler.catch_up_missed_jobs(now + timedelta(minutes=20))
+            self.assertEqual(calls[2:], [date(2025, 1, 4)])
+        self.assertEqual(ScheduledJob.objects.get(job_id=job_id).last_status,
+                         ScheduledJob.Status.SUCCESS)
+
+
+class RecurringOccurrenceTests(TestCase):
+    def test_monthly_rules_clamp_to_short_months(self):
+        rule_index, dates = expand_occurrences(
+            [date(2025, 1, 31), date(2025, 1, 31)], [None, date(2025, 3, 30)], ['M', 'BM'],
+            date(2025, 1, 1), date(2025, 5, 31))
+        self.assertEqual(list(zip(rule_index.tolist(), dates.tolist())), [
+            (0, date(2025, 1, 31)), (1, date(2025, 1, 31)), (0, date(2025, 2, 28)),
+            (0, date(2025, 3, 31)), (0, date(2025, 4, 30)), (0, date(2025, 5, 31))])
+
+    def test_weekly_rules_start_inside_window(self):
+        _, dates = expand_occurrences(
+            [date(2025, 1, 1)], [None], ['B'], date(2025, 1, 10), date(2025, 2, 12))
+        self.assertEqual(dates.tolist(), [date(2025, 1, 15), date(2025, 1, 29), date(2025, 2, 12)])
+
+    def test_endpoint_only_expands_own_active_rules(self):
+        user = User.objects.create(username='recurring')
+        other = User.objects.create(username='other')
+        RecurringExpense.objects.create(user=user, start_date=date(2025, 1, 5),
+                                        frequency='W', amount=Decimal('10'))
+        RecurringExpense.objects.create(user=user, start_date=date(2025, 1, 5), frequency='W',
+                                        amount=Decimal('99'), is_active=False)
+        RecurringExpense.objects.create(user=other, start_date=date(2025, 1, 5),
+                                        frequency='W', amount=Decimal('99'))
+        RecurringIncome.objects.create(user=user, start_date=date(2024, 12, 10),
+                                       frequency='M', amount=Decimal('5000'))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        data = client.get('/recurring/occurrences/',
+                          {'from': '2025-01-01', 'to': '2025-01-31'}).data
+        self.assertEqual([row['date'] for row in data['expenses']],
+                         [date(2025, 1, 5), date(2025, 1, 12), date(2025, 1, 19), date(2025, 1, 26)])
+        self.assertEqual(data['expenses_total'], Decimal('40'))
+        self.assertEqual(data['incomes_total'], Decimal('5000'))
+        self.assertEqual(client.get('/recurring/occurrences/',
+                                    {'from': '2025-01-01', 'to': '2040-01-01'}).status_code, 400)
+
+
+class MaterializeRecurringTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='materialize')
+        self.budget = Budget.objects.create(
+            user=self.user, name='home', amount=5000, remaining_amount=5000)
+        self.rent = RecurringExpense.objects.create(
+            user=self.user, start_date=date(2025, 1, 1), frequency='M',
+            amount=Decimal('1000'), budget=self.budget)
+        self.gym = RecurringExpense.objects.create(
+            user=self.user, start_date=date(2025, 1, 1), end_date=date(2025, 1, 20),
+            frequency='W', amount=Decimal('10'))
+        self.salary = RecurringIncome.objects.create(
+            user=self.user, start_date=date(2025, 1, 10), frequency='M',
+            amount=Decimal('6000'))
+
+    def _run(self, day):
+        call_command('materialize_recurring', '--date', day, stdout=StringIO())
+
+    def test_posts_due_occurrences_once(self):
+        self._run('2025-01-25')
+        self._run('2025-01-25')
+        self.assertEqual(sorted(Expense.objects.values_list('pay_date', 'amount')), [
+            (date(2025, 1, 1), Decimal('10')), (date(2025, 1, 1), Decimal('1000')),
+            (date(2025, 1, 8), Decimal('10')), (date(2025, 1, 15), Decimal('10'))])
+        self.assertEqual(list(Income.objects.values_list('date', flat=True)),
+                         [date(2025, 1, 10)])
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.remaining_amount, Decimal('4000'))
+        self.assertEqual(compare_rollups(), [])
+
+        self.gym.refresh_from_db()
+        self.assertFalse(self.gym.is_active)
+        self.rent.refresh_from_db()
+        self.assertTrue(self.rent.is_active)
+        self.assertEqual(self.rent.posted_through, date(2025, 1, 25))
+
+    def test_catches_up_after_missed_days(self):
+        self._run('2025-01-05')
+        self._run('2025-03-02')
+        self.assertEqual(
+            list(Expense.objects.filter(recurring_expense=self.rent)
+                 .order_by('pay_date').values_list('pay_date', flat=True)),
+            [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(Income.objects.count(), 2)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.remaining_amount, Decimal('2000'))
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='forecast')
+        UserProfile.objects.create(user=self.user, pay_day='1', expected_income=6000,
+                                   saving_target=1000)
+        UserProfile.objects.filter(user=self.user).update(join_date=date(2024, 1, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.budget = Budget.objects.create(
+            user=self.user, name='food', amount=3000, remaining_amount=2500)
+        # 900 of variable spend in each of the three previous cycles
+        for month in (1, 2, 3):
+            Expense.objects.create(user=self.user, pay_date=date(2025, month, 10),
+                                   amount=Decimal('900'), budget=self.budget)
+        Expense.objects.create(user=self.user, pay_date=date(2025, 4, 5),
+                               amount=Decimal('500'), budget=self.budget)
+        RecurringExpense.objects.create(user=self.user, start_date=date(2025, 1, 20),
+                                        frequency='M', amount=Decimal('1000'))
+        Budget.objects.filter(pk=self.budget.pk).update(remaining_amount=2500)
+
+    def _forecast(self, months=2):
+        with mock.patch('base.views.local_today', return_value=date(2025, 4, 16)):
+            return self.client.get('/forecast/', {'months': months}).data
+
+    def test_projection(self):
+        data = self._forecast()
+        self.assertEqual(data['average_variable_spend'], Decimal('900.00'))
+        current, following = data['cycles']
+        self.assertEqual((current['start'], current['end']), (date(2025, 4, 1), date(2025, 4, 30)))
+        # 500 spent so far plus 900 * 14/30 for the rest of the cycle
+        self.assertEqual(current['variable_expenses'], Decimal('920.00'))
+        self.assertEqual(current['recurring_expenses'], Decimal('1000.00'))
+        self.assertEqual(current['projected_savings'], Decimal('4080.00'))
+        self.assertEqual(following['projected_savings'], Decimal('4100.00'))
+        self.assertEqual(following['cumulative_savings'], Decimal('8180.00'))
+        self.assertEqual(data['budgets'][0]['projected_remaining'], Decimal('2080.00'))
+
+    def test_cached_until_the_user_changes_data(self):
+        self._forecast()
+        with self.assertNumQueries(0):
+            self._forecast()
+        Expense.objects.create(user=self.user, pay_date=date(2025, 4, 16),
+                               amount=Decimal('100'))
+        data = self._forecast()
+        self.assertEqual(data['cycles'][0]['variable_expenses'], Decimal('1020.00'))
+
+        # Other users' changes keep the cache
+        other = User.objects.create(username='someone')
+        Expense.objects.create(user=other, amount=Decimal('1'))
+        with self.assertNumQueries(0):
+            self._forecast()
+
+    def test_category_changes_drop_the_cache(self):
+        category = UserCategory.objects.create(user=self.user, category_name='food')
+        self._forecast()
+        category.category_name = 'groceries'
+        category.save()
+        with CaptureQueriesContext(connection) as queries:
+            self._forecast()
+        self.assertTrue(queries.captured_queries)
+
+    def test_read_racing_a_write_is_dropped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(user=self.user, pay_date=date(2025, 4, 16),
+                                   amount=Decimal('100'))
+            # Cached under the bumped version before the write committed
+            self._forecast()
+        with CaptureQueriesContext(connection) as queries:
+            self._forecast()
+        self.assertTrue(queries.captured_queries)
+
+
+class RecurringIncomeEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='incomes')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.own = RecurringIncome.objects.create(
+            user=self.user, start_date=date(2025, 1, 1), amount=Decimal('100'))
+
+    def _add_other_users(self, count):
+        for i in range(count):
+            other = User.objects.create(username=f'other{User.objects.count()}')
+            RecurringIncome.objects.create(user=other, start_date=date(2025, 1, 1),
+                                           amount=Decimal('1'))
+
+    def _query_counts(self):
+        counts = []
+        for method, url, body in (
+                ('get', '/recurring_incomes/', None),
+                ('get', f'/recurring_incomes/{self.own.id}', None),
+                ('put', f'/recurring_incomes/{self.own.id}', {'amount': '150'}),
+                ('post', '/recurring_incomes/',
+                 {'start_date': '2025-02-01', 'amount': '10', 'frequency': 'M'})):
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, body, format='json')
+            self.assertLess(response.status_code, 300)
+            counts.append(len(queries))
+        return counts
+
+    def test_query_count_does_not_grow_with_other_users(self):
+        self._add_other_users(1)
+        baseline = self._query_counts()
+        self._add_other_users(20)
+        self.assertEqual(self._query_counts(), baseline)
+        # Writes add one INSERT for the change log
+        self.assertTrue(all(count <= 4 for count in baseline), baseline)
+
+    def test_only_own_rows_are_visible(self):
+        self._add_other_users(2)
+        response = self.client.get('/recurring_incomes/')
+        self.assertEqual([row['id'] for row in response.json()], [self.own.id])
+        foreign = RecurringIncome.objects.exclude(user=self.user).first()
+        self.assertEqual(self.client.get(f'/recurring_incomes/{foreign.id}').status_code, 404)
+        self.assertEqual(self.client.delete(f'/recurring_incomes/{foreign.id}').status_code, 404)
+
+    def test_delete_deactivates_then_removes(self):
+        url = f'/recurring_incomes/{self.own.id}'
+        self.assertFalse(self.client.delete(url).data['is_active'])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(RecurringIncome.objects.filter(pk=self.own.pk).exists())
+
+
+class TaskBulkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='tasks')
+        self.other = User.objects.create(username='other-tasks')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.foreign = Task.objects.create(user=self.other, description='x', is_done=True)
+
+    def test_list_is_scoped_and_filterable(self):
+        done = Task.objects.create(user=self.user, description='a', is_done=True)
+        todo = Task.objects.create(user=self.user, description='b')
+        response = self.client.get('/tasks/')
+        self.assertEqual([row['id'] for row in response.json()], [done.id, todo.id])
+        response = self.client.get('/tasks/?is_done=false')
+        self.assertEqual([row['id'] for row in response.json()], [todo.id])
+        self.assertEqual(self.client.get(f'/tasks/{self.foreign.id}').status_code, 404)
+
+    def test_bulk_create_is_one_insert(self):
+        payload = [{'description': f'task {i}'} for i in range(10)]
+        with self.assertNumQueries(4):  # savepoint, INSERT, change log INSERT, release
+            response = self.client.post('/tasks/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10)
+        self.assertTrue(all(row['user'] == self.user.id for row in response.data))
+
+    def test_bulk_create_rejects_invalid_items(self):
+        response = self.client.post('/tasks/bulk/', [{'description': 'ok'}, {}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.filter(user=self.user).exists())
+
+    def test_bulk_toggle(self):
+        tasks = Task.objects.bulk_create(
+            [Task(user=self.user, description=str(i), is_done=i % 2 == 0) for i in range(4)])
+        ids = [task.id for task in tasks] + [self.foreign.id]
+
+        with self.assertNumQueries(4):
+            response = self.client.put('/tasks/bulk/', {'ids': ids}, format='json')
+        self.assertEqual(response.data, {'updated': 4})
+        self.assertEqual(list(Task.objects.filter(user=self.user).order_by('id')
+                              .values_list('is_done', flat=True)), [False, True, False, True])
+
+        self.client.put('/tasks/bulk/', {'ids': ids, 'is_done': True}, format='json')
+        self.assertFalse(Task.objects.filter(user=self.user, is_done=False).exists())
+        self.assertEqual(
+            self.client.put('/tasks/bulk/', {'ids': 'all'}, format='json').status_code, 400)
+
+    def test_delete_all_done(self):
+        Task.objects.create(user=self.user, description='done', is_done=True)
+        todo = Task.objects.create(user=self.user, description='todo')
+        response = self.client.delete('/tasks/bulk/')
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(list(Task.objects.filter(user=self.user)), [todo])
+        self.assertTrue(Task.objects.filter(pk=self.foreign.pk).exists())
+
+
+class ExpenseBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='batch')
+        self.other = User.objects.create(username='other-batch')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.food = Budget.objects.create(
+            user=self.user, name='food', amount=1000, remaining_amount=1000)
+        self.home = Budget.objects.create(
+            user=self.user, name='home', amount=500, remaining_amount=500)
+        self.foreign_budget = Budget.objects.create(
+            user=self.other, name='theirs', amount=100, remaining_amount=100)
+        self.category = UserCategory.objects.create(user=self.user, category_name='food')
+
+    def _post(self, payload):
+        return self.client.post('/expenses/batch/', payload, format='json')
+
+    def _remaining(self, budget):
+        budget.refresh_from_db()
+        return budget.remaining_amount
+
+    def test_mixed_batch_matches_per_row_accounting(self):
+        moved = Expense.objects.create(user=self.user, pay_date=date(2025, 3, 1),
+                                       amount=Decimal('40'), budget=self.food)
+        gone = Expense.objects.create(user=self.user, pay_date=date(2025, 3, 2),
+                                      amount=Decimal('25'), budget=self.home)
+        creates = [{'pay_date': '2025-03-05', 'amount': '10', 'budget': self.food.id,
+                    'category': self.category.id} for _ in range(200)]
+
+        response = self._post({
+            'create': creates,
+            'update': [{'id': moved.id, 'budget': self.home.id, 'amount': '60'}],
+            'delete': [gone.id],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['created']), 200)
+        self.assertEqual(response.data['deleted'], [gone.id])
+        self.assertEqual(response.data['errors'], [])
+        # food: 960 + 40 moved out - 200 x 10 added; home: 475 + 25 deleted - 60 moved in
+        self.assertEqual(self._remaining(self.food), Decimal('-1000'))
+        self.assertEqual(self._remaining(self.home), Decimal('440'))
+        self.assertEqual(compare_rollups([self.user.id]), [])
+        self.assertEqual(
+            DailyRollup.objects.get(user=self.user, day=date(2025, 3, 5)).count, 200)
+
+    def test_budget_updates_are_set_based(self):
+        creates = [{'amount': '1', 'budget': budget.id}
+                   for budget in (self.food, self.home) for _ in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            self._post({'create': creates})
+        budget_updates = [q for q in queries
+                          if q['sql'].startswith('UPDATE "base_budget"')]
+        self.assertEqual(len(budget_updates), 2)
+        self.assertEqual(self._remaining(self.food), Decimal('950'))
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        theirs = Expense.objects.create(user=self.other, amount=Decimal('5'))
+        response = self._post({
+            'create': [{'amount': '5'}, {'amount': 'abc'},
+                       {'amount': '5', 'budget': self.foreign_budget.id}],
+            'update': [{'id': theirs.id, 'amount': '1'}],
+            'delete': [theirs.id, 'x'],
+        })
+        self.assertEqual(len(response.data['created']), 1)
+        self.assertEqual(
+            [(error['op'], error['index'], sorted(error['errors'])) for error in response.data['errors']],
+            [('create', 1, ['amount']), ('create', 2, ['budget']),
+             ('delete', 0, ['id']), ('delete', 1, ['id']), ('update', 0, ['id'])])
+        self.assertEqual(self._remaining(self.foreign_budget), Decimal('100'))
+        self.assertTrue(Expense.objects.filter(pk=theirs.pk, amount=Decimal('5')).exists())
+
+    def test_malformed_batch(self):
+        self.assertEqual(self._post({'create': {}}).status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+
+
+class StatementImportTests(TestCase):
+    STATEMENT = (
+        'Date,Description,Amount\n'
+        '01/03/2025,SHUFERSAL DEAL,-120.50\n'
+        '01/03/2025,SHUFERSAL DEAL,-120.50\n'
+        '02/03/2025,Salary ACME,"9,000.00"\n'
+        '03/03/2025,Cafe,-18\n'
+        'not a date,Cafe,-18\n'
+        '\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create(username='statement')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.groceries = UserCategory.objects.create(user=self.user, category_name='groceries')
+        self.food = Budget.objects.create(
+            user=self.user, name='food', amount=1000, remaining_amount=1000)
+        CategoryRule.objects.create(
+            user=self.user, pattern='shufersal', category=self.groceries, budget=self.food)
+
+    def _upload(self, content, **fields):
+        upload = SimpleUploadedFile('statement.csv', content.encode('utf-8-sig'))
+        return self.client.post('/import/', {'file': upload, **fields}, format='multipart')
+
+    def test_import_and_reimport(self):
+        response = self._upload(self.STATEMENT)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['expenses'], response.data['incomes'],
+             response.data['duplicates'], response.data['error_count']), (3, 1, 0, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 6)
+
+        groceries = Expense.objects.filter(user=self.user, category=self.groceries)
+        self.assertEqual(groceries.count(), 2)
+        self.assertTrue(all(expense.budget_id == self.food.id for expense in groceries))
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.remaining_amount, Decimal('759.00'))
+        self.assertEqual(Income.objects.get(user=self.user).amount, Decimal('9000.00'))
+        self.assertEqual(compare_rollups([self.user.id]), [])
+
+        # An overlapping statement only adds its new lines
+        response = self._upload(self.STATEMENT + '04/03/2025,Cafe,-18\n')
+        self.assertEqual((response.data['expenses'], response.data['duplicates']), (1, 4))
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.remaining_amount, Decimal('759.00'))
+        self.assertEqual(compare_rollups([self.user.id]), [])
+
+    def test_out_of_range_amount_is_a_line_error(self):
+        response = self._upload('Date,Description,Amount\n'
+                                '01/03/2025,Cafe,-18\n'
+                                '02/03/2025,Typo,-99999999999\n'
+                                '03/03/2025,Cafe,-99999999.99\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['expenses'], response.data['error_count']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        self.assertIn('out of range', response.data['errors'][0]['error'])
+
+    def test_bad_files(self):
+        self.assertEqual(self.client.post('/import/', {}, format='multipart').status_code, 400)
+        response = self._upload('When,What\n01/03/2025,x\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('amount', response.data['error'])
+
+    def test_command_with_debit_credit_columns(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'statement.csv')
+        with open(path, 'w', encoding='cp1255', newline='') as f:
+            f.write('תאריך,תיאור,חובה,זכות\n'
+                    '2025.03.05,שופרסל,50,\n'
+                    '2025.03.06,משכורת,,7000\n')
+        out = StringIO()
+        call_command('import_statement', path, '--user', 'statement', '--encoding', 'cp1255',
+                     '--date-column', 'תאריך', '--description-column', 'תיאור',
+                     '--debit-column', 'חובה', '--credit-column', 'זכות',
+                     '--date-format', '%Y.%m.%d', stdout=out)
+        self.assertIn('Imported 1 expenses and 1 incomes', out.getvalue())
+        expense = Expense.objects.get(user=self.user)
+        self.assertEqual((expense.pay_date, expense.amount), (date(2025, 3, 5), Decimal('50.00')))
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount('₪ 1,234.50'), Decimal('1234.50'))
+        self.assertEqual(parse_amount('(12.00)'), Decimal('-12.00'))
+        self.assertIsNone(parse_amount(' '))
+        with self.assertRaises(StatementError):
+            parse_amount('abc')
+
+
+class LedgerExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='export')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = UserCategory.objects.create(user=self.user, category_name='food, drinks')
+        self.budget = Budget.objects.create(
+            user=self.user, name='food', amount=100, remaining_amount=100)
+
+    def _export(self, query):
+        response = self.client.get(f'/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_and_ndjson(self):
+        expense = Expense.objects.create(user=self.user, pay_date=date(2025, 1, 2),
+                                         amount=Decimal('12.50'), category=self.category,
+                                         budget=self.budget)
+        Income.objects.create(user=self.user, date=date(2025, 1, 3), amount=Decimal('900'))
+        other = User.objects.create(username='other-export')
+        Expense.objects.create(user=other, amount=Decimal('1'))
+
+        self.assertEqual(
+            self._export('format=csv&type=expenses').splitlines(),
+            ['id,pay_date,description,amount,category,budget,recurring_expense',
+             f'{expense.id},2025-01-02,,12.50,{self.category.id},{self.budget.id},'])
+
+        lines = self._export('format=csv').splitlines()
+        self.assertIn(f'categories,{self.category.id},"food, drinks"', lines)
+        self.assertEqual(len([line for line in lines if line.startswith('type,')]), 6)
+
+        rows = [json.loads(line) for line in self._export('format=ndjson').splitlines()]
+        self.assertEqual([row['type'] for row in rows],
+                         ['categories', 'budgets', 'expenses', 'incomes'])
+        self.assertEqual(rows[2]['amount'], '12.50')
+        self.assertEqual(rows[3]['date'], '2025-01-03')
+
+    def test_bad_request(self):
+        self.assertEqual(self.client.get('/export/?type=passwords').status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'bulk data is generated with SQLite SQL')
+    @skipUnless(os.path.exists('/proc/self/statm'), 'reads the RSS from /proc')
+    def test_memory_stays_flat_for_large_history(self):
+        rows = 500_000
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < %s) '
+                'INSERT INTO base_expense (user_id, pay_date, description, amount, category_id) '
+                "SELECT %s, date('2020-01-01', '+' || (i %% 1800) || ' days'), "
+                "'expense number ' || i, (i %% 10000) / 100.0, %s FROM n",
+                [rows, self.user.id, self.category.id])
+
+        page_size = os.sysconf('SC_PAGE_SIZE')
+
+        def rss():
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * page_size
+
+        response = self.client.get('/export/?format=csv&type=expenses')
+        baseline = peak = rss()
+        lines = 0
+        for block in response.streaming_content:
+            lines += block.count(b'\n')
+            peak = max(peak, rss())
+
+        self.assertEqual(lines, rows + 1)
+        # The export itself is ~20MB and the rows ~500MB as model instances;
+        # streaming only ever holds a couple of chunks
+        self.assertLess(peak - baseline, 20 * 1024 * 1024)
+
+
+class FastListSerializationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='fast')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = UserCategory.objects.create(user=self.user, category_name='קניות')
+        budget = Budget.objects.create(user=self.user, name='food', amount=Decimal('1000'),
+                                       remaining_amount=Decimal('999.5'))
+        rule = RecurringExpense.objects.create(user=self.user, start_date=date(2025, 1, 1),
+                                               amount=Decimal('30'), budget=budget)
+        RecurringIncome.objects.create(user=self.user, start_date=date(2025, 1, 1),
+                                       end_date=date(2025, 6, 1), amount=Decimal('7000'))
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 2), amount=Decimal('0.1'),
+                               description='a "quoted" \\ description', category=category,
+                               budget=budget, recurring_expense=rule)
+        Expense.objects.create(user=self.user, amount=Decimal('12345678.9'))
+        Income.objects.create(user=self.user, date=date(2025, 1, 3), amount=Decimal('100'))
+
+    def test_same_json_as_the_serializers(self):
+        renderer = JSONRenderer()
+        for url, serializer_class, queryset in (
+                ('/expenses/', ExpensesSerializer, Expense.objects.order_by('pay_date', 'id')),
+                ('/incomes/', IncomesSerializer, Income.objects.order_by('-date')),
+                ('/budgets/', BudgetsSerializer, Budget.objects.all()),
+                ('/categories/', UserCategoriesSerializer, UserCategory.objects.all()),
+                ('/recurring_expenses/', RecurringExpensesSerializer, RecurringExpense.objects.all()),
+                ('/recurring_incomes/', RecurringIncomesSerializer, RecurringIncome.objects.all())):
+            response = self.client.get(url)
+            expected = renderer.render(serializer_class(queryset, many=True).data)
+            self.assertEqual(json.loads(response.content), json.loads(expected), url)
+
+    def test_paginated_shape(self):
+        body = self.client.get('/expenses/', {'limit': 1}).json()
+        self.assertEqual(body['results'][0]['amount'], '12345678.90')
+        self.assertIsNotNone(body['next_cursor'])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.user = User.objects.create(username='cached')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.budget = Budget.objects.create(
+            user=self.user, name='food', amount=100, remaining_amount=100)
+
+    def test_hits_until_a_change(self):
+        Expense.objects.create(user=self.user, amount=Decimal('5'), budget=self.budget)
+        first = self.client.get('/expenses/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/expenses/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        # Another query string is another entry
+        self.assertEqual(self.client.get('/expenses/', {'limit': 1})['X-Cache'], 'MISS')
+
+        self.client.post('/expenses/', {'pay_date': '2025-01-01', 'amount': '7',
+                                        'budget': self.budget.id}, format='json')
+        response = self.client.get('/expenses/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+        # The expense signal moved the budget, and the budget list follows
+        self.assertEqual(self.client.get('/budgets/').json()[0]['remaining_amount'], '88.00')
+
+    def test_each_user_and_model_invalidates_its_own(self):
+        other = User.objects.create(username='other-cached')
+        self.client.get('/categories/')
+        UserCategory.objects.create(user=other, category_name='theirs')
+        self.assertEqual(self.client.get('/categories/')['X-Cache'], 'HIT')
+
+        category = UserCategory.objects.create(user=self.user, category_name='mine')
+        self.assertEqual(self.client.get('/categories/').json()[0]['id'], category.id)
+        category.delete()
+        self.assertEqual(self.client.get('/categories/').json(), [])
+
+    def test_bulk_jobs_invalidate(self):
+        self.client.get('/budgets/')
+        Budget.objects.update(remaining_amount=0)
+        call_command('reset_budgets', '--date', '2025-01-01', stdout=StringIO())
+        self.assertEqual(self.client.get('/budgets/')['X-Cache'], 'MISS')
+
+    def test_errors_are_not_cached_and_stats(self):
+        self.assertEqual(self.client.get('/expenses/', {'from': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/expenses/', {'from': 'x'}).status_code, 400)
+        self.client.get('/incomes/')
+        self.client.get('/incomes/')
+
+        self.assertEqual(self.client.get('/cache_stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/cache_stats/').data,
+                         {'hits': 1, 'misses': 3, 'not_modified': 0, 'hit_rate': 0.25})
+
+    def test_hits_and_304s_do_not_write_the_cache(self):
+        etag = self.client.get('/budgets/')['ETag']
+        with mock.patch.object(cache, 'set') as cache_set, \
+                mock.patch.object(cache, 'incr') as cache_incr:
+            self.assertEqual(self.client.get('/budgets/')['X-Cache'], 'HIT')
+            self.assertEqual(self.client.get('/budgets/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cache_set.assert_not_called()
+        cache_incr.assert_not_called()
+
+    def test_conditional_get(self):
+        first = self.client.get('/budgets/')
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/budgets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/budgets/?x=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Changes to other resources keep the ETag, changes to budgets don't
+        Income.objects.create(user=self.user, amount=Decimal('1'))
+        self.assertEqual(self.client.get('/budgets/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Expense.objects.create(user=self.user, amount=Decimal('1'), budget=self.budget)
+        response = self.client.get('/budgets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['remaining_amount'], '99.00')
+
+    def test_lost_versions_do_not_revive_etags(self):
+        etag = self.client.get('/budgets/')['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get('/budgets/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bulk_task_operations_invalidate(self):
+        self.client.get('/tasks/')
+        self.client.post('/tasks/bulk/', [{'description': 'a', 'is_done': True}], format='json')
+        self.assertEqual(len(self.client.get('/tasks/').json()), 1)
+        self.client.delete('/tasks/bulk/')
+        self.assertEqual(self.client.get('/tasks/').json(), [])
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='synced')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.budget = Budget.objects.create(
+            user=self.user, name='food', amount=Decimal('100'), remaining_amount=Decimal('100'))
+
+    def sync(self, since, **params):
+        response = self.client.get('/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_upserts_and_tombstones(self):
+        category = UserCategory.objects.create(user=self.user, category_name='groceries')
+        expense = Expense.objects.create(
+            user=self.user, amount=Decimal('30'), category=category, budget=self.budget)
+        other = User.objects.create(username='not-synced')
+        Task.objects.create(user=other, description='theirs')
+
+        first = self.sync(0)
+        self.assertFalse(first['more'])
+        self.assertEqual(set(first['changes']), {'budgets', 'categories', 'expenses'})
+        self.assertEqual(first['changes']['budgets']['upserts'][0]['remaining_amount'], '70.00')
+        self.assertEqual(first['changes']['expenses']['upserts'],
+                         [json.loads(JSONRenderer().render(ExpensesSerializer(expense).data))])
+
+        expense.amount = Decimal('40')
+        expense.save()
+        category_id = category.id
+        category.delete()
+        second = self.sync(first['next'])
+        self.assertEqual(second['changes']['categories'], {'upserts': [], 'deletes': [category_id]})
+        self.assertEqual(second['changes']['expenses']['upserts'][0]['amount'], '40.00')
+        self.assertEqual(second['changes']['budgets']['upserts'][0]['remaining_amount'], '60.00')
+        self.assertEqual(self.sync(second['next'])['changes'], {})
+
+    def test_pages_and_bad_params(self):
+        for i in range(5):
+            Task.objects.create(user=self.user, description=str(i))
+        page = self.sync(0, limit=4)
+        self.assertTrue(page['more'])
+        page = self.sync(page['next'], limit=4)
+        self.assertFalse(page['more'])
+        self.assertEqual(len(page['changes']['tasks']['upserts']), 2)
+        self.assertEqual(self.client.get('/sync/', {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/sync/', {'since': -1}).status_code, 400)
+
+    def test_bulk_writes_are_logged(self):
+        since = self.sync(0)['next']
+        response = self.client.post('/expenses/batch/', {'create': [
+            {'pay_date': '2025-01-02', 'amount': '5', 'budget': self.budget.id}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.post('/tasks/bulk/', [{'description': 'a', 'is_done': True}], format='json')
+        task_id = Task.objects.get(user=self.user).id
+
+        changes = self.sync(since)['changes']
+        self.assertEqual(changes['expenses']['upserts'][0]['amount'], '5.00')
+        self.assertEqual(changes['budgets']['upserts'][0]['remaining_amount'], '95.00')
+        self.assertEqual(changes['tasks']['upserts'][0]['id'], task_id)
+
+        since = self.sync(since)['next']
+        self.client.delete('/tasks/bulk/')
+        UserProfile.objects.create(user=self.user, first_name='a', last_name='b', pay_day='1')
+        call_command('reset_budgets', '--date', '2025-02-01', stdout=StringIO())
+        changes = self.sync(since)['changes']
+        self.assertEqual(changes['tasks'], {'upserts': [], 'deletes': [task_id]})
+        self.assertEqual(changes['budgets']['upserts'][0]['remaining_amount'], '100.00')
+
+    def test_compaction(self):
+        task = Task.objects.create(user=self.user, description='a')
+        for i in range(3):
+            task.description = str(i)
+            task.save()
+        gone = Task.objects.create(user=self.user, description='gone')
+        gone_id = gone.id
+        gone.delete()
+        since = ChangeLog.objects.filter(user=self.user).order_by('id').first().id
+
+        result = compact_changelog()
+        self.assertEqual(result, {'superseded': 4, 'expired': 0})
+        self.assertEqual(ChangeLog.objects.filter(user=self.user).count(), 3)
+        changes = self.sync(since)['changes']
+        self.assertEqual(changes['tasks']['upserts'][0]['description'], '2')
+        self.assertEqual(changes['tasks']['deletes'], [gone_id])
+
+        # Once the tombstone expires, clients from before it start over
+        result = compact_changelog(now=datetime.now(dt_timezone.utc) + timedelta(days=91))
+        self.assertEqual(result, {'superseded': 0, 'expired': 1})
+        response = self.client.get('/sync/', {'since': since})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['reset'])
+        changes = self.sync(0)['changes']
+        self.assertEqual([row['id'] for row in changes['tasks']['upserts']], [task.id])
+        self.assertEqual(changes['tasks']['deletes'], [])
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bootstrap')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        UserProfile.objects.create(user=self.user, first_name='boot', last_name='strap')
+        self.category = UserCategory.objects.create(user=self.user, category_name='food')
+        budget = Budget.objects.create(
+            user=self.user, name='food', amount=Decimal('100'), remaining_amount=Decimal('100'))
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 2), amount=Decimal('5'),
+                               category=self.category, budget=budget)
+        Expense.objects.create(user=self.user, pay_date=date(2025, 1, 1), amount=Decimal('7'))
+        for day in (1, 3):
+            Income.objects.create(user=self.user, date=date(2025, 1, day), amount=Decimal('50'))
+            RecurringExpense.objects.create(
+                user=self.user, start_date=date(2025, 1, day), amount=Decimal('9'))
+            RecurringIncome.objects.create(
+                user=self.user, start_date=date(2025, 1, day), amount=Decimal('90'))
+        Task.objects.create(user=self.user, description='todo')
+        other = User.objects.create(username='not-bootstrapped')
+        Expense.objects.create(user=other, amount=Decimal('1'))
+
+    def test_matches_the_list_endpoints(self):
+        with self.assertNumQueries(9):  # change log seq + one per section
+            response = self.client.get('/bootstrap/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['profile'], self.client.get('/user_profile/').json())
+        for section, url in (('expenses', '/expenses/'), ('incomes', '/incomes/'),
+                             ('recurring_expenses', '/recurring_expenses/'),
+                             ('recurring_incomes', '/recurring_incomes/'),
+                             ('budgets', '/budgets/'), ('categories', '/categories/'),
+                             ('tasks', '/tasks/')):
+            self.assertEqual(data[section], self.client.get(url).json(), section)
+        self.assertEqual(data['seq'], self.client.get('/sync/').json()['next'])
+
+    def test_selected_sections(self):
+        with self.assertNumQueries(3):
+            data = self.client.get('/bootstrap/', {'sections': 'budgets,category_rules'}).json()
+        self.assertEqual(set(data), {'seq', 'budgets', 'category_rules'})
+        self.assertEqual(data['budgets'][0]['remaining_amount'], '95.00')
+        response = self.client.get('/bootstrap/', {'sections': 'budgets,users'})
+        self.assertEqual(response.status_code, 400)
+
+
+def rewarm_availability():
+    # Forget the versions of earlier tests, whose rollbacks hand them out again
+    availability.usernames.current = availability.emails.current = None
+    availability.warm()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Reads SQLite EXPLAIN QUERY PLAN output')
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must search an index, never scan a whole table
+    """
+
+    def setUp(self):
+        self.user = User.objects.create(username='planned')
+
+    def assertSearchesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        scans = [line for line in plan.splitlines() if ' SCAN ' in f' {line} ']
+        self.assertEqual(scans, [], plan)
+
+    def test_ledger_lists(self):
+        window = (date(2025, 1, 1), date(2025, 1, 31))
+        self.assertSearchesIndex(
+            Expense.objects.filter(user=self.user, pay_date__range=window).order_by('pay_date', 'id'),
+            'expense_user_paydate_id_idx')
+        self.assertSearchesIndex(
+            Income.objects.filter(user=self.user, date__range=window).order_by('date', 'id'),
+            'income_user_date_id_idx')
+        self.assertSearchesIndex(
+            DailyRollup.objects.filter(user=self.user, day__range=window), 'dailyrollup_user_day_idx')
+
+    def test_recurring_rules(self):
+        self.assertSearchesIndex(
+            active_rules(RecurringExpense, self.user, date(2025, 1, 1), date(2025, 1, 31)),
+            'recexpense_user_start_idx')
+        self.assertSearchesIndex(
+            active_rules(RecurringIncome, self.user, date(2025, 1, 1), date(2025, 1, 31)),
+            'recincome_user_start_idx')
+
+    def test_pay_day_scan_of_reset_budgets(self):
+        self.assertSearchesIndex(
+            UserProfile.objects.filter(pay_day__in=['1', '01']).order_by('user_id')
+            .values_list('user_id', flat=True), 'userprofile_pay_day_idx')
+
+    def test_case_insensitive_availability(self):
+        self.assertSearchesIndex(
+            User.objects.filter(availability.lower_equals('username', 'Planned')),
+            'auth_user_username_lower_idx')
+        self.assertSearchesIndex(
+            UserProfile.objects.filter(availability.lower_equals('email', 'A@B.com'))
+            .exclude(user=self.user),
+            'userprofile_email_lower_idx')
+
+        rewarm_availability()
+        response = APIClient().post('/check_username/', {'username': 'PLANNED'}, format='json')
+        self.assertFalse(response.data['available'])
+
+    def test_tasks_and_sync(self):
+        self.assertSearchesIndex(
+            Task.objects.filter(user=self.user, is_done=Value(True)), 'task_user_is_done_idx')
+        self.assertSearchesIndex(
+            ChangeLog.objects.filter(user=self.user, id__gt=10).order_by('id'),
+            'changelog_user_seq_idx')
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def register(self, username='newbie', password='s3cret-pass'):
+        return APIClient().post('/register/', {'username': username, 'password': password},
+                                format='json')
+
+    @override_settings(DEFAULT_USER_CATEGORIES=['food', 'rent'],
+                       DEFAULT_USER_BUDGETS=[{'name': 'food', 'amount': 300}])
+    def test_account_is_written_in_one_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register()
+        self.assertEqual(response.status_code, 201)
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT')]
+        # user, profile, categories, budgets, change log
+        self.assertEqual(len(inserts), 5, inserts)
+
+        user = User.objects.get(username='newbie')
+        self.assertTrue(user.check_password('s3cret-pass'))
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+        self.assertEqual(sorted(UserCategory.objects.filter(user=user)
+                                .values_list('category_name', flat=True)), ['food', 'rent'])
+        self.assertEqual(list(Budget.objects.filter(user=user).values_list(
+            'name', 'amount', 'remaining_amount')), [('food', Decimal('300'), Decimal('300'))])
+
+        self.assertEqual(self.register('NEWBIE').status_code, 400)
+
+    def test_failure_leaves_no_partial_account(self):
+        with mock.patch.object(Budget.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.register()
+        self.assertFalse(User.objects.filter(username='newbie').exists())
+        self.assertFalse(UserCategory.objects.exists())
+
+    def test_throttled_per_ip(self):
+        with mock.patch.object(RegisterThrottle, 'THROTTLE_RATES', {'register': '2/hour'}):
+            self.register('one')
+            self.register('two')
+            self.assertEqual(self.register('three').status_code, 429)
+        self.assertFalse(User.objects.filter(username='three').exists())
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='Taken')
+        UserProfile.objects.create(user=self.user, first_name='a', last_name='b', email='me@x.com')
+        rewarm_availability()
+        self.client = APIClient()
+
+    def check(self, username):
+        response = self.client.post('/check_username/', {'username': username}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['available']
+
+    def test_bloom_filter(self):
+        bloom = availability.BloomFilter(2000)
+        for i in range(2000):
+            bloom.add(f'user{i}')
+        self.assertTrue(all(f'user{i}' in bloom for i in range(2000)))
+        false_positives = sum(f'other{i}' in bloom for i in range(2000))
+        self.assertLess(false_positives, 60)
+
+    def test_unseen_names_skip_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(self.check('fresh-name'))
+        with self.assertNumQueries(1):
+            self.assertFalse(self.check('TAKEN'))
+
+        # Written in this worker: in the filter on commit, no rebuild
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='Newcomer')
+        with self.assertNumQueries(1):
+            self.assertFalse(self.check('newcomer'))
+
+    def other_worker_writes(self):
+        NameVersion.objects.filter(name='usernames').update(version=F('version') + 1)
+
+    def test_writes_from_other_workers_fall_back_to_the_database(self):
+        self.other_worker_writes()
+        availability.usernames.checked_at = None  # VERSION_CHECK_SECONDS later
+        with mock.patch.object(availability.usernames, '_start_rebuild') as start_rebuild, \
+                self.assertNumQueries(2):
+            self.assertTrue(self.check('fresh-name'))
+        start_rebuild.assert_called_once()
+
+        availability.usernames.rebuild()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.check('fresh-name'))
+
+    def test_interleaved_writes_are_not_applied_in_place(self):
+        self.other_worker_writes()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='Mine')
+        # This worker's write came second, so the other one's name may be missing
+        with mock.patch.object(availability.usernames, '_start_rebuild'), \
+                self.assertNumQueries(1):
+            self.assertTrue(self.check('fresh-name'))
+
+    def test_email_check(self):
+        other = User.objects.create(username='other')
+        self.client.force_authenticate(other)
+        response = self.client.post('/check_email/', {'email': 'ME@x.com'}, format='json')
+        self.assertFalse(response.data['available'])
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/check_email/', {'email': 'me@x.com'}, format='json')
+        self.assertTrue(response.data['available'])
+
+    def test_throttled_per_ip(self):
+        with mock.patch.object(availability.AvailabilityThrottle, 'THROTTLE_RATES',
+                               {'availability': '2/min'}):
+            self.check('a')
+            self.check('b')
+            response = self.client.post('/check_username/', {'username': 'c'}, format='json')
+            self.assertEqual(response.status_code, 429)
+            other_ip = self.client.post('/check_username/', {'username': 'c'}, format='json',
+                                        REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(other_ip.status_code, 200)
+
+
+class TokenUserAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='token-user', password='pw')
+        Task.objects.create(user=self.user, description='t')
+        self.client = APIClient()
+        self.authorize(self.user)
+
+    def authorize(self, user):
+        token = MyTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_comes_from_the_token(self):
+        # The user's fields once, then from the cache
+        with self.assertNumQueries(2):
+            self.client.get('/tasks/', {'is_done': 'true'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/tasks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_deleted_or_inactive_users_are_refused(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/tasks/').status_code, 401)
+        staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+        self.authorize(staff)
+        self.assertEqual(self.client.get('/cache_stats/').status_code, 200)
+        staff.delete()
+        self.assertEqual(self.client.get('/cache_stats/').status_code, 401)
+        self.assertEqual(self.client.get('/token_stats/').status_code, 401)
+
+    def test_user_fields_are_cached_without_the_password(self):
+        # is_staff through the cache, the password hash from the row
+        with self.assertNumQueries(2):
+            response = self.client.get('/users/')
+        self.assertEqual(response.data['username'], 'token-user')
+        self.assertFalse(response.data['is_staff'])
+        self.assertTrue(response.data['password'].startswith('pbkdf2_'))
+        with self.assertNumQueries(1):
+            self.client.get('/users/')
+        self.assertNotIn('password', authentication.cached_user_fields(self.user.id))
+
+    def test_saving_the_user_drops_the_cached_row(self):
+        self.client.get('/users/')
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.client.get('/users/').data['is_staff'])
+        self.assertEqual(self.client.get('/cache_stats/').status_code, 200)
+
+    def test_claims_user_works_in_queries(self):
+        token = RefreshToken.for_user(self.user).access_token
+        claims_user = ClaimsUser.from_db(None, ['id'], [token['user_id']])
+        self.assertEqual(Task.objects.filter(user=claims_user).count(), 1)
+        self.assertEqual(claims_user.username, 'token-user')
+        gone = ClaimsUser.from_db(None, ['id'], [self.user.id + 1000])
+        with self.assertRaises(AuthenticationFailed):
+            gone.is_staff
+
+    def test_token_login(self):
+        self.client.credentials()
+        response = self.client.post('/accounts/token/',
+                                    {'username': 'token-user', 'password': 'pw'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/users/').data['id'], self.user.id)
+
+
+class TokenPruneTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tokens._counts.clear()
+        tokens._published.clear()
+        self.user = User.objects.create_user(username='refresher', password='pw')
+        self.client = APIClient()
+
+    def test_refresh_rotates_and_is_timed(self):
+        response = self.client.post('/accounts/token/',
+                                    {'username': 'refresher', 'password': 'pw'}, format='json')
+        refresh = response.data['refresh']
+        response = self.client.post('/accounts/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        stats = tokens.token_stats()
+        self.assertEqual((stats['outstanding'], stats['blacklisted'], stats['refreshes']), (1, 1, 1))
+        self.assertIsNotNone(stats['refresh_avg_ms'])
+
+    def test_prune_deletes_expired_tokens_in_batches(self):
+        live = RefreshToken.for_user(self.user)
+        expired = []
+        for _ in range(5):
+            token = RefreshToken.for_user(self.user)
+            token.blacklist()
+            expired.append(token['jti'])
+        OutstandingToken.objects.filter(jti__in=expired).update(
+            expires_at=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+
+        with CaptureQueriesContext(connection) as queries:
+            result = tokens.prune_expired_tokens(batch_size=2)
+        self.assertEqual(result, {'pruned_outstanding': 5, 'pruned_blacklisted': 5})
+        self.assertEqual(sum('DELETE' in q['sql'] for q in queries.captured_queries), 6)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+        sample = tokens.token_history()[-1]
+        self.assertEqual((sample['outstanding'], sample['pruned_outstanding']), (1, 5))
+
+    def test_refreshes_are_summed_across_workers(self):
+        tokens.record_refresh(0.002)
+        generation = tokens._publish()
+        cache.set('tokens:refreshes:other',
+                  {'generation': generation, 'refreshes': 3, 'microseconds': 6000})
+        cache.set(tokens.WORKERS_KEY, cache.get(tokens.WORKERS_KEY) | {'tokens:refreshes:other'})
+        stats = tokens.token_stats()
+        self.assertEqual((stats['refreshes'], stats['refresh_avg_ms']), (4, 2.0))
+
+        # A prune samples them and starts over
+        tokens.prune_expired_tokens()
+        self.assertEqual(tokens.token_history()[-1]['refreshes'], 4)
+        self.assertEqual(tokens.token_stats()['refreshes'], 0)
+        tokens.record_refresh(0.001)
+        self.assertEqual(tokens.token_stats()['refreshes'], 1)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/token_stats/').status_code, 403)
+        admin = User.objects.create(username='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        call_command('prune_tokens', stdout=StringIO())
+        response = self.client.get('/token_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['history']), 1)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_production_pragmas(self):
+        path = os.path.join(tempfile.mkdtemp(), 'profile.sqlite3')
+        db = sqlite3.connect(path)
+        try:
+            configure(db, settings.DB_PROFILES['production']['PRAGMAS'])
+            pragmas = {name: db.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size')}
+        finally:
+            db.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1,
+                                   'busy_timeout': 20000, 'cache_size': -65536})
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+    def test_new_connections_get_the_profile_pragmas(self):
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            wrapper = connections.create_connection('default')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 1234)
+            finally:
+                wrapper.close()
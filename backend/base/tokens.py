@@ -0,0 +1,134 @@
+"""
+Housekeeping and metrics for the refresh token blacklist.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every login
+records an OutstandingToken and every refresh blacklists the token it
+replaced, so the token_blacklist tables only ever grow. Once a token has
+expired it is rejected on its exp claim alone and its rows are dead
+weight: prune_expired_tokens deletes them a batch per transaction (the
+library's flushexpiredtokens deletes them all in one).
+
+Refreshes are counted in memory, per worker process, and each worker
+publishes its totals to its own cache entry at most every PUBLISH_SECONDS
+(one writer per entry, so no increments are lost between processes).
+token_stats sums the entries of the current generation, a cache version
+each prune bumps, so the counts run from the previous prune; a prune then
+appends a sample of the table sizes and that latency to a short history.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .versions import bump_versions, current_versions
+
+GENERATION_KEY = 'tokens:generation'
+WORKERS_KEY = 'tokens:workers'
+HISTORY_KEY = 'tokens:history'
+HISTORY_LENGTH = 90
+BATCH_SIZE = 1000
+PUBLISH_SECONDS = 10
+WORKER_TIMEOUT = 24 * 60 * 60
+
+_counts = Counter()  # this worker's refreshes in _generation
+_published = Counter()
+_generation = None
+_published_at = None
+_lock = threading.Lock()
+
+
+def _worker_key():
+    return f'tokens:refreshes:{os.getpid()}'
+
+
+def record_refresh(seconds):
+    global _published_at
+    now = time.monotonic()
+    with _lock:
+        _counts['refreshes'] += 1
+        _counts['microseconds'] += round(seconds * 1_000_000)
+        due = _published_at is None or now - _published_at >= PUBLISH_SECONDS
+        if due:
+            _published_at = now
+    if due:
+        _publish()
+
+
+def _publish():
+    """
+    Write this worker's counts to its cache entry, keeping only the ones a
+    prune's sample missed if it began a new generation since the last
+    publish
+    """
+    global _generation, _published
+    generation = current_versions([GENERATION_KEY])[GENERATION_KEY]
+    with _lock:
+        if generation != _generation:
+            # The published counts went into the prune's sample, the rest carry over
+            _counts.subtract(_published)
+            _generation = generation
+        _published = Counter(_counts)
+        entry = {'generation': generation, **_counts}
+    key = _worker_key()
+    cache.set(key, entry, WORKER_TIMEOUT)
+    workers = cache.get(WORKERS_KEY, set())
+    if key not in workers:  # checked on every publish, so a lost add is redone
+        cache.set(WORKERS_KEY, workers | {key}, None)
+    return generation
+
+
+def token_stats():
+    """
+    Current table sizes and every worker's refreshes since the last prune
+    """
+    generation = _publish()
+    entries = cache.get_many(list(cache.get(WORKERS_KEY, set())))
+    current = [entry for entry in entries.values() if entry['generation'] == generation]
+    refreshes = sum(entry.get('refreshes', 0) for entry in current)
+    total = sum(entry.get('microseconds', 0) for entry in current)
+    return {
+        'outstanding': OutstandingToken.objects.count(),
+        'blacklisted': BlacklistedToken.objects.count(),
+        'refreshes': refreshes,
+        'refresh_avg_ms': round(total / refreshes / 1000, 2) if refreshes else None,
+    }
+
+
+def token_history():
+    return cache.get(HISTORY_KEY, [])
+
+
+def _record_sample(now, result):
+    sample = {'at': now.isoformat(), **token_stats(), **result}
+    bump_versions([GENERATION_KEY])
+    # Forget the workers whose entries expired
+    cache.set(WORKERS_KEY, set(cache.get_many(list(cache.get(WORKERS_KEY, set())))), None)
+    cache.set(HISTORY_KEY, (token_history() + [sample])[-HISTORY_LENGTH:], None)
+    return sample
+
+
+def prune_expired_tokens(now=None, batch_size=BATCH_SIZE):
+    """
+    Delete outstanding tokens that expired before now, and their blacklist
+    entries, batch_size tokens per transaction. Returns counts of the
+    outstanding and blacklisted rows removed, and records a stats sample.
+    """
+    now = now or timezone.now()
+    outstanding = blacklisted = 0
+    expired = OutstandingToken.objects.filter(expires_at__lt=now).order_by('id')
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        # Cascades to the blacklist entries
+        _, deleted = OutstandingToken.objects.filter(id__in=ids).delete()
+        outstanding += deleted.get(OutstandingToken._meta.label, 0)
+        blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+    result = {'pruned_outstanding': outstanding, 'pruned_blacklisted': blacklisted}
+    _record_sample(now, result)
+    return result
+
@@ -13,29 +13,50 @@ urlpatterns = [
     path('check_username/', views.check_username_availability, name='check_username'),
 
     path('expenses/', views.expenses_list, name='expenses_list'),
+    path('expenses/batch/', views.expenses_batch, name='expenses_batch'),
     path('expenses/<int:expense_id>',
          views.expense_detail, name='expense_detail'),
 
+    path('summary/', views.pay_cycle_summary, name='pay_cycle_summary'),
+    path('forecast/', views.cash_flow_forecast, name='cash_flow_forecast'),
+
     path('recurring_expenses/', views.my_recurring_expenses,
          name='recurring_expenses_list'),
     path('recurring_expenses/<int:recurring_expense_id>',
          views.recurring_expense_detail, name='recurring_expense_detail'),
 
+    path('recurring/occurrences/', views.recurring_occurrence_list,
+         name='recurring_occurrences'),
+
     path('incomes/', views.my_incomes, name='incomes_list'),
     path('incomes/<int:income_id>', views.income_detail, name='income_detail'),
 
-    path('recurring_incomes/', views.my_recurring_incomes),
+    path('recurring_incomes/', views.my_recurring_incomes,
+         name='recurring_incomes_list'),
+    path('recurring_incomes/<int:recurring_income_id>',
+         views.recurring_income_detail, name='recurring_income_detail'),
     path('recurring_incomes/<int:recurring_income_id>/',
-         views.my_recurring_incomes),
+         views.recurring_income_detail),
 
     path('categories/', views.my_categories, name='categories_list'),
     path('categories/<int:category_id>',
          views.category_detail, name='category_detail'),
 
+    path('category_rules/', views.my_category_rules, name='category_rules_list'),
+    path('category_rules/<int:rule_id>',
+         views.category_rule_detail, name='category_rule_detail'),
+    path('import/', views.import_bank_statement, name='import_bank_statement'),
+    path('export/', views.export_ledger, name='export_ledger'),
+    path('cache_stats/', views.response_cache_stats, name='response_cache_stats'),
+    path('token_stats/', views.refresh_token_stats, name='refresh_token_stats'),
+    path('sync/', views.sync_changes, name='sync_changes'),
+    path('bootstrap/', views.bootstrap, name='bootstrap'),
+
     path('budgets/', views.my_budgets, name='budgets_list'),
     path('budgets/<int:budget_id>',
          views.budget_detail, name='budget_detail'),
 
-    path('tasks/', views.my_tasks),
-    path('tasks/<int:task_id>', views.my_tasks),
+    path('tasks/', views.my_tasks, name='tasks_list'),
+    path('tasks/bulk/', views.tasks_bulk, name='tasks_bulk'),
+    path('tasks/<int:task_id>', views.task_detail, name='task_detail'),
 ]
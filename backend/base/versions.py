@@ -0,0 +1,46 @@
+"""
+Version counters in the cache, for the cached forecasts and list responses.
+
+Entries are cached under the current versions of what they were built
+from, so bumping a version makes all of them unreachable at once and they
+just expire. A version that is lost (evicted, or the cache cleared)
+restarts somewhere random rather than at 0, so it can't bring back an old
+entry or ETag.
+"""
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _new_version():
+    return random.getrandbits(48)
+
+
+def current_versions(keys):
+    """
+    {key: version} for each key, starting the ones that have none
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key, 0)
+    return versions
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump_versions(keys):
+    """
+    Bump the versions now and again on commit, so a read that raced the
+    write and cached the old rows under the new version is dropped too
+    """
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
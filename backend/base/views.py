@@ -1,14 +1,35 @@
 from .serializer import (UsersSerializer, UsersProfilesSerializer,
-                         UserCategoriesSerializer, IncomesSerializer, ExpensesSerializer, RecurringExpensesSerializer, RecurringIncomesSerializer, TasksSerializer, BudgetsSerializer)
-from .models import UserProfile, Expense, Income, UserCategory, RecurringExpense, RecurringIncome, Task, Budget
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+                         UserCategoriesSerializer, IncomesSerializer, ExpensesSerializer, RecurringExpensesSerializer, RecurringIncomesSerializer, TasksSerializer, TaskBulkSerializer, BudgetsSerializer,
+                         CategoryRulesSerializer)
+from .models import UserProfile, Expense, Income, UserCategory, RecurringExpense, RecurringIncome, Task, Budget, DailyRollup, CategoryRule
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import JSONRenderer
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.contrib.auth.hashers import make_password
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Q, Sum, Value, When
+from .pagination import (InvalidQueryParam, filter_ledger, is_paginated, keyset_paginate, parse_date_param,
+                         parse_id_param)
+from .recurring import recurring_occurrences
+from .forecast import MAX_FORECAST_MONTHS, get_forecast
+from .batch import InvalidBatch, apply_expense_batch
+from .bulk import bulk_written, delete_rows
+from .registration import RegisterThrottle, create_account
+from . import availability
+from .statements import StatementError, import_statement
+from .fastjson import json_response, serialized_rows
+from .response_cache import cache_list_response, cache_stats, reset_cache_stats
+from .tokens import token_history, token_stats
+from .sync import DELETE, PAGE_SIZE as SYNC_PAGE_SIZE, SyncReset, changes_since, log_changes, log_matching
+from .bootstrap import build_bootstrap, parse_sections
+from .export import SECTIONS as EXPORT_SECTIONS, CSVRenderer, NDJSONRenderer, stream_csv, stream_ndjson
+from .cycles import local_today, parse_pay_day, pay_cycle
+from decimal import Decimal
+import io
 
 
 # Create your views here.
@@ -37,6 +58,7 @@ def my_users(request, user_id=-1):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register_user(request):
     """
     POST /register/ -> Create new user account (public endpoint)
@@ -52,34 +74,20 @@ def register_user(request):
             )
 
         # Check if username already exists
-        if User.objects.filter(username__iexact=u_username).exists():
+        if User.objects.filter(availability.lower_equals('username', u_username)).exists():
             return Response(
                 {'error': 'Username already exists'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        hashed_password = make_password(u_password)
-        new_user = User.objects.create(
-            username=u_username, password=hashed_password)
-
-        # Create related objects
-        UserProfile.objects.create(
-            user_id=new_user.id,
-            first_name='',
-            last_name='',
-            email='',
-            pay_day=1,
-            salary_day=1
-        )
-        UserCategory.objects.create(user_id=new_user.id, category_name='אוכל')
-        UserCategory.objects.create(user_id=new_user.id, category_name='בית')
-        UserCategory.objects.create(user_id=new_user.id, category_name='כללי')
-        Budget.objects.create(user_id=new_user.id, amount=2000,
-                              remaining_amount=2000, name='אוכל')
-        Budget.objects.create(user_id=new_user.id, amount=1500,
-                              remaining_amount=1500, name='בית')
-        Budget.objects.create(user_id=new_user.id, amount=1000,
-                              remaining_amount=1000, name='כללי')
+        # User, profile and default categories/budgets in one transaction
+        try:
+            new_user = create_account(u_username, u_password)
+        except IntegrityError:
+            return Response(
+                {'error': 'Username already exists'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         response = UsersSerializer(new_user).data
         return Response(response, status=status.HTTP_201_CREATED)
 
@@ -113,6 +121,7 @@ def user_profile(request, user_id=-1):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([availability.AvailabilityThrottle])
 def check_email_availability(request):
     """
     POST /check_email/ -> Check if email is available
@@ -124,9 +133,10 @@ def check_email_availability(request):
     if not email:
         return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Check if email exists, excluding current user's email
-    exists = UserProfile.objects.filter(
-        email__iexact=email).exclude(user=request.user).exists()
+    # Check if email exists, excluding current user's email; an email the
+    # filter has never seen is free without asking the database
+    exists = availability.emails.might_contain(email) and UserProfile.objects.filter(
+        availability.lower_equals('email', email)).exclude(user=request.user).exists()
 
     return Response({
         'available': not exists,
@@ -136,6 +146,7 @@ def check_email_availability(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([availability.AvailabilityThrottle])
 def check_username_availability(request):
     """
     POST /check_username/ -> Check if username is available
@@ -148,8 +159,10 @@ def check_username_availability(request):
     if not username:
         return Response({'error': 'Username is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Check if username exists (case-insensitive)
-    exists = User.objects.filter(username__iexact=username).exists()
+    # Check if username exists (case-insensitive), skipping the database
+    # for names the filter has never seen
+    exists = availability.usernames.might_contain(username) and User.objects.filter(
+        availability.lower_equals('username', username)).exists()
 
     return Response({
         'available': not exists,
@@ -159,16 +172,28 @@ def check_username_availability(request):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_list_response('expenses')
 def expenses_list(request):
     """
     GET  /expenses/       -> list current user's expenses
     POST /expenses/       -> create new expense for current user
+
+    GET filters: ?from=YYYY-MM-DD&to=YYYY-MM-DD&category=<id>&budget=<id>
+    GET ?limit=<n>&cursor=<c> -> {"results": [...], "next_cursor": c|null}
     """
     if request.method == "GET":
-        expenses = Expense.objects.filter(
-            user=request.user).order_by('pay_date')
-        serializer = ExpensesSerializer(expenses, many=True)
-        return Response(serializer.data)
+        try:
+            expenses = filter_ledger(
+                Expense.objects.filter(user=request.user), request,
+                'pay_date', id_filters=('category', 'budget'))
+            rows = serialized_rows(expenses, ExpensesSerializer)
+            if is_paginated(request):
+                page, next_cursor = keyset_paginate(rows, request, 'pay_date')
+                return json_response({'results': page, 'next_cursor': next_cursor})
+        except InvalidQueryParam as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return json_response(list(rows.order_by('pay_date', 'id')))
 
     elif request.method == "POST":
         data = request.data.copy()
@@ -226,8 +251,114 @@ def expense_detail(request, expense_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def expenses_batch(request):
+    """
+    POST /expenses/batch/ {"create": [{...}], "update": [{"id": <id>, ...}], "delete": [<id>]}
+        -> {"created": [...], "updated": [...], "deleted": [<id>], "errors": [...]}
+
+    Valid items are applied together in one transaction. Invalid ones are
+    skipped and reported in errors as {"op", "index", "errors"}.
+    """
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Expected an object'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        created, updated, deleted, errors = apply_expense_batch(
+            request.user,
+            creates=request.data.get('create', []),
+            updates=request.data.get('update', []),
+            deletes=request.data.get('delete', []))
+    except InvalidBatch as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'created': ExpensesSerializer(created, many=True).data,
+        'updated': ExpensesSerializer(updated, many=True).data,
+        'deleted': deleted,
+        'errors': errors,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def pay_cycle_summary(request):
+    """
+    GET /summary/            -> totals for the current pay cycle
+    GET /summary/?offset=1   -> totals for the previous pay cycle (2 = the one before, ...)
+
+    All expense totals come from a single GROUP BY over the cycle's DailyRollup rows.
+    """
+    try:
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        return Response({'error': "'offset' must be a non-negative integer"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    profile = UserProfile.objects.filter(user=request.user).values(
+        'pay_day', 'saving_target', 'expected_income').first() or {}
+    today = local_today()
+    start, end = pay_cycle(parse_pay_day(profile.get('pay_day')), today, offset)
+
+    rows = (DailyRollup.objects
+            .filter(user=request.user, day__range=(start, end))
+            .values('category', 'category__category_name', 'budget', 'budget__name')
+            .annotate(sum_total=Sum('total'), sum_today=Sum('total', filter=Q(day=today)),
+                      sum_count=Sum('count'))
+            .order_by())
+
+    total_spent = Decimal('0')
+    spent_today = Decimal('0')
+    expense_count = 0
+    by_category = {}
+    by_budget = {}
+    for row in rows:
+        total_spent += row['sum_total']
+        spent_today += row['sum_today'] or 0
+        expense_count += row['sum_count']
+
+        category = by_category.setdefault(row['category'], {
+            'category': row['category'],
+            'category_name': row['category__category_name'],
+            'total': Decimal('0'),
+        })
+        category['total'] += row['sum_total']
+
+        budget = by_budget.setdefault(row['budget'], {
+            'budget': row['budget'],
+            'name': row['budget__name'],
+            'total': Decimal('0'),
+        })
+        budget['total'] += row['sum_total']
+
+    expected_income = profile.get('expected_income') or 0
+    saving_target = profile.get('saving_target') or 0
+    cycle_days = (end - start).days + 1
+    days_passed = min(max((today - start).days + 1, 0), cycle_days)
+
+    return Response({
+        'cycle_start': start,
+        'cycle_end': end,
+        'cycle_days': cycle_days,
+        'days_passed': days_passed,
+        'days_remaining': cycle_days - days_passed,
+        'total_spent': total_spent,
+        'spent_today': spent_today,
+        'expense_count': expense_count,
+        'by_category': list(by_category.values()),
+        'by_budget': list(by_budget.values()),
+        'expected_income': expected_income,
+        'saving_target': saving_target,
+        'expected_savings': expected_income - total_spent,
+        'saving_target_met': expected_income - total_spent >= saving_target,
+    })
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_list_response('categories')
 def my_categories(request):
     """
     GET  /categories/       -> list current user's categories
@@ -235,8 +366,7 @@ def my_categories(request):
     """
     if request.method == "GET":
         user_categories = UserCategory.objects.filter(user=request.user)
-        serializer = UserCategoriesSerializer(user_categories, many=True)
-        return Response(serializer.data)
+        return json_response(list(serialized_rows(user_categories, UserCategoriesSerializer)))
 
     elif request.method == "POST":
         data = request.data.copy()
@@ -282,17 +412,126 @@ def category_detail(request, category_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, CSVRenderer, NDJSONRenderer])
+def export_ledger(request):
+    """
+    GET /export/?format=csv|ndjson                -> the user's whole ledger, streamed
+    GET /export/?format=csv&type=expenses,incomes -> only these sections
+
+    Sections: categories, budgets, recurring_expenses, recurring_incomes, expenses, incomes
+    """
+    export_format = request.query_params.get('format', 'csv')
+    names = [name for name in request.query_params.get('type', '').split(',') if name]
+    unknown = [name for name in names if name not in EXPORT_SECTIONS]
+    if export_format not in ('csv', 'ndjson') or unknown:
+        return Response({'error': f"Unknown format or type: {', '.join(unknown) or export_format}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    names = names or list(EXPORT_SECTIONS)
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(
+            stream_csv(request.user, names), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            stream_ndjson(request.user, names), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="ledger.{export_format}"'
+    return response
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_list_response('category_rules')
+def my_category_rules(request):
+    """
+    GET  /category_rules/  -> list current user's statement import rules
+    POST /category_rules/  -> create rule {pattern, category, budget}
+    """
+    if request.method == "GET":
+        rules = CategoryRule.objects.filter(user=request.user).order_by('id')
+        return json_response(list(serialized_rows(rules, CategoryRulesSerializer)))
+
+    elif request.method == "POST":
+        data = request.data.copy()
+        data['user'] = request.user.id
+
+        serializer = CategoryRulesSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def category_rule_detail(request, rule_id):
+    """
+    DELETE /category_rules/<id> -> delete rule
+    """
+    rule = get_object_or_404(CategoryRule, id=rule_id, user=request.user)
+    rule.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_bank_statement(request):
+    """
+    POST /import/ (multipart) file=<csv>
+        optional: date_column, description_column, amount_column, debit_column,
+                  credit_column, date_format, encoding (default utf-8-sig),
+                  positive_expenses=true (amounts are expenses, e.g. credit cards)
+        -> {"expenses": n, "incomes": n, "duplicates": n, "errors": [...], "error_count": n}
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': "A CSV 'file' is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    columns = {field: request.data[f'{field}_column']
+               for field in ('date', 'description', 'amount', 'debit', 'credit')
+               if request.data.get(f'{field}_column')}
+    try:
+        lines = io.TextIOWrapper(
+            upload.file, encoding=request.data.get('encoding') or 'utf-8-sig', newline='')
+    except LookupError:
+        return Response({'error': 'Unknown encoding'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        result = import_statement(
+            request.user, lines, columns=columns,
+            date_format=request.data.get('date_format') or None,
+            positive_expenses=str(request.data.get('positive_expenses', '')).lower() in ('true', '1'))
+    except StatementError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@cache_list_response('incomes')
 def my_incomes(request):
     """
     GET  /incomes/       -> list current user's incomes
     POST /incomes/       -> create new income for current user
+
+    GET filters: ?from=YYYY-MM-DD&to=YYYY-MM-DD&category=<id>
+    GET ?limit=<n>&cursor=<c> -> {"results": [...], "next_cursor": c|null}
     """
     if request.method == "GET":
-        incomes = Income.objects.filter(user=request.user).order_by('-date')
-        serializer = IncomesSerializer(incomes, many=True)
-        return Response(serializer.data)
+        try:
+            incomes = filter_ledger(
+                Income.objects.filter(user=request.user), request,
+                'date', id_filters=('category',))
+            rows = serialized_rows(incomes, IncomesSerializer)
+            if is_paginated(request):
+                page, next_cursor = keyset_paginate(
+                    rows, request, 'date', descending=True)
+                return json_response({'results': page, 'next_cursor': next_cursor})
+        except InvalidQueryParam as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return json_response(list(rows.order_by('-date')))
 
     elif request.method == "POST":
         data = request.data.copy()
@@ -352,6 +591,7 @@ def income_detail(request, income_id):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_list_response('recurring_expenses')
 def my_recurring_expenses(request):
     """
     GET  /recurring_expenses/       -> list current user's recurring expenses
@@ -360,8 +600,7 @@ def my_recurring_expenses(request):
     if request.method == "GET":
         recurring_expenses = RecurringExpense.objects.filter(
             user=request.user).order_by('-start_date')
-        serializer = RecurringExpensesSerializer(recurring_expenses, many=True)
-        return Response(serializer.data)
+        return json_response(list(serialized_rows(recurring_expenses, RecurringExpensesSerializer)))
 
     elif request.method == "POST":
         data = request.data.copy()
@@ -434,94 +673,271 @@ def recurring_expense_detail(request, recurring_expense_id):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['GET', 'POST', 'DELETE', 'PUT'])
-def my_recurring_incomes(request, recurring_income_id=-1, user_id=-1):
-    all_recurring_incomes = RecurringIncomesSerializer(
-        RecurringIncome.objects.all(), many=True).data
+# Longest window /recurring/occurrences/ will expand
+MAX_OCCURRENCE_WINDOW_DAYS = 3660
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recurring_occurrence_list(request):
+    """
+    GET /recurring/occurrences/?from=YYYY-MM-DD&to=YYYY-MM-DD
+        -> every date the current user's active recurring expenses and
+           incomes fall on inside the window (default: current pay cycle)
+    """
+    try:
+        window_start = parse_date_param(request, 'from')
+        window_end = parse_date_param(request, 'to')
+    except InvalidQueryParam as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not window_start or not window_end:
+        pay_day = UserProfile.objects.filter(
+            user=request.user).values_list('pay_day', flat=True).first()
+        cycle_start, cycle_end = pay_cycle(parse_pay_day(pay_day))
+        window_start = window_start or cycle_start
+        window_end = window_end or cycle_end
+
+    if window_end < window_start:
+        return Response({'error': "'to' must not be before 'from'"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if (window_end - window_start).days > MAX_OCCURRENCE_WINDOW_DAYS:
+        return Response({'error': f'The window can span at most {MAX_OCCURRENCE_WINDOW_DAYS} days'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    result = recurring_occurrences(request.user, window_start, window_end)
+    return Response({'from': window_start, 'to': window_end, **result})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cash_flow_forecast(request):
+    """
+    GET /forecast/?months=N -> projected income, spend and savings for the
+                               current and next N-1 pay cycles (default 3)
+    """
+    try:
+        months = int(request.query_params.get('months', 3))
+    except ValueError:
+        months = 0
+    if not 1 <= months <= MAX_FORECAST_MONTHS:
+        return Response({'error': f"'months' must be between 1 and {MAX_FORECAST_MONTHS}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(get_forecast(request.user, months, local_today()))
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@cache_list_response('recurring_incomes')
+def my_recurring_incomes(request):
+    """
+    GET  /recurring_incomes/       -> list current user's recurring incomes
+    POST /recurring_incomes/       -> create new recurring income for current user
+    """
     if request.method == "GET":
-        if recurring_income_id > -1:
-            single_recurring_income = RecurringIncomesSerializer(
-                RecurringIncome.objects.get(id=recurring_income_id)).data
-            return JsonResponse(single_recurring_income, safe=False)
-        elif user_id > -1:
-            user_recurring_incomes = RecurringIncomesSerializer(
-                RecurringIncome.objects.filter(user=user_id), many=True).data
-            return JsonResponse(user_recurring_incomes, safe=False)
-        else:
-            return JsonResponse(all_recurring_incomes, safe=False)
-    if request.method == "POST":
-        new_recurring_income = RecurringIncome.objects.create(
-            user_id=request.data['user'],
-            start_date=request.data['start_date'],
-            end_date=request.data['end_date'],
-            frequency=request.data['frequency'],
-            description=request.data['description'],
-            amount=request.data['amount'],
-            is_active=True)
-        response = RecurringIncomesSerializer(
-            RecurringIncome.objects.get(id=new_recurring_income.id)).data
-        return JsonResponse(response, safe=False)
-    if request.method == "PUT":
-        single_recurring_income = RecurringIncome.objects.get(
-            id=recurring_income_id)
-        single_recurring_income.start_date = request.data['start_date']
-        if request.data['end_date']:
-            single_recurring_income.end_date = request.data['end_date']
-        else:
-            single_recurring_income.end_date = None
-        single_recurring_income.frequency = request.data['frequency']
-        single_recurring_income.description = request.data['description']
-        single_recurring_income.amount = request.data['amount']
-        if request.data['is_active']:
-            single_recurring_income.is_active = request.data['is_active']
-        elif request.data['is_active'] == False:
-            single_recurring_income.is_active = False
-
-        single_recurring_income.save()
-        result = RecurringIncomesSerializer(single_recurring_income).data
-        return JsonResponse(result, safe=False)
-    if request.method == "DELETE":
-        RecurringIncome.objects.get(id=recurring_income_id).delete()
-        return JsonResponse(all_recurring_incomes, safe=False)
+        recurring_incomes = RecurringIncome.objects.filter(
+            user=request.user).order_by('-start_date')
+        return json_response(list(serialized_rows(recurring_incomes, RecurringIncomesSerializer)))
 
+    elif request.method == "POST":
+        data = request.data.copy()
+
+        # Always use the logged-in user
+        data['user'] = request.user.id
+
+        # Handle "no category"
+        category = data.get('category')
+        if not category or int(category) <= 0:
+            data['category'] = None
+
+        # Ensure is_active is set
+        if 'is_active' not in data:
+            data['is_active'] = True
+
+        serializer = RecurringIncomesSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def recurring_income_detail(request, recurring_income_id):
+    """
+    GET    /recurring_incomes/<id>/ -> single recurring income
+    PUT    /recurring_incomes/<id>/ -> update recurring income
+    DELETE /recurring_incomes/<id>/ -> soft delete (deactivate) or hard delete
+    """
+    recurring_income = get_object_or_404(
+        RecurringIncome, id=recurring_income_id, user=request.user)
 
-@api_view(['GET', 'POST', 'DELETE', 'PUT'])
-def my_tasks(request, task_id=-1):
-    all_tasks = TasksSerializer(
-        Task.objects.all(), many=True).data
     if request.method == "GET":
-        if task_id > -1:
-            single_task = TasksSerializer(
-                Task.objects.get(id=task_id)).data
-            return JsonResponse(single_task, safe=False)
+        serializer = RecurringIncomesSerializer(recurring_income)
+        return Response(serializer.data)
+
+    elif request.method == "PUT":
+        data = request.data.copy()
+
+        # Keep user fixed to logged-in user
+        data['user'] = request.user.id
+
+        # Category handling
+        category = data.get('category')
+        if not category or int(category) <= 0:
+            data['category'] = None
+
+        serializer = RecurringIncomesSerializer(
+            recurring_income, data=data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    elif request.method == "DELETE":
+        # Soft delete if active, hard delete if already inactive
+        if recurring_income.is_active:
+            recurring_income.is_active = False
+            recurring_income.save()
+            return Response({
+                'message': 'Recurring income deactivated',
+                'is_active': False
+            })
         else:
-            return JsonResponse(all_tasks, safe=False)
+            recurring_income.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('true', '1'):
+        return True
+    if str(value).lower() in ('false', '0'):
+        return False
+    raise InvalidQueryParam(f"Invalid boolean '{value}'")
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@cache_list_response('tasks')
+def my_tasks(request):
+    """
+    GET  /tasks/?is_done=false -> list current user's tasks, optionally by status
+    POST /tasks/               -> create new task for current user
+    """
+    if request.method == "GET":
+        tasks = Task.objects.filter(user=request.user)
+        if 'is_done' in request.query_params:
+            try:
+                is_done = _parse_bool(request.query_params['is_done'])
+            except InvalidQueryParam as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            # "= true" rather than a bare boolean column, so task_user_is_done_idx applies
+            tasks = tasks.filter(is_done=Value(is_done))
+        return json_response(list(serialized_rows(tasks.order_by('id'), TasksSerializer)))
+
+    elif request.method == "POST":
+        data = request.data.copy()
+        data['user'] = request.user.id
+        serializer = TasksSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def task_detail(request, task_id):
+    """
+    GET    /tasks/<id> -> single task
+    PUT    /tasks/<id> -> update task
+    DELETE /tasks/<id> -> delete task
+    """
+    task = get_object_or_404(Task, id=task_id, user=request.user)
+
+    if request.method == "GET":
+        serializer = TasksSerializer(task)
+        return Response(serializer.data)
+
+    elif request.method == "PUT":
+        data = request.data.copy()
+        data['user'] = request.user.id
+        serializer = TasksSerializer(task, data=data, partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data)
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    elif request.method == "DELETE":
+        task.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['POST', 'PUT', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def tasks_bulk(request):
+    """
+    POST   /tasks/bulk/ [{description, is_done}, ...] -> create many tasks
+    PUT    /tasks/bulk/ {ids, is_done}                -> set is_done on many tasks,
+                                                         or flip it when is_done is omitted
+    DELETE /tasks/bulk/                               -> delete all done tasks
+
+    Each call is one transaction with a single INSERT/UPDATE/DELETE, plus
+    one INSERT of its change log entries (see base.bulk).
+    """
     if request.method == "POST":
-        user = User.objects.get(id=request.data['user'])
-        new_task = Task.objects.create(
-            user=user,
-            description=request.data['description'],
-            is_done=request.data['is_done']
-        )
-        response = TasksSerializer(
-            Task.objects.get(id=new_task.id)).data
-        return JsonResponse(response, safe=False)
-    if request.method == "DELETE":
-        Task.objects.get(id=task_id).delete()
-        return JsonResponse(all_tasks, safe=False)
-    if request.method == "PUT":
-        user = User.objects.get(id=request.data['user'])
-        single_task = Task.objects.get(id=task_id)
-        single_task.user = user
-        single_task.description = request.data['description']
-        single_task.is_done = request.data['is_done']
-        single_task.save()
-        result = TasksSerializer(single_task).data
-        return JsonResponse(result, safe=False)
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of tasks'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = TaskBulkSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create(
+                [Task(user=request.user, **item) for item in serializer.validated_data])
+            log_changes([(request.user.id, 'tasks', task.pk) for task in tasks])
+        bulk_written(request.user.id, ('tasks',))
+        return Response(TasksSerializer(tasks, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+    elif request.method == "PUT":
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({'error': "'ids' must be a list of task ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if 'is_done' in request.data:
+            try:
+                is_done = _parse_bool(request.data['is_done'])
+            except InvalidQueryParam as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            is_done = Case(When(is_done=True, then=Value(False)), default=Value(True))
+        with transaction.atomic():
+            tasks = Task.objects.filter(user=request.user, id__in=ids)
+            updated = tasks.update(is_done=is_done)
+            log_matching(tasks, 'tasks')
+        bulk_written(request.user.id, ('tasks',))
+        return Response({'updated': updated})
+
+    elif request.method == "DELETE":
+        with transaction.atomic():
+            done = Task.objects.filter(user=request.user, is_done=Value(True))
+            log_matching(done, 'tasks', DELETE)
+            deleted = delete_rows(done)
+        bulk_written(request.user.id, ('tasks',))
+        return Response({'deleted': deleted})
 
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@cache_list_response('budgets')
 def my_budgets(request):
     """
     GET  /budgets/       -> list current user's budgets
@@ -529,8 +945,7 @@ def my_budgets(request):
     """
     if request.method == "GET":
         user_budgets = Budget.objects.filter(user=request.user)
-        serializer = BudgetsSerializer(user_budgets, many=True)
-        return Response(serializer.data)
+        return json_response(list(serialized_rows(user_budgets, BudgetsSerializer)))
 
     elif request.method == "POST":
         data = request.data.copy()
@@ -576,3 +991,69 @@ def budget_detail(request, budget_id):
     elif request.method == "DELETE":
         budget.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    """
+    GET    /cache_stats/ -> {"hits": n, "misses": n, "not_modified": n, "hit_rate": r}
+                            of the list response cache, in the worker that answers
+    DELETE /cache_stats/ -> reset that worker's counters
+    """
+    if request.method == "DELETE":
+        reset_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(cache_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def refresh_token_stats(request):
+    """
+    GET /token_stats/ -> {"outstanding": n, "blacklisted": n, "refreshes": n,
+                          "refresh_avg_ms": ms, "history": [daily samples]}
+                         of the refresh token blacklist tables
+    """
+    return Response({**token_stats(), 'history': token_history()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """
+    GET /sync/?since=<seq>&limit=<n> -> what changed in the user's data after seq:
+        {"since", "next", "more", "changes": {resource: {"upserts": [rows], "deletes": [ids]}}}
+    Ask again with since=next while more is true. since=0 (the default)
+    returns every row. 410 when since is too old to sync from; start over from 0.
+    """
+    try:
+        since = parse_id_param(request, 'since') or 0
+        limit = parse_id_param(request, 'limit') or SYNC_PAGE_SIZE
+        if since < 0 or limit <= 0:
+            raise InvalidQueryParam("'since' and 'limit' must not be negative")
+    except InvalidQueryParam as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        changes = changes_since(request.user, since, min(limit, SYNC_PAGE_SIZE))
+    except SyncReset:
+        return Response({'error': 'Changes since this seq were compacted, sync again from 0',
+                         'reset': True}, status=status.HTTP_410_GONE)
+    return json_response(changes)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bootstrap(request):
+    """
+    GET /bootstrap/?sections=profile,expenses,... -> {"seq": n, "profile": {...}, "expenses": [...], ...}
+    The app's startup data in one request, one query per section. Without
+    ?sections it returns the profile, ledger, recurring rules, budgets,
+    categories and tasks.
+    """
+    try:
+        sections = parse_sections(request.query_params.get('sections'))
+    except InvalidQueryParam as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return json_response(build_bootstrap(request.user, sections))
@@ -0,0 +1,73 @@
+"""
+Benchmark serializing 10k expenses for GET /expenses/: the DRF
+ModelSerializer + JSONRenderer path against the values() + orjson fast path.
+Run from the backend directory: python -m benchmarks.list_serialization
+
+Uses a throwaway SQLite database, never the configured one.
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+
+ROWS = 10_000
+ROUNDS = 5
+
+
+def best_of(func):
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        body = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    connections['default'].close()
+    call_command('migrate', verbosity=0)
+
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+    from base.fastjson import json_response, serialized_rows
+    from base.models import Budget, Expense, UserCategory
+    from base.serializer import ExpensesSerializer
+
+    rng = random.Random(42)
+    user = User.objects.create(username='bench')
+    category = UserCategory.objects.create(user=user, category_name='food')
+    budget = Budget.objects.create(user=user, name='food', amount=5000, remaining_amount=5000)
+    Expense.objects.bulk_create([
+        Expense(user=user, pay_date=date(2025, 1, 1) + timedelta(days=rng.randint(0, 364)),
+                description=f'expense {i}', amount=Decimal(rng.randint(100, 99999)) / 100,
+                category=category, budget=budget)
+        for i in range(ROWS)
+    ], batch_size=1000)
+    expenses = Expense.objects.filter(user=user).order_by('pay_date', 'id')
+
+    before, slow = best_of(lambda: JSONRenderer().render(
+        ExpensesSerializer(expenses, many=True).data))
+    after, fast = best_of(lambda: json_response(
+        list(serialized_rows(expenses, ExpensesSerializer))).content)
+
+    print(f'{ROWS} expenses, best of {ROUNDS} (query included):')
+    print(f'  ModelSerializer + JSONRenderer: {before * 1000:.1f} ms')
+    print(f'  values() + orjson:              {after * 1000:.1f} ms ({before / after:.1f}x faster)')
+    print(f'  bodies identical: {slow == fast}')
+
+
+if __name__ == '__main__':
+    main()
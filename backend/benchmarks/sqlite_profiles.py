@@ -0,0 +1,120 @@
+"""
+Benchmark concurrent writes under each database profile (DB_PROFILES in
+settings): writer threads add expenses against one shared budget, so
+every write also runs the budget, rollup and change log signals, while
+reader threads list the expenses. Each write and read is one "request"
+that ends like Django's request_finished, closing the connection unless
+the profile keeps it (CONN_MAX_AGE).
+Run from the backend directory: python -m benchmarks.sqlite_profiles
+
+Uses a throwaway SQLite database per profile, never the configured one.
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import OperationalError, connection, connections  # noqa: E402
+
+WRITERS = 8
+READERS = 4
+WRITES_PER_WRITER = 200
+READS_PER_READER = 200
+
+
+def use_profile(name, path):
+    profile = settings.DB_PROFILES[name]
+    database = settings.DATABASES['default']
+    database.update(NAME=path, CONN_MAX_AGE=profile['CONN_MAX_AGE'],
+                    CONN_HEALTH_CHECKS=profile['CONN_MAX_AGE'] > 0,
+                    OPTIONS=dict(profile['OPTIONS']))
+    settings.SQLITE_PRAGMAS = profile['PRAGMAS']
+    connections['default'].close()
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))] if timings else 0
+
+
+def run(name, workdir):
+    use_profile(name, os.path.join(workdir, f'{name}.sqlite3'))
+    call_command('migrate', verbosity=0)
+
+    from django.contrib.auth.models import User
+    from base.models import Budget, Expense
+
+    user = User.objects.create(username='bench')
+    budget = Budget.objects.create(user=user, name='food', amount=100000, remaining_amount=100000)
+    connections['default'].close()
+
+    lock = threading.Lock()
+    write_timings, read_timings, errors = [], [], []
+
+    def request(func, timings):
+        started = time.perf_counter()
+        try:
+            func()
+        except OperationalError as e:
+            with lock:
+                errors.append(str(e))
+        else:
+            with lock:
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close_if_unusable_or_obsolete()
+
+    def writer(_):
+        try:
+            for i in range(WRITES_PER_WRITER):
+                request(lambda: Expense.objects.create(
+                    user=user, description=f'expense {i}', amount=Decimal('1.50'),
+                    budget_id=budget.pk), write_timings)
+        finally:
+            connection.close()
+
+    def reader(_):
+        try:
+            for _ in range(READS_PER_READER):
+                request(lambda: list(Expense.objects.filter(user=user)
+                                     .order_by('-id').values()[:100]), read_timings)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(WRITERS + READERS) as pool:
+        jobs = [pool.submit(writer, i) for i in range(WRITERS)]
+        jobs += [pool.submit(reader, i) for i in range(READERS)]
+        for job in jobs:
+            job.result()
+    elapsed = time.perf_counter() - started
+
+    budget.refresh_from_db()
+    expected = 100000 - Decimal('1.50') * len(write_timings)
+    connections['default'].close()
+    print(f"{name}: {len(write_timings)} writes, {len(read_timings)} reads in {elapsed:.2f}s "
+          f"({len(write_timings) / elapsed:,.0f} writes/s) - "
+          f"write p50 {percentile(write_timings, 0.5) * 1000:.1f}ms "
+          f"p95 {percentile(write_timings, 0.95) * 1000:.1f}ms, "
+          f"read p95 {percentile(read_timings, 0.95) * 1000:.1f}ms, "
+          f"{len(errors)} locked errors, "
+          f"budget {'consistent' if budget.remaining_amount == expected else 'DRIFTED'}")
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    for name in settings.DB_PROFILES:
+        run(name, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the bank statement import on a generated 50k line CSV, imported
+once fresh and once more as all duplicates.
+Run from the backend directory: python -m benchmarks.statement_import
+
+Uses a throwaway SQLite database, never the configured one.
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connections  # noqa: E402
+
+LINES = 50_000
+MERCHANTS = ['SUPER PHARM', 'SHUFERSAL', 'RAMI LEVY', 'PAZ FUEL', 'WOLT', 'ISRACARD',
+             'SALARY', 'ELECTRIC CO', 'CAFE', 'BOOKSTORE']
+
+
+def write_statement(path, count, seed=42):
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    with open(path, 'w', newline='') as f:
+        f.write('Date,Description,Amount\n')
+        for _ in range(count):
+            day = start + timedelta(days=rng.randint(0, 364))
+            merchant = rng.choice(MERCHANTS)
+            amount = rng.randint(500, 50000) / 100
+            sign = '' if merchant == 'SALARY' else '-'
+            f.write(f'{day:%d/%m/%Y},{merchant} {rng.randint(1, 50)},{sign}{amount:.2f}\n')
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    connections['default'].close()
+    call_command('migrate', verbosity=0)
+
+    from django.contrib.auth.models import User
+    from base.models import Budget, CategoryRule, UserCategory
+    from base.statements import import_statement
+
+    user = User.objects.create(username='bench')
+    groceries = UserCategory.objects.create(user=user, category_name='groceries')
+    budget = Budget.objects.create(user=user, name='food', amount=5000, remaining_amount=5000)
+    for pattern in ('shufersal', 'rami levy'):
+        CategoryRule.objects.create(user=user, pattern=pattern, category=groceries, budget=budget)
+
+    path = os.path.join(workdir, 'statement.csv')
+    write_statement(path, LINES)
+    for label in ('fresh', 'duplicates'):
+        started = time.perf_counter()
+        with open(path, newline='') as lines:
+            result = import_statement(user, lines)
+        elapsed = time.perf_counter() - started
+        print(f"{label}: {LINES} lines in {elapsed:.2f}s ({LINES / elapsed:,.0f} rows/s) - "
+              f"{result['expenses']} expenses, {result['incomes']} incomes, "
+              f"{result['duplicates']} duplicates")
+
+
+if __name__ == '__main__':
+    main()
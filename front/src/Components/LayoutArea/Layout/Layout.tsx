@@ -10,10 +10,11 @@ import authFunctions from "../../../Services/AuthFunctions";
 import Loading from "../../SharedArea/Loading/Loading";
 import GuidedTour from "../../SharedArea/GuidedTour/GuidedTour";
 import { useDispatch } from "react-redux";
-import { ExpensesDispatch, IncomesDispatch, RecurringExpensesDispatch, TasksDispatch, UserCategoriesDispatch, BudgetsDispatch } from "../../../Redux/FinanceContext";
+import { ExpensesDispatch, IncomesDispatch, RecurringExpensesDispatch, RecurringIncomesDispatch, TasksDispatch, UserCategoriesDispatch, BudgetsDispatch } from "../../../Redux/FinanceContext";
 import { fetchExpensesByUserId } from "../../../Redux/slicers/expensesSlicer";
 import { fetchIncomesByUserId } from "../../../Redux/slicers/incomesSlicer";
 import { fetchRecurringExpensesByUserId } from "../../../Redux/slicers/recurringExpenseSlicer";
+import { fetchRecurringIncomesByUserId } from "../../../Redux/slicers/recurringIncomesSlicer";
 import { fetchTasks } from "../../../Redux/slicers/tasksSlicer";
 import { fetchUserCategories } from "../../../Redux/slicers/userCategoriesSlicer";
 import { fetchBudgetsByUserId } from "../../../Redux/slicers/budgetSlicer";
@@ -33,6 +34,7 @@ function Layout(): JSX.Element {
 	const expenseDispatch: ExpensesDispatch = useDispatch();
 	const incomesDispatch: IncomesDispatch = useDispatch();
 	const recurringExpensesDispatch: RecurringExpensesDispatch = useDispatch();
+	const recurringIncomesDispatch: RecurringIncomesDispatch = useDispatch();
 	const tasksDispatch: TasksDispatch = useDispatch();
 	const userCategoriesDispatch: UserCategoriesDispatch = useDispatch();
 	const budgetsDispatch: BudgetsDispatch = useDispatch();
@@ -96,18 +98,20 @@ function Layout(): JSX.Element {
 				user.id = container.user_id;
 				context.user = user;
 
-				// 2. Get profile
-				const profile = await authFunctions.getUserProfileById(user.id);
-				context.profile = profile;
+				// 2. Get the profile and every list in one request
+				const data = await authFunctions.getBootstrap();
+				context.profile = data.profile;
 				setIsLoadedProfile(true);
 
-				// 3. Kick off Redux fetches
-				expenseDispatch(fetchExpensesByUserId(user.id));
-				incomesDispatch(fetchIncomesByUserId(user.id));
-				recurringExpensesDispatch(fetchRecurringExpensesByUserId(user.id));
-				tasksDispatch(fetchTasks());
-				userCategoriesDispatch(fetchUserCategories(user.id));
-				budgetsDispatch(fetchBudgetsByUserId(user.id));
+				// 3. Fill the Redux slices as if each list had been fetched on its own
+				const requestId = `bootstrap-${data.seq}`;
+				expenseDispatch(fetchExpensesByUserId.fulfilled(data.expenses, requestId, user.id));
+				incomesDispatch(fetchIncomesByUserId.fulfilled(data.incomes, requestId, user.id));
+				recurringExpensesDispatch(fetchRecurringExpensesByUserId.fulfilled(data.recurring_expenses, requestId, user.id));
+				recurringIncomesDispatch(fetchRecurringIncomesByUserId.fulfilled(data.recurring_incomes, requestId, user.id));
+				tasksDispatch(fetchTasks.fulfilled(data.tasks, requestId));
+				userCategoriesDispatch(fetchUserCategories.fulfilled(data.categories, requestId, user.id));
+				budgetsDispatch(fetchBudgetsByUserId.fulfilled(data.budgets, requestId, user.id));
 
 			} catch (e) {
 				// if token is invalid/expired, or API call fails, treat as logged out
@@ -133,6 +137,7 @@ function Layout(): JSX.Element {
 		expenseDispatch,
 		incomesDispatch,
 		recurringExpensesDispatch,
+		recurringIncomesDispatch,
 		tasksDispatch,
 		userCategoriesDispatch,
 		budgetsDispatch,
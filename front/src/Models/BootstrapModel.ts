@@ -0,0 +1,22 @@
+import BudgetModel from "./BudgetModel";
+import ExpenseModel from "./ExpenseModel";
+import IncomeModel from "./IncomeModel";
+import RecurringExpenseModel from "./RecurringExpenseModel";
+import RecurringIncomeModel from "./RecurringIncomeModel";
+import TaskModel from "./TaskModel";
+import UserCategoryModel from "./UserCategoryModel";
+import UserProfileModel from "./UserProfileModel";
+
+class BootstrapModel {
+	public seq: number;
+	public profile: UserProfileModel;
+	public expenses: ExpenseModel[];
+	public incomes: IncomeModel[];
+	public recurring_expenses: RecurringExpenseModel[];
+	public recurring_incomes: RecurringIncomeModel[];
+	public budgets: BudgetModel[];
+	public categories: UserCategoryModel[];
+	public tasks: TaskModel[];
+}
+
+export default BootstrapModel;
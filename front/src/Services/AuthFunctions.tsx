@@ -1,3 +1,4 @@
+import BootstrapModel from "../Models/BootstrapModel";
 import UserModel from "../Models/UserModel";
 import UserProfileModel from "../Models/UserProfileModel";
 import config, { api, scheduleTokenRefresh } from "../Utils/Config";
@@ -56,6 +57,22 @@ class AuthFunctions {
 		}
 	}
 
+	/**
+	 * Profile plus every list the app loads on startup, in one request
+	 */
+	public async getBootstrap(): Promise<BootstrapModel> {
+		try {
+			const response = await api.get<BootstrapModel>(config.bootstrapUrl);
+			return response.data;
+		} catch (error: any) {
+			// Only log if it's not a 401 (which is handled by the interceptor)
+			if (error?.response?.status !== 401) {
+				console.error("Error fetching startup data:", error);
+			}
+			throw error;
+		}
+	}
+
 	public async getAllProfiles(): Promise<UserProfileModel[]> {
 		const response = await api.get<UserProfileModel[]>(
 			config.usersProfilesUrl
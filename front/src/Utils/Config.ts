@@ -26,6 +26,7 @@ class Config {
 	public tasksUrl = this.serverUrl + "tasks/";
 	public userCategoriesUrl = this.serverUrl + "categories/";
 	public budgetsUrl = this.serverUrl + "budgets/";
+	public bootstrapUrl = this.serverUrl + "bootstrap/";
 }
 
 const config = new Config();